@@ -1,4516 +1,6817 @@
-# -*- coding: utf-8 -*-
-
-# ac_telemetry.py
-
-# Assetto Corsa telemetry viewer:
-
-# - Main window: pygame graphs + info; "Advanced" button toggles a separate process with Tk GUI
-
-# - Advanced window (separate process): scrollable cards + map with pan/zoom, side_l/side_r, trajectory overlay
-
-# - Works even if AC not running (lazy-attach loop)
-
-# - Steering angle taken from AC physics (p.steerAngle)
-
-
-
-from __future__ import annotations
-
-
-
-import argparse
-
-import ctypes
-
-import ctypes.wintypes as wt
-
-import csv
-
-import json
-
-import math
-
-import os
-
-import queue
-
-import socket
-
-import sys
-
-import threading
-
-import time
-
-from collections import deque
-
-from dataclasses import dataclass, field
-
-from pathlib import Path
-
-from typing import Any, Dict, List, Optional, Tuple, Union
-
-from datetime import datetime
-
-
-
-# ----------------------------------------------------------------------
-
-# Optional deps: pygame (main window)
-
-# ----------------------------------------------------------------------
-
-os.environ.setdefault("SDL_JOYSTICK_ALLOW_BACKGROUND_EVENTS", "1")
-
-import pygame  # type: ignore
-
-
-
-# ----------------------------------------------------------------------
-
-# Shared Memory (Windows)
-
-# ----------------------------------------------------------------------
-
-FILE_MAP_READ = 0x0004
-
-_k32 = ctypes.windll.kernel32
-
-
-
-OpenFileMappingW = _k32.OpenFileMappingW
-
-OpenFileMappingW.argtypes = [wt.DWORD, wt.BOOL, wt.LPCWSTR]
-
-OpenFileMappingW.restype = wt.HANDLE
-
-
-
-MapViewOfFile = _k32.MapViewOfFile
-
-MapViewOfFile.argtypes = [wt.HANDLE, wt.DWORD, wt.DWORD, wt.DWORD, ctypes.c_size_t]
-
-MapViewOfFile.restype = wt.LPVOID
-
-
-
-UnmapViewOfFile = _k32.UnmapViewOfFile
-
-UnmapViewOfFile.argtypes = [wt.LPCVOID]
-
-UnmapViewOfFile.restype = wt.BOOL
-
-
-
-CloseHandle = _k32.CloseHandle
-
-CloseHandle.argtypes = [wt.HANDLE]
-
-CloseHandle.restype = wt.BOOL
-
-
-
-
-
-def wstr(warr) -> str:
-
-    try:
-
-        s = "".join(warr)
-
-        i = s.find("\x00")
-
-        return s if i < 0 else s[:i]
-
-    except Exception:
-
-        return ""
-
-
-
-
-
-class SHMReader:
-
-    def __init__(self, name: str):
-
-        self.name = name
-
-        self.hMap = None
-
-        self.pView = None
-
-        self._open()
-
-
-
-    def _try_open(self, nm: str) -> bool:
-
-        h = OpenFileMappingW(FILE_MAP_READ, False, nm)
-
-        if h:
-
-            v = MapViewOfFile(h, FILE_MAP_READ, 0, 0, 0)
-
-            if v:
-
-                self.hMap, self.pView = h, v
-
-                return True
-
-            CloseHandle(h)
-
-        return False
-
-
-
-    def _open(self):
-
-        for nm in (self.name, "Local\\" + self.name, "Global\\" + self.name):
-
-            if self._try_open(nm):
-
-                return
-
-        raise RuntimeError(f"Не удалось открыть Shared Memory '{self.name}'.")
-
-
-
-    def close(self):
-
-        if self.pView:
-
-            UnmapViewOfFile(self.pView)
-
-            self.pView = None
-
-        if self.hMap:
-
-            CloseHandle(self.hMap)
-
-            self.hMap = None
-
-
-
-    def copy_into(self, ctype_struct):
-
-        if not self.pView:
-
-            raise RuntimeError("SHM not mapped")
-
-        obj = ctype_struct()
-
-        ctypes.memmove(ctypes.addressof(obj), self.pView, ctypes.sizeof(ctype_struct))
-
-        return obj
-
-
-
-
-
-# Structures (subset)
-
-c_float = ctypes.c_float
-
-c_int = ctypes.c_int
-
-
-
-
-
-class SPageFilePhysics(ctypes.Structure):
-
-    _pack_ = 4
-
-    _fields_ = [
-
-        ("packetId", c_int),
-
-        ("gas", c_float),
-
-        ("brake", c_float),
-
-        ("fuel", c_float),
-
-        ("gear", c_int),  # 0=R,1=N,2=1...
-
-        ("rpms", c_int),
-
-        ("steerAngle", c_float),  # degrees
-
-        ("speedKmh", c_float),
-
-        ("velocity", c_float * 3),  # world m/s
-
-        ("accG", c_float * 3),
-
-
-
-        ("wheelSlip", c_float * 4),
-
-        ("wheelLoad", c_float * 4),            # N
-
-        ("wheelsPressure", c_float * 4),       # psi
-
-        ("wheelAngularSpeed", c_float * 4),    # rad/s
-
-        ("tyreWear", c_float * 4),
-
-        ("tyreDirtyLevel", c_float * 4),
-
-        ("tyreCoreTemperature", c_float * 4),  # °C (core)
-
-        ("camberRAD", c_float * 4),
-
-
-
-        ("suspensionTravel", c_float * 4),     # m
-
-        ("drs", c_float),
-
-        ("tc", c_float),                       # 0..1
-
-        ("heading", c_float),
-
-        ("pitch", c_float),
-
-        ("roll", c_float),
-
-        ("cgHeight", c_float),                 # m
-
-        ("carDamage", c_float * 5),
-
-        ("numberOfTyresOut", c_int),
-
-        ("pitLimiterOn", c_int),
-
-        ("abs", c_float),                      # 0..1
-
-
-
-        ("rideHeight", c_float * 2),           # m [front, rear]
-
-        ("turboBoost", c_float),
-
-        ("ballast", c_float),
-
-        ("airDensity", c_float),               # kg/m^3
-
-    ]
-
-
-
-
-
-class SPageFileGraphics(ctypes.Structure):
-
-    _pack_ = 4
-
-    _fields_ = [
-
-        ("packetId", c_int),
-
-        ("status", c_int),  # 0=OFF,1=REPLAY,2=LIVE,3=PAUSE
-
-        ("session", c_int),
-
-        ("currentTime", wt.WCHAR * 15),
-
-        ("lastTime", wt.WCHAR * 15),
-
-        ("bestTime", wt.WCHAR * 15),
-
-        ("split", wt.WCHAR * 15),
-
-        ("completedLaps", c_int),
-
-        ("position", c_int),
-
-        ("iCurrentTime", c_int),
-
-        ("iLastTime", c_int),
-
-        ("iBestTime", c_int),
-
-        ("sessionTimeLeft", c_float),
-
-        ("distanceTraveled", c_float),
-
-        ("isInPit", c_int),
-
-        ("currentSectorIndex", c_int),
-
-        ("lastSectorTime", c_int),
-
-        ("numberOfLaps", c_int),
-
-        ("tyreCompound", wt.WCHAR * 33),
-
-        ("replayTimeMultiplier", c_float),
-
-        ("normalizedCarPosition", c_float),
-
-        ("carCoordinates", c_float * 3),  # world X,Y,Z
-
-        ("penaltyTime", c_float),
-
-        ("flag", c_int),
-
-        ("idealLineOn", c_int),
-
-        ("isInPitLane", c_int),
-
-        ("surfaceGrip", c_float),
-
-    ]
-
-
-
-
-
-class SPageFileStatic(ctypes.Structure):
-
-    _pack_ = 4
-
-    _fields_ = [
-
-        ("smVersion", wt.WCHAR * 15),
-
-        ("acVersion", wt.WCHAR * 15),
-
-        ("numberOfSessions", c_int),
-
-        ("numCars", c_int),
-
-        ("carModel", wt.WCHAR * 33),
-
-        ("track", wt.WCHAR * 33),
-
-        ("playerName", wt.WCHAR * 33),
-
-        ("playerSurname", wt.WCHAR * 33),
-
-        ("playerNick", wt.WCHAR * 33),
-
-        ("sectorCount", c_int),
-
-
-
-        ("maxTorque", c_float),
-
-        ("maxPower", c_float),
-
-        ("maxRpm", c_int),
-
-        ("maxFuel", c_float),
-
-        ("suspensionMaxTravel", c_float * 4),
-
-        ("tyreRadius", c_float * 4),
-
-        ("maxTurboBoost", c_float),
-
-        ("airTemp", c_float),
-
-        ("roadTemp", c_float),
-
-        ("penaltiesEnabled", wt.BOOL),
-
-
-
-        ("aidFuelRate", c_float),
-
-        ("aidTireRate", c_float),
-
-        ("aidMechanicalDamage", c_float),
-
-        ("aidAllowTyreBlankets", wt.BOOL),
-
-        ("aidStability", c_float),
-
-        ("aidAutoClutch", wt.BOOL),
-
-        ("aidAutoBlip", wt.BOOL),
-
-
-
-        ("trackConfig", wt.WCHAR * 33),
-
-    ]
-
-
-
-
-
-AC_STATUS = {0: "OFF", 1: "REPLAY", 2: "LIVE", 3: "PAUSE"}
-
-
-
-
-
-def psi_to_bar(psi: float) -> float:
-
-    return psi * 0.0689475729
-
-
-
-
-
-def gear_text_offset(raw: int) -> str:
-
-    if raw <= 0:
-
-        return "R"
-
-    if raw == 1:
-
-        return "N"
-
-    return str(raw - 1)
-
-
-
-
-
-# ----------------------------------------------------------------------
-
-# Plot helpers (pygame)
-
-# ----------------------------------------------------------------------
-
-class Series:
-
-    def __init__(self, name: str, color: Tuple[int, int, int], y_min=None, y_max=None, autoscale=True):
-
-        self.name = name
-
-        self.color = color
-
-        self.y_min = y_min
-
-        self.y_max = y_max
-
-        self.autoscale = autoscale
-
-        self.buf: deque[float] = deque()
-
-
-
-
-
-class Plot:
-
-    def __init__(self, title: str, capacity=600, bg=(18, 18, 18), grid=(40, 40, 40)):
-
-        self.title = title
-
-        self.capacity = capacity
-
-        self.bg = bg
-
-        self.grid = grid
-
-        self.series: List[Series] = []
-
-
-
-    def set_title(self, title): self.title = title
-
-    def add_series(self, s: Series): self.series.append(s)
-
-
-
-    def push(self, idx: int, value: float):
-
-        s = self.series[idx]
-
-        s.buf.append(float(value))
-
-        while len(s.buf) > self.capacity:
-
-            s.buf.popleft()
-
-
-
-    def _calc_scale(self) -> Tuple[float, float]:
-
-        vmins: List[float] = []
-
-        vmaxs: List[float] = []
-
-        for s in self.series:
-
-            if not s.buf:
-
-                continue
-
-            if s.autoscale:
-
-                vmins.append(min(s.buf))
-
-                vmaxs.append(max(s.buf))
-
-            else:
-
-                vmins.append(s.y_min if s.y_min is not None else min(s.buf))
-
-                vmaxs.append(s.y_max if s.y_max is not None else max(s.buf))
-
-        if not vmins:
-
-            return 0.0, 1.0
-
-        y_min, y_max = min(vmins), max(vmaxs)
-
-        if y_min == y_max:
-
-            y_min -= 1.0
-
-            y_max += 1.0
-
-        return y_min, y_max
-
-
-
-    def draw(self, surf, rect, font, title_color=(200, 200, 200), axis_color=(70, 70, 70)):
-
-        pygame.draw.rect(surf, self.bg, rect, 0)
-
-        for i in range(1, 4):
-
-            y = rect.top + int(rect.height * i / 4)
-
-            pygame.draw.line(surf, self.grid, (rect.left, y), (rect.right, y), 1)
-
-        title_surf = font.render(self.title, True, title_color)
-
-        surf.blit(title_surf, (rect.left + 8, rect.top + 6))
-
-        pygame.draw.rect(surf, axis_color, rect, 1)
-
-        y_min, y_max = self._calc_scale()
-
-        y_rng = (y_max - y_min) or 1.0
-
-        pad_top = 22
-
-        w = rect.width
-
-        h = rect.height - pad_top
-
-        ox = rect.left
-
-        oy = rect.top + pad_top
-
-        for s in self.series:
-
-            if len(s.buf) < 2: continue
-
-            pts = []
-
-            for i, val in enumerate(list(s.buf)[-w:]):
-
-                x = ox + i
-
-                y_norm = (val - y_min) / y_rng
-
-                y = oy + (h - 1) - int(y_norm * (h - 1))
-
-                pts.append((x, y))
-
-            if len(pts) >= 2:
-
-                pygame.draw.aalines(surf, s.color, False, pts)
-
-        mini = f"{y_min:.2f}"; maxi = f"{y_max:.2f}"
-
-        surf.blit(font.render(maxi, True, (150, 150, 150)), (rect.right - 60, rect.top + 4))
-
-        surf.blit(font.render(mini, True, (150, 150, 150)), (rect.right - 60, rect.bottom - 20))
-
-
-
-
-
-def ellipsize(text: str, font: pygame.font.Font, max_width: int) -> str:
-
-    if font.size(text)[0] <= max_width:
-
-        return text
-
-    ell = "…"
-
-    w_ell = font.size(ell)[0]
-
-    lo, hi = 0, len(text)
-
-    while lo < hi:
-
-        mid = (lo + hi) // 2
-
-        if font.size(text[:mid])[0] + w_ell <= max_width:
-
-            lo = mid + 1
-
-        else:
-
-            hi = mid
-
-    return text[:max(0, lo - 1)] + ell
-
-
-
-
-
-def wrap_text(text: str, font: pygame.font.Font, max_width: int) -> List[str]:
-
-    words = text.split()
-
-    lines: List[str] = []
-
-    cur = ""
-
-    for w in words:
-
-        test = (cur + " " + w).strip()
-
-        if font.size(test)[0] <= max_width:
-
-            cur = test
-
-        else:
-
-            if cur:
-
-                lines.append(cur)
-
-            cur = w if font.size(w)[0] <= max_width else ellipsize(w, font, max_width)
-
-    if cur:
-
-        lines.append(cur)
-
-    return lines
-
-
-
-
-
-def set_topmost_for_pygame_window(is_topmost=True):
-
-    try:
-
-        hwnd = pygame.display.get_wm_info().get("window")
-
-        if not hwnd:
-
-            return
-
-        HWND_TOPMOST, HWND_NOTOPMOST = -1, -2
-
-        SWP_NOMOVE, SWP_NOSIZE, SWP_SHOWWINDOW = 0x2, 0x1, 0x0040
-
-        ctypes.windll.user32.SetWindowPos(
-
-            int(hwnd),
-
-            HWND_TOPMOST if is_topmost else HWND_NOTOPMOST,
-
-            0, 0, 0, 0,
-
-            SWP_NOMOVE | SWP_NOSIZE | SWP_SHOWWINDOW,
-
-        )
-
-    except Exception:
-
-        pass
-
-
-
-
-
-# ----------------------------------------------------------------------
-
-# Track assets (map.ini / map.png / side_l.csv / side_r.csv)
-
-# ----------------------------------------------------------------------
-
-def _int(s: str, default: Union[int, float]) -> int:
-
-    try:
-
-        return int(s)
-
-    except Exception:
-
-        try:
-
-            return int(round(float(s)))
-
-        except Exception:
-
-            try:
-
-                return int(round(float(default)))
-
-            except Exception:
-
-                return 0
-
-
-
-
-
-def _float(s: str, default: float) -> float:
-
-    try:
-
-        return float(s)
-
-    except Exception:
-
-        return float(default)
-
-
-
-
-
-def load_map_ini(path: Path) -> Dict[str, float]:
-
-    defaults = dict(WIDTH=1024, HEIGHT=1024, SCALE_FACTOR=1.0, X_OFFSET=512.0, Z_OFFSET=512.0)
-
-    vals = defaults.copy()
-
-    try:
-
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-
-            for line in f:
-
-                ln = line.strip()
-
-                if not ln or ln.startswith(";") or "=" not in ln:
-
-                    continue
-
-                k, v = [x.strip() for x in ln.split("=", 1)]
-
-                U = k.upper()
-
-                if U == "WIDTH":
-
-                    vals["WIDTH"] = _int(v, vals["WIDTH"])
-
-                elif U == "HEIGHT":
-
-                    vals["HEIGHT"] = _int(v, vals["HEIGHT"])
-
-                elif U == "SCALE_FACTOR":
-
-                    vals["SCALE_FACTOR"] = _float(v, vals["SCALE_FACTOR"])
-
-                elif U in ("X_OFFSET", "XOFF", "X"):
-
-                    vals["X_OFFSET"] = _float(v, vals["X_OFFSET"])
-
-                elif U in ("Z_OFFSET", "Y_OFFSET", "Z", "Y"):
-
-                    vals["Z_OFFSET"] = _float(v, vals["Z_OFFSET"])
-
-    except Exception:
-
-        pass
-
-    return dict(w=float(vals["WIDTH"]), h=float(vals["HEIGHT"]), sx=float(vals["SCALE_FACTOR"]),
-
-                ox=float(vals["X_OFFSET"]), oz=float(vals["Z_OFFSET"]), invert_y=False)
-
-
-
-
-
-def guess_ac_roots(cli_root: Optional[str]) -> List[Path]:
-
-    roots: List[Path] = []
-
-    if cli_root:
-
-        roots.append(Path(cli_root))
-
-    env = os.environ.get("AC_ROOT")
-
-    if env:
-
-        roots.append(Path(env))
-
-    roots += [
-
-        Path(r"C:\Program Files (x86)\Steam\steamapps\common\assettocorsa"),
-
-        Path(r"C:\Program Files\Steam\steamapps\common\assettocorsa"),
-
-    ]
-
-    out: List[Path] = []
-
-    seen = set()
-
-    for p in roots:
-
-        try:
-
-            rp = p.resolve()
-
-            if rp in seen: continue
-
-            if rp.exists():
-
-                out.append(rp)
-
-                seen.add(rp)
-
-        except Exception:
-
-            pass
-
-    return out
-
-
-
-
-
-class TrackAssets:
-
-    def __init__(self):
-
-        self.base: Optional[Path] = None
-
-        self.map_png: Optional[Path] = None
-
-        self.outline_png: Optional[Path] = None
-
-        self.map_ini: Optional[Path] = None
-
-        self.side_l: Optional[Path] = None
-
-        self.side_r: Optional[Path] = None
-
-        self.transform: Optional[Dict[str, float]] = None  # sx, ox, oz, w, h, invert_y
-
-
-
-
-
-def find_track_assets(track: Optional[str], track_cfg: Optional[str], ac_roots: List[Path]) -> Optional[TrackAssets]:
-
-    if not track:
-
-        return None
-
-
-
-    def scan_base(base: Path) -> Optional[TrackAssets]:
-
-        if not base.exists():
-
-            return None
-
-        a = TrackAssets()
-
-        a.base = base
-
-        cand_inis = [base / "data" / "map.ini"] + list(base.glob("*/data/map.ini")) + list(base.glob("layout_*/*/data/map.ini"))
-
-        for c in cand_inis:
-
-            if c.exists():
-
-                a.map_ini = c
-
-                a.transform = load_map_ini(c)
-
-                break
-
-        cand_maps: List[Path] = []
-
-        if track_cfg:
-
-            for lk in [track_cfg, f"layout_{track_cfg}"]:
-
-                cand_maps += list((base / lk).glob("map.png"))
-
-                cand_maps += list((base / lk / "ui").glob("map.png"))
-
-                cand_maps += list((base / "ui" / lk).glob("map.png"))
-
-                cand_maps += list((base / "ui" / lk).glob("outline.png"))
-
-        cand_maps += [base / "map.png", base / "ui" / "map.png", base / "ui" / "outline.png"]
-
-        cand_maps += list(base.glob("*/map.png")) + list(base.glob("*/ui/outline.png"))
-
-        for c in cand_maps:
-
-            if c.exists():
-
-                if c.name.lower() == "map.png": a.map_png = c; break
-
-                if a.outline_png is None and c.name.lower() == "outline.png": a.outline_png = c
-
-        if a.map_ini:
-
-            dat = a.map_ini.parent
-
-            L = dat / "side_l.csv"
-
-            R = dat / "side_r.csv"
-
-            a.side_l = L if L.exists() else None
-
-            a.side_r = R if R.exists() else None
-
-        return a
-
-
-
-    for root in ac_roots:
-
-        base = root / "content" / "tracks" / track
-
-        if base.exists():
-
-            res = scan_base(base)
-
-            if res and (res.map_png or res.outline_png or res.map_ini):
-
-                return res
-
-
-
-    for root in ac_roots:
-
-        troot = root / "content" / "tracks"
-
-        if not troot.exists(): continue
-
-        for p in troot.glob(track + "*"):
-
-            if p.is_dir():
-
-                res = scan_base(p)
-
-                if res and (res.map_png or res.outline_png or res.map_ini):
-
-                    return res
-
-    return None
-
-
-
-
-
-def read_side_csv_points(path: Path) -> List[Tuple[float, float]]:
-
-    pts: List[Tuple[float, float]] = []
-
-    try:
-
-        with open(path, "r", newline="", encoding="utf-8", errors="ignore") as f:
-
-            rd = csv.reader(f)
-
-            for row in rd:
-
-                floats: List[float] = []
-
-                for cell in row:
-
-                    try:
-
-                        floats.append(float(cell))
-
-                    except Exception:
-
-                        pass
-
-                if len(floats) >= 2:
-
-                    x, z = floats[0], floats[1]
-
-                    pts.append((x, z))
-
-    except Exception:
-
-        pass
-
-    return pts
-
-
-
-
-
-# ----------------------------------------------------------------------
-
-# Advanced window process (Tk in its own process)
-
-# ----------------------------------------------------------------------
-
-def advanced_process_main(state_queue: "queue.Queue", ac_roots_list: List[str], manual_map_str: Optional[str], poll_ms: int):
-
-    # Local imports here to keep Tk only in this process
-
-    try:
-
-        import tkinter as tk  # type: ignore
-
-        from tkinter import ttk  # type: ignore
-
-        TK_OK = True
-
-    except Exception:
-
-        TK_OK = False
-
-        return
-
-
-
-    # Optional Pillow for high-quality resize
-
-    try:
-
-        from PIL import Image, ImageTk  # type: ignore
-
-        PIL_OK = True
-
-    except Exception:
-
-        Image = None  # type: ignore
-
-        ImageTk = None  # type: ignore
-
-        PIL_OK = False
-
-
-
-    ac_roots = [Path(p) for p in ac_roots_list]
-
-    manual_map = Path(manual_map_str).resolve() if manual_map_str else None
-
-
-
-    class MapPanel:
-
-        def __init__(self, canvas: "tk.Canvas"):
-
-            self.cv = canvas
-
-            self.map_img_tk = None
-
-            self.map_img_pil = None
-
-            self._view_img = None
-
-            self.map_w = 1.0
-
-            self.map_h = 1.0
-
-            self.view_scale = 1.0
-
-            self.view_dx = 0.0
-
-            self.view_dy = 0.0
-
-            self.pan_start = None
-
-            self.sideL_img: List[Tuple[float, float]] = []
-
-            self.sideR_img: List[Tuple[float, float]] = []
-
-            self.trail_img: List[Tuple[float, float]] = []
-
-            self.track_assets: Optional[TrackAssets] = None
-
-            self.transform: Optional[Dict[str, float]] = None
-
-            self.last_track = None
-
-            self.last_cfg = None
-
-            self.base_w = 1.0
-
-            self.base_h = 1.0
-
-            self.scale_factor = 1.0
-
-            self.offset_x = 0.0
-
-            self.offset_z = 0.0
-
-            self.invert_y = False
-
-            self.center_on_car = False
-
-            self.center_offset: Tuple[float, float] = (0.5, 0.5)
-
-            self.last_car_pos: Optional[Tuple[float, float]] = None
-
-            self.min_scale = 0.05
-
-            self.max_scale = 12.0
-
-
-
-            self.cv.bind("<Configure>", lambda e: self.fit_to_view(force=True))
-
-            self.cv.bind("<ButtonPress-1>", self._start_pan)
-
-            self.cv.bind("<B1-Motion>", self._do_pan)
-
-            self.cv.bind("<ButtonRelease-1>", self._stop_pan)
-
-            self.cv.bind("<ButtonPress-2>", self._start_pan)
-
-            self.cv.bind("<B2-Motion>", self._do_pan)
-
-            self.cv.bind("<ButtonRelease-2>", self._stop_pan)
-
-            self.cv.bind("<MouseWheel>", self._zoom)
-
-            self.cv.bind("<Button-4>", self._zoom)
-
-            self.cv.bind("<Button-5>", self._zoom)
-
-
-
-        def _start_pan(self, e):
-
-            if self.center_on_car:
-
-                return 'break'
-
-            self.pan_start = (e.x, e.y)
-
-            return 'break'
-
-
-
-        def _do_pan(self, e):
-
-            if self.center_on_car or not self.pan_start:
-
-                return 'break'
-
-            sx, sy = self.pan_start
-
-            self.view_dx += (e.x - sx)
-
-            self.view_dy += (e.y - sy)
-
-            self.pan_start = (e.x, e.y)
-
-            self.redraw()
-
-            return 'break'
-
-
-
-        def _stop_pan(self, _e):
-
-            self.pan_start = None
-
-            return 'break'
-
-
-
-        def _zoom(self, e):
-
-            delta = getattr(e, 'delta', 0)
-
-            if not delta and hasattr(e, 'num') and e.num in (4, 5):
-
-                delta = 120 if e.num == 4 else -120
-
-            if not delta:
-
-                return 'break'
-
-            factor = 1.1 if delta > 0 else 0.9
-
-            new_scale = max(self.min_scale, min(self.max_scale, self.view_scale * factor))
-
-            if self.center_on_car and self.last_car_pos:
-
-                self.view_scale = new_scale
-
-                self.recenter_on_car()
-
-                self.redraw()
-
-                return 'break'
-
-            mx, my = e.x, e.y
-
-            ix = (mx - self.view_dx) / (self.view_scale or 1.0)
-
-            iy = (my - self.view_dy) / (self.view_scale or 1.0)
-
-            self.view_scale = new_scale
-
-            self.view_dx = mx - ix * self.view_scale
-
-            self.view_dy = my - iy * self.view_scale
-
-            self.redraw()
-
-            return 'break'
-
-
-
-        def _update_transform_cache(self):
-
-            if not self.transform:
-
-                self.scale_factor = 1.0
-
-                self.offset_x = 0.0
-
-                self.offset_z = 0.0
-
-                self.invert_y = False
-
-                self.base_w = float(self.map_w or 1.0)
-
-                self.base_h = float(self.map_h or 1.0)
-
-                return
-
-            try:
-
-                self.scale_factor = float(self.transform.get("sx", 1.0) or 1.0)
-
-            except Exception:
-
-                self.scale_factor = 1.0
-
-            if not math.isfinite(self.scale_factor) or abs(self.scale_factor) < 1e-6:
-
-                self.scale_factor = 1.0
-
-            try:
-
-                self.offset_x = float(self.transform.get("ox", 0.0) or 0.0)
-
-            except Exception:
-
-                self.offset_x = 0.0
-
-            try:
-
-                self.offset_z = float(self.transform.get("oz", 0.0) or 0.0)
-
-            except Exception:
-
-                self.offset_z = 0.0
-
-            inv_raw = self.transform.get("invert_y")
-
-            if isinstance(inv_raw, str):
-
-                inv_val = inv_raw.strip().lower()
-
-                self.invert_y = inv_val in {"1", "true", "yes", "on", "y"}
-
-            elif inv_raw is None:
-
-                self.invert_y = False
-
-            else:
-
-                self.invert_y = bool(inv_raw)
-
-            try:
-
-                self.base_w = float(self.transform.get("w", self.map_w) or self.map_w or 1.0)
-
-            except Exception:
-
-                self.base_w = float(self.map_w or 1.0)
-
-            try:
-
-                self.base_h = float(self.transform.get("h", self.map_h) or self.map_h or 1.0)
-
-            except Exception:
-
-                self.base_h = float(self.map_h or 1.0)
-
-
-
-        def fit_to_view(self, force=False):
-
-            cw = self.cv.winfo_width() or 0
-
-            ch = self.cv.winfo_height() or 0
-
-            if cw <= 2 or ch <= 2:
-
-                return
-
-            s = min(cw / max(1.0, self.map_w), ch / max(1.0, self.map_h))
-
-            s = max(self.min_scale, min(self.max_scale, s))
-
-            self.view_scale = s
-
-            if self.center_on_car and self.last_car_pos:
-
-                self.recenter_on_car()
-
-                if force:
-
-                    self.redraw()
-
-            else:
-
-                self.view_dx = (cw - self.map_w * s) / 2
-
-                self.view_dy = (ch - self.map_h * s) / 2
-
-                if force:
-
-                    self.redraw()
-
-
-
-        def world_to_img(self, x: float, z: float) -> Tuple[float, float]:
-
-            factor = self.scale_factor or 1.0
-
-            px = (x + self.offset_x) / factor
-
-            py = (z + self.offset_z) / factor
-
-            if self.invert_y:
-
-                base_h = self.base_h or self.map_h or 1.0
-
-                py = base_h - py
-
-            return px, py
-
-
-
-        def set_center_mode(self, enabled: bool):
-
-            self.center_on_car = bool(enabled)
-
-            if self.center_on_car:
-
-                self.pan_start = None
-
-                self.recenter_on_car()
-
-
-
-        def set_center_offset(self, x: float, y: float):
-
-            self.center_offset = (float(x), float(y))
-
-            if self.center_on_car:
-
-                self.recenter_on_car()
-
-
-
-        def set_car_position(self, pos: Optional[Tuple[float, float]]):
-
-            self.last_car_pos = pos
-
-            if self.center_on_car:
-
-                self.recenter_on_car()
-
-
-
-        def reset_view(self):
-
-            self.fit_to_view(force=True)
-
-
-
-        def recenter_on_car(self):
-
-            if not self.center_on_car or not self.last_car_pos:
-
-                return
-
-            px, py = self.world_to_img(self.last_car_pos[0], self.last_car_pos[1])
-
-            cw = self.cv.winfo_width() or self.cv.winfo_reqwidth() or 0
-
-            ch = self.cv.winfo_height() or self.cv.winfo_reqheight() or 0
-
-            if cw <= 2 or ch <= 2:
-
-                return
-
-            self.view_dx = cw * self.center_offset[0] - px * self.view_scale
-
-            self.view_dy = ch * self.center_offset[1] - py * self.view_scale
-
-
-
-        def load_assets_if_needed(self, track_name: Optional[str], track_cfg: Optional[str]) -> Optional[str]:
-
-            changed = (track_name != self.last_track) or (track_cfg != self.last_cfg)
-
-            if not changed:
-
-                return None
-
-            self.last_track, self.last_cfg = track_name, track_cfg
-
-
-
-            self.map_img_tk = None
-
-            self.map_img_pil = None
-
-            self._view_img = None
-
-            self.map_w = self.map_h = 1.0
-
-            self.sideL_img = []
-
-            self.sideR_img = []
-
-            self.trail_img = []
-
-            self.last_car_pos = None
-
-
-
-            if manual_map and manual_map.exists():
-
-                self.track_assets = TrackAssets()
-
-                self.track_assets.base = manual_map.parent
-
-                self.track_assets.map_png = manual_map
-
-                self.track_assets.transform = dict(w=1024.0, h=1024.0, sx=1.0, ox=512.0, oz=512.0, invert_y=True)
-
-            else:
-
-                self.track_assets = find_track_assets(track_name, track_cfg, ac_roots)
-
-            self.transform = (self.track_assets.transform if self.track_assets and self.track_assets.transform else None)
-
-            self._update_transform_cache()
-
-
-
-            status = "����: с������⭠"
-
-            img_path = None
-
-            if self.track_assets:
-
-                img_path = self.track_assets.map_png or self.track_assets.outline_png
-
-
-
-            if img_path and img_path.exists():
-
-                try:
-
-                    if PIL_OK and Image is not None and ImageTk is not None:
-
-                        self.map_img_pil = Image.open(img_path)
-
-                        self.map_w, self.map_h = [float(v) for v in self.map_img_pil.size]
-
-                        self.map_img_tk = ImageTk.PhotoImage(self.map_img_pil)
-
-                    else:
-
-                        self.map_img_tk = tk.PhotoImage(file=str(img_path))
-
-                        self.map_w = float(self.map_img_tk.width())
-
-                        self.map_h = float(self.map_img_tk.height())
-
-                    status = f"����: {self.track_assets.base.name if self.track_assets and self.track_assets.base else '?'}"
-
-                except Exception:
-
-                    status = "����: с訡�� с���㧪�"
-
-            else:
-
-                if self.track_assets:
-
-                    status = "����: с� с������ (���� сࠥ����)"
-
-                else:
-
-                    status = "����: с������⭠"
-
-
-
-            self._update_transform_cache()
-
-
-
-            if self.track_assets and self.track_assets.side_l and self.track_assets.side_r:
-
-                Lw = read_side_csv_points(self.track_assets.side_l)
-
-                Rw = read_side_csv_points(self.track_assets.side_r)
-
-                self.sideL_img = [self.world_to_img(x, z) for (x, z) in Lw]
-
-                self.sideR_img = [self.world_to_img(x, z) for (x, z) in Rw]
-
-
-
-            self.fit_to_view(force=True)
-
-            return status
-
-
-
-        def redraw(self):
-
-            self.cv.delete("all")
-
-            if self.map_img_tk:
-
-                if PIL_OK and self.map_img_pil is not None and Image is not None and ImageTk is not None:
-
-                    iw = int(max(1, min(8192, self.map_w * self.view_scale)))
-
-                    ih = int(max(1, min(8192, self.map_h * self.view_scale)))
-
-                    if hasattr(Image, "Resampling"):
-
-                        resample = Image.Resampling.BILINEAR
-
-                    else:
-
-                        resample = getattr(Image, "BILINEAR", 2)
-
-                    img = self.map_img_pil.resize((iw, ih), resample)
-
-                    self._view_img = ImageTk.PhotoImage(img)
-
-                    self.cv.create_image(self.view_dx, self.view_dy, anchor="nw", image=self._view_img)
-
-                else:
-
-                    self.cv.create_image(self.view_dx, self.view_dy, anchor="nw", image=self.map_img_tk)
-
-            else:
-
-                w = self.cv.winfo_width() or 0
-
-                h = self.cv.winfo_height() or 0
-
-                self.cv.create_rectangle(10, 10, max(11, w - 10), max(11, h - 10), outline="#333")
-
-
-
-            def draw_poly(pts, color="#ffcc00", width=2):
-
-                if not pts:
-
-                    return
-
-                coords: List[float] = []
-
-                s = self.view_scale
-
-                dx = self.view_dx
-
-                dy = self.view_dy
-
-                for x, y in pts:
-
-                    coords.extend([dx + x * s, dy + y * s])
-
-                if len(coords) >= 4:
-
-                    self.cv.create_line(*coords, fill=color, width=width, capstyle="round", joinstyle="round")
-
-
-
-            if self.sideL_img:
-
-                draw_poly(self.sideL_img, "#ffcc00", 2)
-
-            if self.sideR_img:
-
-                draw_poly(self.sideR_img, "#ffcc00", 2)
-
-            if self.trail_img:
-
-                draw_poly(self.trail_img, "#00e5ff", 2)
-
-                x, y = self.trail_img[-1]
-
-                cx = self.view_dx + x * self.view_scale
-
-                cy = self.view_dy + y * self.view_scale
-
-                self.cv.create_oval(cx - 5, cy - 5, cx + 5, cy + 5, outline="#fff", fill="#ff0", width=2)
-
-                self.cv.create_text(cx + 10, cy - 10, text="YOU", fill="#fff", anchor="w")
-
-    class Snapshot:
-
-        __slots__ = ("ts", "data")
-
-
-
-        def __init__(self, ts: float, data: Dict[str, Any]):
-
-            self.ts = ts
-
-            self.data = data
-
-
-
-
-
-    class GraphCanvas:
-
-        def __init__(self, parent: Any, title: str, series: List[Dict[str, Any]], height: int = 160):
-
-            self.title = title
-
-            self.series = series
-
-            self.canvas = tk.Canvas(parent, height=height, bg="#111115", highlightthickness=0)
-
-            self.canvas.pack(fill="x", pady=(4, 4))
-
-            self.canvas.bind("<Configure>", lambda _e: self._render())
-
-            self._data: List[Snapshot] = []
-
-            self._highlight_ts: Optional[float] = None
-
-
-
-        def update(self, snapshots: List[Snapshot], highlight_ts: Optional[float] = None):
-
-            self._data = list(snapshots)
-
-            self._highlight_ts = highlight_ts
-
-            self._render()
-
-
-
-        def _render(self):
-
-            canvas = self.canvas
-
-            canvas.delete("all")
-
-            width = max(60, int(canvas.winfo_width() or canvas.winfo_reqwidth() or 320))
-
-            height = max(60, int(canvas.winfo_height() or canvas.winfo_reqheight() or 160))
-
-            pad_left, pad_right = 48, 16
-
-            pad_top, pad_bottom = 30, 30
-
-            x0 = pad_left
-
-            y0 = pad_top
-
-            x1 = width - pad_right
-
-            y1 = height - pad_bottom
-
-            if x1 <= x0:
-
-                x1 = x0 + 10
-
-            if y1 <= y0:
-
-                y1 = y0 + 10
-
-            canvas.create_rectangle(x0, y0, x1, y1, outline="#2b2b2b", width=1)
-
-            canvas.create_text(x0, 12, text=self.title, anchor="w", fill="#f0f0f0", font=("Segoe UI", 10, "bold"))
-
-            for i in range(1, 4):
-
-                gy = y0 + (y1 - y0) * i / 4
-
-                canvas.create_line(x0, gy, x1, gy, fill="#1d1d1d")
-
-            data = self._data
-
-            if len(data) < 2:
-
-                canvas.create_text((x0 + x1) / 2, (y0 + y1) / 2, text="No data", fill="#666666", font=("Segoe UI", 9))
-
-                return
-
-            times = [snap.ts for snap in data]
-
-            t0 = times[0]
-
-            t1 = times[-1]
-
-            if t1 - t0 < 1e-6:
-
-                t1 = t0 + 1.0
-
-            series_points: List[Tuple[str, str, List[Tuple[float, float]]]] = []
-
-            y_values: List[float] = []
-
-            for series in self.series:
-
-                color = series["color"]
-
-                name = series.get("name", "")
-
-                extractor = series["extract"]
-
-                pts: List[Tuple[float, float]] = []
-
-                for snap in data:
-
-                    val = extractor(snap.data)
-
-                    if val is None:
-
-                        continue
-
-                    try:
-
-                        val_f = float(val)
-
-                    except Exception:
-
-                        continue
-
-                    pts.append((snap.ts, val_f))
-
-                    y_values.append(val_f)
-
-                series_points.append((color, name, pts))
-
-            if not y_values:
-
-                canvas.create_text((x0 + x1) / 2, (y0 + y1) / 2, text="No values", fill="#666666", font=("Segoe UI", 9))
-
-                return
-
-            y_min = min(y_values)
-
-            y_max = max(y_values)
-
-            if math.isclose(y_min, y_max, rel_tol=1e-9):
-
-                delta = abs(y_min) * 0.1 or 1.0
-
-                y_min -= delta
-
-                y_max += delta
-
-            scale_x = (x1 - x0) / (t1 - t0)
-
-            scale_y = (y1 - y0) / (y_max - y_min)
-
-            legend_x = x0
-
-            legend_y = y0 - 14
-
-            for color, name, pts in series_points:
-
-                if not pts:
-
-                    continue
-
-                canvas.create_rectangle(legend_x, legend_y, legend_x + 10, legend_y + 10, outline=color, fill=color)
-
-                canvas.create_text(legend_x + 14, legend_y + 5, text=name, anchor="w", fill="#d8d8d8", font=("Segoe UI", 8))
-
-                legend_x += max(60, len(name) * 8)
-
-            fmt = "{:.2f}" if abs(y_max - y_min) < 100 else "{:.0f}"
-
-            canvas.create_text(x1 + 6, y0, text=fmt.format(y_max), anchor="nw", fill="#b0b0b0", font=("Segoe UI", 8))
-
-            canvas.create_text(x1 + 6, y1, text=fmt.format(y_min), anchor="sw", fill="#b0b0b0", font=("Segoe UI", 8))
-
-            canvas.create_text(x0, y1 + 12, text="0 с", anchor="nw", fill="#7a7a7a", font=("Segoe UI", 8))
-
-            canvas.create_text(x1, y1 + 12, text=f"{(t1 - t0):.1f} с", anchor="ne", fill="#7a7a7a", font=("Segoe UI", 8))
-
-            for color, _name, pts in series_points:
-
-                if not pts:
-
-                    continue
-
-                coords: List[float] = []
-
-                for ts, val in pts:
-
-                    x = x0 + (ts - t0) * scale_x
-
-                    y = y1 - (val - y_min) * scale_y
-
-                    coords.extend([x, y])
-
-                if len(coords) >= 4:
-
-                    canvas.create_line(*coords, fill=color, width=2, smooth=True)
-
-                elif len(coords) == 2:
-
-                    x, y = coords
-
-                    canvas.create_oval(x - 2, y - 2, x + 2, y + 2, outline=color, fill=color)
-
-            highlight_ts = self._highlight_ts
-
-            if highlight_ts is not None:
-
-                for color, _name, pts in reversed(series_points):
-
-                    if not pts:
-
-                        continue
-
-                    target = None
-
-                    for ts, val in reversed(pts):
-
-                        target = (ts, val)
-
-                        if ts <= highlight_ts:
-
-                            break
-
-                    if target is None:
-
-                        continue
-
-                    ts, val = target
-
-                    x = x0 + (ts - t0) * scale_x
-
-                    y = y1 - (val - y_min) * scale_y
-
-                    canvas.create_oval(x - 4, y - 4, x + 4, y + 4, outline=color, width=2)
-
-                    break
-
-
-
-
-
-
-
-    class GraphManager:
-
-        def __init__(self, parent: Any):
-
-            self.parent = parent
-
-            self.graphs: List[GraphCanvas] = []
-
-            self.window_seconds: float = 10.0
-
-
-
-        def set_window(self, seconds: float) -> None:
-
-            try:
-
-                self.window_seconds = max(0.1, float(seconds))
-
-            except Exception:
-
-                self.window_seconds = 10.0
-
-
-
-        def _trim_snapshots(self, snapshots: List[Snapshot]) -> List[Snapshot]:
-
-            if not snapshots:
-
-                return []
-
-            window = self.window_seconds
-
-            if window <= 0:
-
-                return list(snapshots)
-
-            t_end = snapshots[-1].ts
-
-            t_start = t_end - window
-
-            trimmed = [snap for snap in snapshots if snap.ts >= t_start]
-
-            if trimmed:
-
-                return trimmed
-
-            return [snapshots[-1]]
-
-
-
-        def build(self, configs: List[Dict[str, Any]]):
-
-            self.graphs.clear()
-
-            for cfg in configs:
-
-                graph = GraphCanvas(self.parent, cfg["title"], cfg["series"], cfg.get("height", 160))
-
-                self.graphs.append(graph)
-
-
-
-        def update(self, snapshots: List[Snapshot], highlight_ts: Optional[float]):
-
-            trimmed = self._trim_snapshots(snapshots)
-
-            for graph in self.graphs:
-
-                graph.update(trimmed, highlight_ts=highlight_ts)
-
-
-
-
-
-    @dataclass
-
-    class RecordingRun:
-
-        label: str
-
-        car: str
-
-        track: str
-
-        track_cfg: str
-
-        created_at: float
-
-        snapshots: List[Snapshot] = field(default_factory=list)
-
-
-
-
-
-    class AdvancedStateController:
-
-        def __init__(
-
-            self,
-
-            root: Any,
-
-            mpanel: MapPanel,
-
-            lbl_title: Any,
-
-            lbl_map_status: Any,
-
-            set_label: Any,
-
-            graph_manager: GraphManager,
-
-            view_btn: Any,
-
-            record_btn: Any,
-
-            playback_btn: Any,
-
-            play_btn: Any,
-
-            prev_btn: Any,
-
-            next_btn: Any,
-
-            slider: Any,
-
-            time_label: Any,
-
-            cards_holder: Any,
-
-            graphs_holder: Any,
-
-            scroll_callback: Any,
-
-            records_var: Any,
-
-            records_cb: Any,
-
-            window_var: Any,
-
-            window_cb: Any,
-
-            window_choices: List[int],
-
-        ):
-
-            self.root = root
-
-            self.mpanel = mpanel
-
-            self.lbl_title = lbl_title
-
-            self.lbl_map_status = lbl_map_status
-
-            self.set_label = set_label
-
-            self.graph_manager = graph_manager
-
-            self.view_btn = view_btn
-
-            self.record_btn = record_btn
-
-            self.playback_btn = playback_btn
-
-            self.play_btn = play_btn
-
-            self.prev_btn = prev_btn
-
-            self.next_btn = next_btn
-
-            self.slider = slider
-
-            self.time_label = time_label
-
-            self.cards_holder = cards_holder
-
-            self.graphs_holder = graphs_holder
-
-            self.scroll_callback = scroll_callback
-
-            self.records_var = records_var
-
-            self.records_cb = records_cb
-
-            self.window_var = window_var
-
-            self.window_cb = window_cb
-
-            self.window_choices = sorted({int(v) for v in window_choices if v > 0}) or [10]
-
-            self.window_labels = [f"{sec} с" for sec in self.window_choices]
-
-            self.window_map = {label: float(sec) for label, sec in zip(self.window_labels, self.window_choices)}
-
-            self.graph_manager.set_window(self.window_choices[0])
-
-            self.window_cb.configure(state="readonly", values=self.window_labels)
-
-            default_label = next((label for label in self.window_labels if "10" in label), self.window_labels[0])
-
-            self.window_var.set(default_label)
-
-            self.window_cb.bind('<<ComboboxSelected>>', self._handle_window_change)
-
-
-
-            self.history: deque[Snapshot] = deque()
-
-            self.max_history_seconds = max(self.window_choices)
-
-            self.recordings: List[RecordingRun] = []
-
-            self.active_recording: Optional[RecordingRun] = None
-
-            self.playback_run: Optional[RecordingRun] = None
-
-            self.recording = False
-
-            self.view_mode = "cards"
-
-            self.play_mode = "live"
-
-            self.play_running = False
-
-            self.play_job: Optional[str] = None
-
-            self.slider_adjust = False
-
-            self.play_index = 0
-
-            self.latest_snapshot: Optional[Snapshot] = None
-
-
-
-            self.records_cb.configure(state="disabled")
-
-            self.records_cb.bind('<<ComboboxSelected>>', self._handle_recording_select)
-
-
-
-            self.view_btn.configure(command=self.toggle_view)
-
-            self.record_btn.configure(command=self.toggle_record)
-
-            self.playback_btn.configure(command=self.toggle_play_mode)
-
-            self.play_btn.configure(command=self.toggle_play)
-
-            self.prev_btn.configure(command=lambda: self.step_playback(-1))
-
-            self.next_btn.configure(command=lambda: self.step_playback(1))
-
-            self.slider.configure(command=self.on_slider_move)
-
-
-
-            self._show_cards()
-
-            self._set_play_controls_state(False)
-
-            self.playback_btn.state(["disabled"])
-
-            self._handle_window_change()
-
-            self.time_label.configure(text="LIVE")
-
-            self._records_by_label: Dict[str, RecordingRun] = {}
-
-
-
-
-
-        def shutdown(self):
-
-            self.stop_play_loop()
-
-
-
-        def toggle_view(self):
-
-            if self.view_mode == "cards":
-
-                self._show_graphs()
-
-            else:
-
-                self._show_cards()
-
-
-
-        def _show_cards(self):
-
-            self.graphs_holder.pack_forget()
-
-            self.cards_holder.pack(fill="x", expand=True)
-
-            self.view_mode = "cards"
-
-            self.view_btn.configure(text="Показать графики")
-
-            self._fire_scroll_update()
-
-
-
-        def _show_graphs(self):
-
-            self.cards_holder.pack_forget()
-
-            self.graphs_holder.pack(fill="x", expand=True)
-
-            self.view_mode = "graphs"
-
-            self.view_btn.configure(text="Показать значения")
-
-            self._refresh_graphs()
-
-            self._fire_scroll_update()
-
-
-
-        def _fire_scroll_update(self):
-
-            try:
-
-                self.scroll_callback()
-
-            except Exception:
-
-                pass
-
-
-
-
-
-        def _handle_window_change(self, *_):
-
-            label = self.window_var.get() if self.window_var else ""
-
-            seconds = self.window_map.get(label)
-
-            if seconds:
-
-                self.graph_manager.set_window(seconds)
-
-            self._refresh_graphs()
-
-
-
-        def _handle_recording_select(self, *_):
-
-            if not self.recordings:
-
-                self.playback_run = None
-
-                self._update_slider_range()
-
-                return
-
-            label = self.records_var.get()
-
-            run = self._records_by_label.get(label)
-
-            if run is None and self.recordings:
-
-                run = self.recordings[0]
-
-                self.records_var.set(run.label)
-
-            self.playback_run = run
-
-            self._update_slider_range()
-
-            if self.play_mode == "playback" and run and run.snapshots:
-
-                self.play_index = max(0, min(self.play_index, len(run.snapshots) - 1))
-
-                snap = self._snapshot_for_playback(self.play_index)
-
-                self.apply_snapshot(snap, highlight_ts=snap.ts, playback_index=self.play_index)
-
-
-
-        def _set_play_controls_state(self, enabled: bool):
-
-            state = ["!disabled"] if enabled else ["disabled"]
-
-            for btn in (self.prev_btn, self.play_btn, self.next_btn):
-
-                try:
-
-                    btn.state(state)
-
-                except Exception:
-
-                    pass
-
-            try:
-
-                self.slider.configure(state="normal" if enabled else "disabled")
-
-            except Exception:
-
-                pass
-
-
-
-        def _refresh_graphs(self):
-
-            highlight = self.latest_snapshot.ts if self.latest_snapshot else None
-
-            self.graph_manager.update(list(self.history), highlight_ts=highlight)
-
-
-
-        def _format_recording_label(self, created_at: float, car: str, track: str, cfg: str, duration: float) -> str:
-
-            timestamp = datetime.fromtimestamp(created_at).strftime("%H:%M:%S")
-
-            track_part = track or "-"
-
-            if cfg:
-
-                track_part = f"{track_part} ({cfg})"
-
-            car_part = car or "-"
-
-            return f"{timestamp} | {car_part} | {track_part} | {duration:.1f}s"
-
-
-
-        def _refresh_recordings_combo(self, select_index: Optional[int] = None):
-
-            self._records_by_label = {run.label: run for run in self.recordings}
-
-            labels = list(self._records_by_label.keys())
-
-            try:
-
-                self.records_cb.configure(values=labels)
-
-            except Exception:
-
-                pass
-
-            if labels:
-
-                try:
-
-                    self.records_cb.configure(state="readonly")
-
-                except Exception:
-
-                    pass
-
-                if select_index is None or not (0 <= select_index < len(labels)):
-
-                    select_index = 0
-
-                try:
-
-                    self.records_cb.current(select_index)
-
-                except Exception:
-
-                    pass
-
-                self.records_var.set(labels[select_index])
-
-                self.playback_run = self._records_by_label.get(labels[select_index])
-
-            else:
-
-                self.records_var.set("")
-
-                try:
-
-                    self.records_cb.configure(values=())
-
-                    self.records_cb.configure(state="disabled")
-
-                except Exception:
-
-                    pass
-
-                self.playback_run = None
-
-            self._update_slider_range()
-
-            self._update_playback_button_state()
-
-
-
-        def _update_playback_button_state(self):
-
-            if self.recordings:
-
-                self.playback_btn.state(["!disabled"])
-
-            else:
-
-                self.playback_btn.state(["disabled"])
-
-
-
-        def _update_slider_range(self):
-
-            snaps = self._current_playback_snapshots()
-
-            upper = max(0, len(snaps) - 1)
-
-            try:
-
-                self.slider.configure(from_=0, to=upper)
-
-            except Exception:
-
-                pass
-
-
-
-        def _snapshot_for_playback(self, index: int) -> Snapshot:
-
-            snaps = self._current_playback_snapshots()
-
-            if not snaps:
-
-                raise IndexError("no snapshots available")
-
-            index = max(0, min(index, len(snaps) - 1))
-
-            return snaps[index]
-
-
-
-        def _current_playback_snapshots(self) -> List[Snapshot]:
-
-            return list(self.playback_run.snapshots) if self.playback_run else []
-
-
-
-        def _schedule_next_frame(self):
-
-            if self.play_mode != "playback":
-
-                return
-
-            snaps = self._current_playback_snapshots()
-
-            if not snaps or self.play_index >= len(snaps) - 1:
-
-                self.stop_play_loop()
-
-                return
-
-            current = snaps[self.play_index]
-
-            nxt = snaps[self.play_index + 1]
-
-            delay_ms = 100
-
-            if nxt.ts > current.ts:
-
-                delay_ms = int(max(16, min(200, (nxt.ts - current.ts) * 1000)))
-
-
-
-            def _advance():
-
-                self.play_job = None
-
-                if not self.play_running:
-
-                    return
-
-                snaps_local = self._current_playback_snapshots()
-
-                if not snaps_local or self.play_index >= len(snaps_local) - 1:
-
-                    self.stop_play_loop()
-
-                    return
-
-                self.play_index += 1
-
-                self.slider_adjust = True
-
-                try:
-
-                    self.slider.set(self.play_index)
-
-                finally:
-
-                    self.slider_adjust = False
-
-                snap = self._snapshot_for_playback(self.play_index)
-
-                self.apply_snapshot(snap, highlight_ts=snap.ts, playback_index=self.play_index)
-
-                self._schedule_next_frame()
-
-
-
-            self.play_job = self.root.after(delay_ms, _advance)
-
-
-
-        def apply_snapshot(self, snapshot: Snapshot, highlight_ts: Optional[float] = None, playback_index: Optional[int] = None):
-
-            self.latest_snapshot = snapshot
-
-            data = snapshot.data
-
-            track = data.get("track", "-") or "-"
-
-            cfg = data.get("trackConfig") or ""
-
-            track_display = f"{track} ({cfg})" if cfg else track
-
-            car = data.get("carModel", "-") or "-"
-
-            self.lbl_title.configure(text=f"Car: {car}   Track: {track_display}")
-
-            status = self.mpanel.load_assets_if_needed(track if track != "-" else None, cfg or None)
-
-            if status:
-
-                self.lbl_map_status.configure(text=status)
-
-            car_pos = data.get("car_pos")
-
-            if isinstance(car_pos, (list, tuple)) and len(car_pos) >= 2:
-
-                try:
-
-                    self.mpanel.set_car_position((float(car_pos[0]), float(car_pos[1])))
-
-                except Exception:
-
-                    self.mpanel.set_car_position(None)
-
-            trail = data.get("trail")
-
-            if isinstance(trail, list):
-
-                pts = []
-
-                for item in trail:
-
-                    if not isinstance(item, (list, tuple)) or len(item) < 2:
-
-                        continue
-
-                    try:
-
-                        pts.append(self.mpanel.world_to_img(float(item[0]), float(item[1])))
-
-                    except Exception:
-
-                        continue
-
-                self.mpanel.trail_img = pts
-
-            else:
-
-                self.mpanel.trail_img = []
-
-            self.mpanel.redraw()
-
-            self.set_label("car", car)
-
-            self.set_label("track", track_display)
-
-            lap = data.get("lap")
-
-            position = data.get("position")
-
-            if lap is not None and position is not None:
-
-                self.set_label("lp", f"{lap} / {position}")
-
-            elif lap is not None:
-
-                self.set_label("lp", str(lap))
-
-            else:
-
-                self.set_label("lp", "-")
-
-            sector = data.get("sector")
-
-            self.set_label("sec", str(sector) if sector is not None else "-")
-
-            times = [data.get("time_current"), data.get("time_last"), data.get("time_best")]
-
-            self.set_label("times", " / ".join(t or "--" for t in times))
-
-            temps = data.get("tyreCoreTemperature")
-
-            if temps:
-
-                try:
-
-                    self.set_label("tcore", "/".join(f"{float(v):.1f}" for v in temps))
-
-                except Exception:
-
-                    self.set_label("tcore", "-")
-
-            else:
-
-                self.set_label("tcore", "-")
-
-            pressures = data.get("wheelsPressurePsi")
-
-            if pressures:
-
-                try:
-
-                    psi_vals = [float(v) for v in pressures]
-
-                    bar_vals = [psi_to_bar(v) for v in psi_vals]
-
-                    bar_str = "/".join(f"{v:.2f}" for v in bar_vals)
-
-                    psi_str = "/".join(f"{v:.1f}" for v in psi_vals)
-
-                    self.set_label("press", f"{bar_str} bar | {psi_str} psi")
-
-                except Exception:
-
-                    self.set_label("press", "-")
-
-            else:
-
-                self.set_label("press", "-")
-
-            wheel_speed = data.get("wheelLinearKmh")
-
-            if wheel_speed:
-
-                try:
-
-                    self.set_label("wheelspeed", "/".join(f"{float(v):.1f}" for v in wheel_speed))
-
-                except Exception:
-
-                    self.set_label("wheelspeed", "-")
-
-            else:
-
-                self.set_label("wheelspeed", "-")
-
-            susp = data.get("suspensionTravel")
-
-            if susp:
-
-                try:
-
-                    self.set_label("susp", "/".join(f"{float(v) * 1000:.0f}" for v in susp))
-
-                except Exception:
-
-                    self.set_label("susp", "-")
-
-            else:
-
-                self.set_label("susp", "-")
-
-            ride = data.get("rideHeight")
-
-            if ride:
-
-                try:
-
-                    self.set_label("ride", "/".join(f"{float(v) * 1000:.0f}" for v in ride))
-
-                except Exception:
-
-                    self.set_label("ride", "-")
-
-            else:
-
-                self.set_label("ride", "-")
-
-            load = data.get("wheelLoad")
-
-            if load:
-
-                try:
-
-                    self.set_label("load", "/".join(f"{float(v) / 9.81:.0f}" for v in load))
-
-                except Exception:
-
-                    self.set_label("load", "-")
-
-            else:
-
-                self.set_label("load", "-")
-
-            self.set_label("drs", f"{data.get('drs', 0.0):.2f}")
-
-            self.set_label("tc", f"{data.get('tc', 0.0):.2f}")
-
-            self.set_label("abs", f"{data.get('abs', 0.0):.2f}")
-
-            self.set_label("airrho", f"{data.get('airDensity', 0.0):.3f}")
-
-            self.set_label("cgh", f"{data.get('cgHeight', 0.0) * 100:.1f}")
-
-            self.set_label("grip", f"{data.get('surfaceGrip', 0.0):.2f}")
-
-            self.set_label("steer", f"{data.get('steerAngle', 0.0):.1f} deg")
-
-            if playback_index is None:
-
-                self.time_label.configure(text="LIVE")
-
-            else:
-
-                total = max(1, len(self._current_playback_snapshots()))
-
-                self.time_label.configure(text=f"{playback_index + 1}/{total}")
-
-            highlight_ts = highlight_ts if highlight_ts is not None else snapshot.ts
-
-            self._refresh_graphs()
-
-
-
-        def on_new_state(self, data: Dict[str, Any]):
-
-            if not isinstance(data, dict):
-
-                return
-
-            ts = float(data.get("timestamp", time.time()))
-
-            snapshot = Snapshot(ts, data)
-
-            self.history.append(snapshot)
-
-            while self.history and self.history[-1].ts - self.history[0].ts > self.max_history_seconds:
-
-                self.history.popleft()
-
-            self.latest_snapshot = snapshot
-
-            if self.recording and self.active_recording:
-
-                self.active_recording.snapshots.append(snapshot)
-
-            if self.play_mode != "playback":
-
-                self.apply_snapshot(snapshot, highlight_ts=ts)
-
-            else:
-
-                self._refresh_graphs()
-
-
-
-        def toggle_record(self):
-
-            if self.recording:
-
-                self.stop_recording()
-
-            else:
-
-                self.start_recording()
-
-
-
-        def start_recording(self):
-
-            base = self.latest_snapshot or (self.history[-1] if self.history else None)
-
-            car = base.data.get("carModel", "-") if base else "-"
-
-            track = base.data.get("track", "-") if base else "-"
-
-            cfg = base.data.get("trackConfig", "") if base else ""
-
-            created = time.time()
-
-            label = self._format_recording_label(created, car, track, cfg, 0.0)
-
-            self.active_recording = RecordingRun(label=label, car=car, track=track, track_cfg=cfg, created_at=created)
-
-            self.recording = True
-
-            self.play_mode = "live"
-
-            self.stop_play_loop()
-
-            self.record_btn.configure(text="Стоп запись")
-
-            self._set_play_controls_state(False)
-
-            self.playback_btn.configure(text="Режим воспроизведения")
-
-            self.playback_btn.state(["disabled"])
-
-
-
-        def stop_recording(self):
-
-            run = self.active_recording
-
-            self.recording = False
-
-            self.active_recording = None
-
-            self.record_btn.configure(text="Начать запись")
-
-            if run and run.snapshots:
-
-                duration = max(0.0, run.snapshots[-1].ts - run.snapshots[0].ts)
-
-                run.label = self._format_recording_label(run.created_at, run.car, run.track, run.track_cfg, duration)
-
-                self.recordings.append(run)
-
-                self._refresh_recordings_combo(select_index=len(self.recordings) - 1)
-
-            self._update_playback_button_state()
-
-
-
-        def toggle_play_mode(self):
-
-            if self.play_mode == "live":
-
-                self.set_play_mode("playback")
-
-            else:
-
-                self.set_play_mode("live")
-
-
-
-        def set_play_mode(self, mode: str):
-
-            if mode == self.play_mode:
-
-                return
-
-            if mode == "playback":
-
-                if not self.recordings:
-
-                    return
-
-                if not self.playback_run:
-
-                    self._refresh_recordings_combo(select_index=len(self.recordings) - 1)
-
-                if not self.playback_run or not self.playback_run.snapshots:
-
-                    return
-
-                self.play_mode = "playback"
-
-                self.stop_play_loop()
-
-                self._set_play_controls_state(True)
-
-                self.playback_btn.configure(text="К живым данным")
-
-                self._update_slider_range()
-
-                self.slider_adjust = True
-
-                self.play_index = 0
-
-                self.slider.set(0)
-
-                self.slider_adjust = False
-
-                snap = self._snapshot_for_playback(self.play_index)
-
-                self.apply_snapshot(snap, highlight_ts=snap.ts, playback_index=self.play_index)
-
-            else:
-
-                self.play_mode = "live"
-
-                self.stop_play_loop()
-
-                self._set_play_controls_state(False)
-
-                self.playback_btn.configure(text="Режим воспроизведения")
-
-                self.time_label.configure(text="LIVE")
-
-                if self.latest_snapshot:
-
-                    self.apply_snapshot(self.latest_snapshot, highlight_ts=self.latest_snapshot.ts)
-
-
-
-        def toggle_play(self):
-
-            snaps = self._current_playback_snapshots()
-
-            if self.play_mode != "playback" or not snaps:
-
-                return
-
-            if self.play_running:
-
-                self.stop_play_loop()
-
-            else:
-
-                self.play_running = True
-
-                self.play_btn.configure(text="Пауза")
-
-                self._schedule_next_frame()
-
-
-
-        def step_playback(self, step: int):
-
-            snaps = self._current_playback_snapshots()
-
-            if self.play_mode != "playback" or not snaps:
-
-                return
-
-            self.stop_play_loop()
-
-            new_idx = max(0, min(len(snaps) - 1, self.play_index + step))
-
-            if new_idx == self.play_index:
-
-                return
-
-            self.play_index = new_idx
-
-            self.slider_adjust = True
-
-            self.slider.set(self.play_index)
-
-            self.slider_adjust = False
-
-            snap = self._snapshot_for_playback(self.play_index)
-
-            self.apply_snapshot(snap, highlight_ts=snap.ts, playback_index=self.play_index)
-
-
-
-        def on_slider_move(self, value: str):
-
-            snaps = self._current_playback_snapshots()
-
-            if self.play_mode != "playback" or not snaps or self.slider_adjust:
-
-                return
-
-            try:
-
-                idx = int(float(value) + 0.5)
-
-            except Exception:
-
-                return
-
-            idx = max(0, min(len(snaps) - 1, idx))
-
-            if idx == self.play_index:
-
-                return
-
-            self.play_index = idx
-
-            snap = self._snapshot_for_playback(self.play_index)
-
-            self.apply_snapshot(snap, highlight_ts=snap.ts, playback_index=self.play_index)
-
-
-
-        def stop_play_loop(self):
-
-            if self.play_job is not None:
-
-                try:
-
-                    self.root.after_cancel(self.play_job)
-
-                except Exception:
-
-                    pass
-
-                self.play_job = None
-
-            if self.play_running:
-
-                self.play_running = False
-
-                self.play_btn.configure(text="Play")
-
-
-
-
-
-    root = tk.Tk()
-
-    root.title("AC Telemetry - Advanced")
-
-    root.geometry("1100x760+120+120")
-
-    root.minsize(900, 600)
-
-
-
-    outer = ttk.Frame(root, padding=8)
-
-    outer.pack(fill="both", expand=True)
-
-
-
-    left = ttk.Frame(outer)
-
-    left.pack(side="left", fill="y", padx=(0, 8))
-
-
-
-    controls = ttk.Frame(left)
-
-    controls.pack(fill="x", pady=(0, 6))
-
-    controls.columnconfigure(0, weight=1)
-
-    controls.columnconfigure(1, weight=1)
-
-    controls.columnconfigure(2, weight=1)
-
-
-
-    view_btn = ttk.Button(controls, text="Показать графики")
-
-    view_btn.grid(row=0, column=0, padx=(0, 4), sticky="ew")
-
-    record_btn = ttk.Button(controls, text="Начать запись")
-
-    record_btn.grid(row=0, column=1, padx=(0, 4), sticky="ew")
-
-    playback_btn = ttk.Button(controls, text="Режим воспроизведения")
-
-    playback_btn.grid(row=0, column=2, sticky="ew")
-
-
-
-    playback_controls = ttk.Frame(controls)
-
-    playback_controls.grid(row=1, column=0, columnspan=3, pady=(4, 0), sticky="ew")
-
-    playback_controls.columnconfigure(3, weight=1)
-
-
-
-    prev_btn = ttk.Button(playback_controls, text="<")
-
-    prev_btn.grid(row=0, column=0, padx=(0, 2))
-
-    play_btn = ttk.Button(playback_controls, text="Play")
-
-    play_btn.grid(row=0, column=1, padx=(0, 2))
-
-    next_btn = ttk.Button(playback_controls, text=">")
-
-    next_btn.grid(row=0, column=2, padx=(0, 6))
-
-    slider = ttk.Scale(playback_controls, from_=0, to=0, orient="horizontal")
-
-    slider.grid(row=0, column=3, sticky="ew")
-
-    time_label = ttk.Label(playback_controls, text="LIVE")
-
-    time_label.grid(row=0, column=4, padx=(6, 0))
-
-
-
-    ttk.Label(controls, text="Записи:").grid(row=2, column=0, sticky="w", pady=(6, 0))
-
-    records_var = tk.StringVar()
-
-    records_cb = ttk.Combobox(controls, textvariable=records_var, state="disabled", width=34)
-
-    records_cb.grid(row=2, column=1, columnspan=2, sticky="ew", pady=(6, 0))
-
-
-
-    ttk.Label(controls, text="Окно графика:").grid(row=3, column=0, sticky="w", pady=(4, 0))
-
-    window_var = tk.StringVar()
-
-    window_cb = ttk.Combobox(controls, textvariable=window_var, state="readonly", width=12)
-
-    window_cb.grid(row=3, column=1, sticky="w", pady=(4, 0))
-
-    window_choices = [5, 10, 20, 30, 60, 120]
-
-
-
-    canvasL = tk.Canvas(left, bg="#0f0f10", highlightthickness=0, width=360)
-
-    vsb = ttk.Scrollbar(left, orient="vertical", command=canvasL.yview)
-
-    frm = ttk.Frame(canvasL)
-
-    frame_id = canvasL.create_window((0, 0), window=frm, anchor="nw")
-
-    canvasL.configure(yscrollcommand=vsb.set)
-
-    canvasL.pack(side="left", fill="y")
-
-    vsb.pack(side="left", fill="y")
-
-
-
-    def _on_conf(event=None):
-
-        canvasL.configure(scrollregion=canvasL.bbox("all"))
-
-        w = event.width if event else canvasL.winfo_width()
-
-        try:
-
-            canvasL.itemconfig(frame_id, width=w)
-
-        except Exception:
-
-            pass
-
-
-
-    frm.bind("<Configure>", _on_conf)
-
-    canvasL.bind("<Configure>", _on_conf)
-
-
-
-    def _scroll_cards(event):
-
-        delta = 0
-
-        if hasattr(event, "delta") and event.delta:
-
-            delta = event.delta
-
-        elif hasattr(event, "num") and event.num in (4, 5):
-
-            delta = 120 if event.num == 4 else -120
-
-        if delta:
-
-            canvasL.yview_scroll(int(-delta / 120), "units")
-
-        return "break"
-
-
-
-    canvasL.bind("<MouseWheel>", _scroll_cards)
-
-    canvasL.bind("<Button-4>", _scroll_cards)
-
-    canvasL.bind("<Button-5>", _scroll_cards)
-
-
-
-    right = ttk.Frame(outer)
-
-    right.pack(side="left", fill="both", expand=True)
-
-    top = ttk.Frame(right)
-
-    top.pack(fill="x")
-
-    lbl_title = ttk.Label(top, text="Car: -   Track: -", font=("Consolas", 12, "bold"))
-
-    lbl_title.pack(side="left")
-
-    lbl_map_status = ttk.Label(top, text="Карта: нет данных")
-
-    lbl_map_status.pack(side="right")
-
-
-
-    cv_map = tk.Canvas(right, bg="#0b0b0d", highlightthickness=0, cursor="fleur")
-
-    cv_map.pack(fill="both", expand=True, pady=(8, 0))
-
-
-
-    mpanel = MapPanel(cv_map)
-
-
-
-    map_controls = ttk.Frame(left)
-
-    map_controls.pack(fill="x", pady=(0, 6))
-
-    center_var = tk.BooleanVar(value=True)
-
-
-
-    def _toggle_center() -> None:
-
-        mpanel.set_center_mode(bool(center_var.get()))
-
-        mpanel.reset_view()
-
-
-
-    center_chk = ttk.Checkbutton(map_controls, text="Следовать за машиной", variable=center_var, command=_toggle_center)
-
-    center_chk.pack(side="left")
-
-    reset_btn = ttk.Button(map_controls, text="Сбросить вид", command=lambda: mpanel.reset_view())
-
-    reset_btn.pack(side="left", padx=(8, 0))
-
-    center_var.set(True)
-
-    _toggle_center()
-
-
-
-    cards_holder = ttk.Frame(frm)
-
-    cards_holder.pack(fill="x", expand=True)
-
-    graphs_holder = ttk.Frame(frm)
-
-
-
-    def value_getter(key: str, idx: Optional[int] = None):
-
-        def _inner(data: Dict[str, Any]):
-
-            value = data.get(key)
-
-            if idx is not None:
-
-                if isinstance(value, (list, tuple)):
-
-                    try:
-
-                        value = value[idx]
-
-                    except Exception:
-
-                        return None
-
-                else:
-
-                    return None
-
-            return value
-
-        return _inner
-
-
-
-    graph_configs = [
-
-        {
-
-            "title": "Скорость (km/h)",
-
-            "series": [
-
-                {"name": "Speed", "color": "#4fa3ff", "extract": value_getter("speedKmh")},
-
-            ],
-
-        },
-
-        {
-
-            "title": "Обороты двигателя",
-
-            "series": [
-
-                {"name": "RPM", "color": "#ffae4f", "extract": value_getter("rpm")},
-
-            ],
-
-        },
-
-        {
-
-            "title": "Педали",
-
-            "series": [
-
-                {"name": "Газ", "color": "#5ecb5e", "extract": value_getter("gas")},
-
-                {"name": "Тормоз", "color": "#ff6464", "extract": value_getter("brake")},
-
-            ],
-
-        },
-
-        {
-
-            "title": "Температура шин (°C)",
-
-            "series": [
-
-                {"name": "FL", "color": "#ff7070", "extract": value_getter("tyreCoreTemperature", 0)},
-
-                {"name": "FR", "color": "#ffb470", "extract": value_getter("tyreCoreTemperature", 1)},
-
-                {"name": "RL", "color": "#70baff", "extract": value_getter("tyreCoreTemperature", 2)},
-
-                {"name": "RR", "color": "#70ffac", "extract": value_getter("tyreCoreTemperature", 3)},
-
-            ],
-
-        },
-
-    ]
-
-
-
-    graph_manager = GraphManager(graphs_holder)
-
-    graph_manager.build(graph_configs)
-
-
-
-    def card(title, keys_and_labels: List[Tuple[str, str]]) -> Dict[str, Any]:
-
-        holder: Dict[str, Any] = {}
-
-        box = ttk.Frame(cards_holder, padding=8)
-
-        box.pack(fill="x", pady=(4, 4))
-
-        box["borderwidth"] = 1
-
-        box["relief"] = "solid"
-
-        ttk.Label(box, text=title, font=("Segoe UI", 10, "bold")).grid(row=0, column=0, sticky="w", pady=(0, 6), columnspan=2)
-
-        r = 1
-
-        for key, label in keys_and_labels:
-
-            ttk.Label(box, text=label).grid(row=r, column=0, sticky="w")
-
-            val = ttk.Label(box, text="-")
-
-            val.grid(row=r, column=1, sticky="e")
-
-            holder[key] = val
-
-            r += 1
-
-        box.columnconfigure(0, weight=1)
-
-        box.columnconfigure(1, weight=1)
-
-        return holder
-
-
-
-    refs: Dict[str, ttk.Label] = {}
-
-
-
-    def reg(d: Dict[str, ttk.Label]):
-
-        refs.update(d)
-
-
-
-    reg(card("Авто и трасса", [
-
-        ("car", "Автомобиль"),
-
-        ("track", "Трасса"),
-
-        ("lp", "Круг / позиция"),
-
-        ("sec", "Сектор"),
-
-        ("times", "Время (текущее/последнее/лучшее)"),
-
-    ]))
-
-    reg(card("Шины и давление", [
-
-        ("tcore", "Темп. FL/FR/RL/RR (°C)"),
-
-        ("press", "Давление FL/FR/RL/RR (bar/psi)"),
-
-        ("wheelspeed", "Скорость колёс FL/FR/RL/RR (км/ч)"),
-
-    ]))
-
-    reg(card("Подвеска и нагрузка", [
-
-        ("susp", "Ход подвески FL/FR/RL/RR (мм)"),
-
-        ("ride", "Клиренс перед/зад (мм)"),
-
-        ("load", "Нагрузка FL/FR/RL/RR (кг)"),
-
-    ]))
-
-    reg(card("Системы и среда", [
-
-        ("drs", "DRS"),
-
-        ("tc", "TC уровень"),
-
-        ("abs", "ABS уровень"),
-
-        ("airrho", "Плотность воздуха (кг/м³)"),
-
-        ("cgh", "Центр тяжести (см)"),
-
-        ("grip", "Грипп покрытия"),
-
-    ]))
-
-    reg(card("Руль", [
-
-        ("steer", "Угол руля (°)"),
-
-    ]))
-
-
-
-    def set_lbl(key: str, text: str):
-
-        lab = refs.get(key)
-
-        if lab:
-
-            lab.configure(text=text)
-
-
-
-    controller = AdvancedStateController(
-
-        root=root,
-
-        mpanel=mpanel,
-
-        lbl_title=lbl_title,
-
-        lbl_map_status=lbl_map_status,
-
-        set_label=set_lbl,
-
-        graph_manager=graph_manager,
-
-        view_btn=view_btn,
-
-        record_btn=record_btn,
-
-        playback_btn=playback_btn,
-
-        play_btn=play_btn,
-
-        prev_btn=prev_btn,
-
-        next_btn=next_btn,
-
-        slider=slider,
-
-        time_label=time_label,
-
-        cards_holder=cards_holder,
-
-        graphs_holder=graphs_holder,
-
-        scroll_callback=_on_conf,
-        records_var=records_var,
-        records_cb=records_cb,
-        window_var=window_var,
-        window_cb=window_cb,
-        window_choices=window_choices,
-    )
-
-
-
-    def poll_queue():
-
-        try:
-
-            while True:
-
-                msg = state_queue.get_nowait()
-
-                if isinstance(msg, dict) and msg.get("cmd") == "exit":
-
-                    controller.shutdown()
-
-                    root.destroy()
-
-                    return
-
-                if isinstance(msg, dict) and msg.get("type") == "state":
-
-                    controller.on_new_state(msg.get("data", {}))
-
-        except queue.Empty:
-
-            pass
-
-        root.after(poll_ms, poll_queue)
-
-
-
-    root.after(poll_ms, poll_queue)
-
-    root.protocol("WM_DELETE_WINDOW", lambda: (state_queue.put({"cmd": "exit"}), controller.shutdown(), root.destroy()))
-
-    root.mainloop()
-
-# ----------------------------------------------------------------------
-
-# Main program (pygame)
-
-# ----------------------------------------------------------------------
-
-def main():
-
-    ap = argparse.ArgumentParser(description="Assetto Corsa Telemetry: pygame + Advanced Tk (separate process)")
-
-    ap.add_argument("--hz", type=float, default=50.0, help="Частота опроса SHM, Гц")
-
-    ap.add_argument("--buffer-secs", type=float, default=20.0, help="Глубина графиков, сек")
-
-    ap.add_argument("--no-topmost", action="store_true", help="Не делать окно поверх всех")
-
-
-
-    ap.add_argument("--csv", help="Путь к CSV-логу (опционально)")
-
-    ap.add_argument("--udp", help="UDP адрес для JSON-стрима, host:port (опционально)")
-
-
-
-    ap.add_argument("--unit", choices=["kmh", "mph", "ms"], default="kmh", help="Единицы скорости")
-
-    ap.add_argument("--speed-source", choices=["auto", "kmh", "vector"], default="auto",
-
-                    help="Источник скорости: speedKmh | |velocity|*3.6 | auto")
-
-    ap.add_argument("--speed-deadzone", type=float, default=0.5, help="Мёртвая зона (км/ч): ниже порога → 0.00")
-
-    ap.add_argument("--speed-ema", type=float, default=0.25, help="EMA сглаживание 0..1")
-
-
-
-    BoolAction = getattr(argparse, "BooleanOptionalAction", None)
-
-    if BoolAction:
-
-        ap.add_argument("--adv-window", action=BoolAction, default=True,
-
-                        help="Разрешить продвинутое окно (управляется кнопкой)")
-
-    else:
-
-        ap.add_argument("--adv-window", dest="adv_window", action="store_true", default=True,
-
-                        help="Разрешить Advanced окно (кнопка в главном)")
-
-        ap.add_argument("--no-adv-window", dest="adv_window", action="store_false",
-
-                        help="Запретить Advanced окно")
-
-
-
-    ap.add_argument("--adv-poll-ms", type=int, default=100, help="Интервал обновления Advanced, мс")
-
-    ap.add_argument("--ac-root", help="Корень Assetto Corsa (поиск карт)")
-
-    ap.add_argument("--track-map", help="Путь к PNG карте трассы (ручной выбор)")
-
-
-
-    args = ap.parse_args()
-
-    if not hasattr(args, "adv_window"):
-
-        setattr(args, "adv_window", True)
-
-
-
-    # pygame UI
-
-    pygame.init()
-
-    pygame.display.set_caption("Assetto Corsa — Telemetry")
-
-    screen = pygame.display.set_mode((1280, 780), pygame.RESIZABLE)
-
-    clock = pygame.time.Clock()
-
-    font = pygame.font.SysFont("Consolas", 16)
-
-    fontb = pygame.font.SysFont("Consolas", 20, bold=True)
-
-    is_topmost = not args.no_topmost
-
-    if is_topmost:
-
-        set_topmost_for_pygame_window(True)
-
-
-
-    # AC SHM lazy attach
-
-    shm_phys = shm_graph = shm_stat = None
-
-    ac_attached = False
-
-    last_ac_try = 0.0
-
-
-
-    def attach_ac() -> bool:
-
-        nonlocal shm_phys, shm_graph, shm_stat, ac_attached
-
-        try:
-
-            shm_phys = SHMReader("acpmf_physics")
-
-            shm_graph = SHMReader("acpmf_graphics")
-
-            shm_stat = SHMReader("acpmf_static")
-
-            ac_attached = True
-
-            print("[AC] SHM attached")
-
-            return True
-
-        except RuntimeError:
-
-            shm_phys = shm_graph = shm_stat = None
-
-            ac_attached = False
-
-            return False
-
-
-
-    def detach_ac():
-
-        nonlocal shm_phys, shm_graph, shm_stat, ac_attached
-
-        try:
-
-            if shm_phys: shm_phys.close()
-
-            if shm_graph: shm_graph.close()
-
-            if shm_stat: shm_stat.close()
-
-        except Exception:
-
-            pass
-
-        shm_phys = shm_graph = shm_stat = None
-
-        ac_attached = False
-
-        print("[AC] SHM detached")
-
-
-
-    attach_ac()
-
-
-
-    # CSV/UDP
-
-    csv_fh = None
-
-    if args.csv:
-
-        csv_fh = open(args.csv, "w", encoding="utf-8", newline="")
-
-        csv_fh.write("ts,car,track,cfg,gear_raw,gear_out,rpm,speed_raw,speed_filt,gas,brake,steer_deg,status,lap,pos,cur,last,best,sector,prsFL,prsFR,prsRL,prsRR\n")
-
-    udp_sock = None; udp_addr = None
-
-    if args.udp:
-
-        try:
-
-            host, port_s = args.udp.rsplit(":", 1)
-
-            udp_addr = (host, int(port_s))
-
-            udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-        except Exception as e:
-
-            print("Некорректный --udp, отключаю:", e)
-
-
-
-    target_fps = 60
-
-    poll_period = 1.0 / max(1.0, float(args.hz))
-
-    graph_fps = 30.0
-
-    capacity = max(120, min(2400, int(float(args.buffer_secs) * graph_fps)))
-
-
-
-    unit_label = {"kmh": "km/h", "mph": "mph", "ms": "m/s"}[args.unit]
-
-    plot_speed = Plot(f"Speed ({unit_label})", capacity)
-
-    plot_speed.add_series(Series("speed", (80, 180, 255)))
-
-    plot_rpm = Plot("RPM", capacity)
-
-    plot_rpm.add_series(Series("rpm", (255, 190, 80)))
-
-    plot_ped = Plot("Pedals", capacity)
-
-    plot_ped.add_series(Series("gas", (120, 220, 120), y_min=0, y_max=1, autoscale=False))
-
-    plot_ped.add_series(Series("brake", (220, 120, 120), y_min=0, y_max=1, autoscale=False))
-
-
-
-    def kmh_to_out(v_kmh: float) -> float:
-
-        if args.unit == "kmh": return v_kmh
-
-        if args.unit == "mph": return v_kmh * 0.621371
-
-        return v_kmh / 3.6
-
-
-
-    last_poll = 0.0
-
-    last_graph = 0.0
-
-    status_text = "AC:WAIT"
-
-    cur_time = last_time = best_time = ""
-
-    lap = pos = sec = 0
-
-    car_model = "—"
-
-    track_name = "—"
-
-    track_cfg = ""
-
-
-
-    gear_raw = 1
-
-    rpm = 0
-
-    gas = 0.0
-
-    brake = 0.0
-
-    steer_deg = 0.0
-
-    speed_kmh_raw = 0.0
-
-    speed_kmh_filt: Optional[float] = None
-
-
-
-    trail: deque[Tuple[float, float]] = deque(maxlen=3000)  # world X,Z
-
-
-
-    # Advanced process plumbing
-
-    from multiprocessing import Process, Queue, set_start_method
-
-    try:
-
-        set_start_method("spawn", force=True)
-
-    except RuntimeError:
-
-        pass  # already set
-
-
-
-    adv_allowed = bool(args.adv_window)
-
-    adv_running = False
-
-    adv_q: Optional[Queue] = None
-
-    adv_proc: Optional[Process] = None
-
-
-
-    ac_roots = guess_ac_roots(args.ac_root)
-
-    manual_map = str(Path(args.track_map).resolve()) if args.track_map else None
-
-
-
-    def open_advanced():
-
-        nonlocal adv_running, adv_q, adv_proc
-
-        if not adv_allowed:
-
-            return
-
-        if adv_running:
-
-            if adv_proc and adv_proc.is_alive():
-
-                return
-
-            close_advanced()
-
-        adv_q = Queue(maxsize=2)
-
-        adv_proc = Process(target=advanced_process_main,
-
-                           args=(adv_q, [str(p) for p in ac_roots], manual_map, int(args.adv_poll_ms)),
-
-                           daemon=True)
-
-        adv_proc.start()
-
-        adv_running = True
-
-
-
-    def close_advanced():
-
-        nonlocal adv_running, adv_q, adv_proc
-
-        q = adv_q
-
-        p = adv_proc
-
-        if q:
-
-            try:
-
-                q.put({"cmd": "exit"}, block=False)
-
-            except Exception:
-
-                pass
-
-        if p:
-
-            p.join(timeout=1.0)
-
-            if p.is_alive():
-
-                p.terminate()
-
-                p.join(timeout=0.5)
-
-        if q:
-
-            try:
-
-                q.close()
-
-                q.join_thread()
-
-            except Exception:
-
-                pass
-
-        adv_proc = None
-
-        adv_q = None
-
-        adv_running = False
-
-
-
-    # UI button rect
-
-    btn_rect = pygame.Rect(0, 0, 0, 0)
-
-
-
-    def draw_button(surface, rect, text, on):
-
-        pygame.draw.rect(surface, (40, 120, 60) if on else (90, 90, 90), rect, border_radius=8)
-
-        pygame.draw.rect(surface, (30, 30, 30), rect, 2, border_radius=8)
-
-        txt = fontb.render(text, True, (255, 255, 255))
-
-        surface.blit(txt, (rect.centerx - txt.get_width() // 2, rect.centery - txt.get_height() // 2))
-
-
-
-    running = True
-
-    while running:
-
-        now = time.time()
-
-
-
-        if not ac_attached and now - last_ac_try >= 2.0:
-
-            last_ac_try = now
-
-            attach_ac()
-
-
-
-        for ev in pygame.event.get():
-
-            if ev.type == pygame.QUIT:
-
-                running = False
-
-            elif ev.type == pygame.KEYDOWN:
-
-                if ev.key == pygame.K_ESCAPE:
-
-                    running = False
-
-                elif ev.key == pygame.K_F11:
-
-                    is_topmost = not is_topmost
-
-                    set_topmost_for_pygame_window(is_topmost)
-
-                elif ev.key == pygame.K_c and (pygame.key.get_mods() & pygame.KMOD_CTRL):
-
-                    for p in (plot_speed, plot_rpm, plot_ped):
-
-                        for s in p.series:
-
-                            s.buf.clear()
-
-            elif ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
-
-                if adv_allowed and btn_rect.collidepoint(ev.pos):
-
-                    if adv_running and adv_proc and not adv_proc.is_alive():
-
-                        close_advanced()
-
-                    if adv_running:
-
-                        close_advanced()
-
-                    else:
-
-                        open_advanced()
-
-            elif ev.type == pygame.VIDEORESIZE:
-
-                screen = pygame.display.set_mode((ev.w, ev.h), pygame.RESIZABLE)
-
-                if is_topmost:
-
-                    set_topmost_for_pygame_window(True)
-
-
-
-        # poll AC
-
-        if now - last_poll >= poll_period:
-
-            last_poll = now
-
-            if ac_attached and shm_phys and shm_graph and shm_stat:
-
-                try:
-
-                    p = shm_phys.copy_into(SPageFilePhysics)
-
-                    g = shm_graph.copy_into(SPageFileGraphics)
-
-                    s = shm_stat.copy_into(SPageFileStatic)
-
-
-
-                    status_text = AC_STATUS.get(int(g.status), "?")
-
-                    cur_time = wstr(g.currentTime)
-
-                    last_time = wstr(g.lastTime)
-
-                    best_time = wstr(g.bestTime)
-
-                    lap = int(g.completedLaps)
-
-                    pos = int(g.position)
-
-                    sec = int(g.currentSectorIndex)
-
-
-
-                    car_model = wstr(s.carModel) or car_model
-
-                    track_name = wstr(s.track) or track_name
-
-                    track_cfg = wstr(s.trackConfig) or ""
-
-
-
-                    gear_raw = int(p.gear)
-
-                    rpm = int(p.rpms)
-
-                    gas = max(0.0, min(1.0, float(p.gas)))
-
-                    brake = max(0.0, min(1.0, float(p.brake)))
-
-
-
-                    kmh_field = float(p.speedKmh)
-
-                    vx, vy, vz = float(p.velocity[0]), float(p.velocity[1]), float(p.velocity[2])
-
-                    kmh_vec = math.sqrt(vx * vx + vy * vy + vz * vz) * 3.6
-
-                    if args.speed_source == "kmh" or (args.speed_source == "auto" and (kmh_field > 0.05 or kmh_vec < 0.1)):
-
-                        raw_kmh = kmh_field
-
-                    else:
-
-                        raw_kmh = kmh_vec
-
-                    if abs(raw_kmh) < max(0.0, float(args.speed_deadzone)):
-
-                        raw_kmh = 0.0
-
-                    speed_kmh_raw = raw_kmh
-
-                    alpha = min(max(float(args.speed_ema), 0.0), 1.0)
-
-                    speed_kmh_filt = (speed_kmh_raw if speed_kmh_filt is None
-
-                                      else (speed_kmh_filt + alpha * (speed_kmh_raw - speed_kmh_filt)) if alpha > 0.0
-
-                                      else speed_kmh_raw)
-
-
-
-                    steer_deg = float(p.steerAngle)
-
-
-
-                    car_x = float(g.carCoordinates[0])
-
-                    car_z = float(g.carCoordinates[2])
-
-                    trail.append((car_x, car_z))
-
-
-
-                    if hasattr(s, "tyreRadius") and s.tyreRadius:
-
-                        tyreR = [float(s.tyreRadius[i]) for i in range(4)]
-
-                    else:
-
-                        tyreR = [0.33, 0.33, 0.33, 0.33]
-
-                    wa = [float(p.wheelAngularSpeed[i]) for i in range(4)]
-
-                    vlin = [wa[i] * tyreR[i] * 3.6 for i in range(4)]
-
-                    prs_psi = [float(p.wheelsPressure[i]) for i in range(4)]
-
-
-
-                    # send state to Advanced (latest only)
-
-                    if adv_running and adv_q is not None:
-
-                        state_payload = {
-
-                            "type": "state",
-
-                            "data": {
-
-                                "carModel": car_model, "track": track_name, "trackConfig": track_cfg,
-
-                                "lap": lap, "position": pos, "sector": sec,
-
-                                "time_current": cur_time or "--:--.---",
-
-                                "time_last": last_time or "--:--.---",
-
-                                "time_best": best_time or "--:--.---",
-
-                                "suspensionTravel": [float(p.suspensionTravel[i]) for i in range(4)],
-
-                                "rideHeight": [float(p.rideHeight[i]) for i in range(2)],
-
-                                "wheelLoad": [float(p.wheelLoad[i]) for i in range(4)],
-
-                                "camberRAD": [float(p.camberRAD[i]) for i in range(4)],
-
-                                "wheelAngularSpeed": wa,
-
-                                "wheelLinearKmh": vlin,
-
-                                "wheelsPressurePsi": prs_psi,
-
-                                "tyreCoreTemperature": [float(p.tyreCoreTemperature[i]) for i in range(4)],
-
-                                "drs": float(p.drs), "tc": float(p.tc), "abs": float(p.abs),
-
-                                "airDensity": float(p.airDensity), "cgHeight": float(p.cgHeight),
-
-                                "surfaceGrip": float(g.surfaceGrip),
-
-                                "steerAngle": steer_deg,
-
-                                "timestamp": now,
-
-                                "speedKmh": float(speed_kmh_filt if speed_kmh_filt is not None else speed_kmh_raw),
-
-                                "rpm": rpm,
-
-                                "gas": gas,
-
-                                "brake": brake,
-
-                                "car_pos": [car_x, car_z],
-
-                                "trail": list(trail),
-
-                            }
-
-                        }
-
-                        exit_requested = False
-
-                        try:
-
-                            while True:
-
-                                try:
-
-                                    msg = adv_q.get_nowait()
-
-                                except queue.Empty:
-
-                                    break
-
-                                if isinstance(msg, dict) and msg.get("cmd") == "exit":
-
-                                    exit_requested = True
-
-                            if exit_requested:
-
-                                close_advanced()
-
-                            else:
-
-                                adv_q.put_nowait(state_payload)
-
-                        except Exception:
-
-                            close_advanced()
-
-
-
-                    if csv_fh:
-
-                        csv_fh.write(
-
-                            "{ts:.3f},{car},{trk},{cfg},{gr},{go},{rpm:d},{raw:.3f},{filt:.3f},{gas:.3f},{brk:.3f},{sw:.1f},{st},{lap:d},{pos:d},{cur},{last},{best},{sec:d},{p0:.1f},{p1:.1f},{p2:.1f},{p3:.1f}\n".format(
-
-                                ts=now, car=car_model, trk=track_name, cfg=track_cfg,
-
-                                gr=gear_raw, go=gear_text_offset(gear_raw), rpm=rpm,
-
-                                raw=speed_kmh_raw, filt=(speed_kmh_filt or 0.0), gas=gas, brk=brake, sw=steer_deg,
-
-                                st=status_text, lap=lap, pos=pos, cur=cur_time, last=last_time, best=best_time, sec=sec,
-
-                                p0=prs_psi[0], p1=prs_psi[1], p2=prs_psi[2], p3=prs_psi[3]
-
-                            )
-
-                        )
-
-                    if udp_sock and udp_addr:
-
-                        payload = {
-
-                            "t": now, "status": status_text, "carModel": car_model, "track": track_name, "trackConfig": track_cfg,
-
-                            "physics": {"gearRaw": gear_raw, "gear": gear_text_offset(gear_raw), "rpm": rpm,
-
-                                        "speedKmh": speed_kmh_filt, "gas": gas, "brake": brake,
-
-                                        "steerDeg": steer_deg, "steerSrc": "AC"},
-
-                            "graphics": {"lap": lap, "position": pos, "sector": sec,
-
-                                         "time": {"current": cur_time, "last": last_time, "best": best_time}}
-
-                        }
-
-                        try:
-
-                            udp_sock.sendto(json.dumps(payload).encode("utf-8"), udp_addr)
-
-                        except Exception:
-
-                            pass
-
-
-
-                except Exception:
-
-                    detach_ac()
-
-                    status_text = "AC:WAIT"
-
-                    cur_time = last_time = best_time = ""
-
-                    lap = pos = sec = 0
-
-                    speed_kmh_raw = 0.0
-
-                    speed_kmh_filt = 0.0
-
-                    rpm = 0
-
-                    gas = brake = 0.0
-
-                    gear_raw = 1
-
-                    steer_deg = 0.0
-
-                    trail.clear()
-
-            else:
-
-                status_text = "AC:WAIT"
-
-                alpha = min(max(float(args.speed_ema), 0.0), 1.0)
-
-                speed_kmh_filt = (0.0 if speed_kmh_filt is None
-
-                                  else (speed_kmh_filt + alpha * (0.0 - speed_kmh_filt)) if alpha > 0.0
-
-                                  else 0.0)
-
-                rpm = 0
-
-                gas = brake = 0.0
-
-                gear_raw = 1
-
-                steer_deg = 0.0
-
-
-
-        # push to plots
-
-        if now - last_graph >= (1.0 / graph_fps):
-
-            last_graph = now
-
-            plot_speed.set_title(f"Speed ({unit_label})")
-
-            plot_speed.push(0, kmh_to_out(speed_kmh_filt or 0.0))
-
-            plot_rpm.push(0, float(rpm))
-
-            plot_ped.push(0, float(gas))
-
-            plot_ped.push(1, float(brake))
-
-
-
-        # draw main UI
-
-        screen.fill((12, 12, 12))
-
-        W, H = screen.get_width(), screen.get_height()
-
-        gap = 10; top_h = 58
-
-        right_w = max(460, int(W * 0.36))
-
-        left_w = W - right_w - gap * 3
-
-        cell_h = (H - top_h - gap * 4) // 3
-
-        x0 = gap; y0 = top_h
-
-
-
-        header_rect = pygame.Rect(gap, gap, W - gap * 2, top_h - gap)
-
-        pygame.draw.rect(screen, (18, 18, 18), header_rect, border_radius=8)
-
-        pygame.draw.rect(screen, (60, 60, 60), header_rect, 1, border_radius=8)
-
-
-
-        btn_w, btn_h = 220, 36
-
-        btn_rect = pygame.Rect(header_rect.right - btn_w - 12, header_rect.centery - btn_h // 2, btn_w, btn_h)
-
-        draw_button(screen, btn_rect, f"Advanced: {'ON' if adv_running else 'OFF'}", adv_running)
-
-
-
-        head_text = f"Car: {car_model}   Track: {track_name}" + (f" [{track_cfg}]" if track_cfg else "")
-
-        head_surf = fontb.render(ellipsize(head_text, fontb, btn_rect.left - header_rect.left - 20), True, (230, 230, 230))
-
-        screen.blit(head_surf, (header_rect.left + 12, header_rect.centery - head_surf.get_height() // 2))
-
-
-
-        r_speed = pygame.Rect(x0, y0, left_w, cell_h)
-
-        r_rpm = pygame.Rect(x0, y0 + cell_h + gap, left_w, cell_h)
-
-        r_ped = pygame.Rect(x0, y0 + 2 * (cell_h + gap), left_w, cell_h)
-
-        plot_speed.draw(screen, r_speed, fontb)
-
-        plot_rpm.draw(screen, r_rpm, fontb)
-
-        plot_ped.draw(screen, r_ped, fontb)
-
-
-
-        r_info = pygame.Rect(x0 + left_w + gap, y0, right_w, H - y0 - gap)
-
-        pygame.draw.rect(screen, (18, 18, 18), r_info, border_radius=8)
-
-        pygame.draw.rect(screen, (60, 60, 60), r_info, 1, border_radius=8)
-
-
-
-        def info_line(lbl: str, val: str, y: int, bold: bool = False) -> int:
-
-            label_max = r_info.width // 2 - 20
-
-            value_max = r_info.width // 2 - 20
-
-            f = fontb if bold else font
-
-            lbl_text = ellipsize(lbl, f, label_max)
-
-            val_text = ellipsize(val, f, value_max)
-
-            screen.blit(f.render(lbl_text, True, (185, 185, 185)), (r_info.left + 12, y))
-
-            screen.blit(f.render(val_text, True, (255, 255, 255)), (r_info.left + r_info.width // 2, y))
-
-            return y + (f.get_height() + 6)
-
-
-
-        speed_out = kmh_to_out(speed_kmh_filt or 0.0)
-
-        fmt_speed = "{:.2f} " + unit_label
-
-        yy = r_info.top + 12
-
-        yy = info_line("Статус", status_text, yy, True)
-
-        yy = info_line("Круг / Позиция", f"{lap} / {pos}", yy)
-
-        yy = info_line("Сектор", f"{sec}", yy)
-
-        yy = info_line("Время круга", (cur_time or "--:--.---"), yy)
-
-        yy = info_line("Прошлый / Лучший", f"{last_time or '--:--.---'} / {best_time or '--:--.---'}", yy)
-
-        yy += 8
-
-        yy = info_line("Скорость", fmt_speed.format(speed_out), yy, True)
-
-        yy = info_line("Обороты", f"{rpm}", yy)
-
-        yy = info_line("Передача", f"{gear_text_offset(gear_raw)} (raw:{gear_raw})", yy)
-
-        yy += 8
-
-        yy = info_line("Педали", f"Газ {gas*100:4.0f}%   Тормоз {brake*100:4.0f}%", yy)
-
-        yy = info_line("Руль (из игры)", f"{steer_deg:+.1f}°", yy)
-
-
-
-        tips = [
-
-            "ESC — выход, Ctrl+C — очистить графики, F11 — поверх всех.",
-
-            "Кнопка Advanced — включает отдельный процесс окна телеметрии.",
-
-            "Карта: map.png / ui/outline.png + data/map.ini; side_l/side_r — границы трассы.",
-
-            "В окне карты: средняя кнопка — панорама, колесо — зум.",
-
-        ]
-
-        ytips = r_info.bottom - 10
-
-        for t in reversed(tips):
-
-            lines = wrap_text(t, font, r_info.width - 24)
-
-            for ln in reversed(lines):
-
-                surf = font.render(ln, True, (150, 150, 150))
-
-                ytips -= surf.get_height()
-
-                screen.blit(surf, (r_info.left + 12, ytips))
-
-            ytips -= 6
-
-
-
-        pygame.display.flip()
-
-        clock.tick(target_fps)
-
-
-
-        # monitor advanced process state
-
-        if adv_running and adv_proc and not adv_proc.is_alive():
-
-            close_advanced()
-
-
-
-    # cleanup
-
-    if csv_fh:
-
-        try: csv_fh.flush()
-
-        except Exception: pass
-
-        csv_fh.close()
-
-    if ac_attached:
-
-        detach_ac()
-
-    if adv_running:
-
-        close_advanced()
-
-    pygame.quit()
-
-
-
-
-
-if __name__ == "__main__":
-
-    main()
-
-
-
+# -*- coding: utf-8 -*-
+
+# ac_telemetry.py
+
+# Assetto Corsa telemetry viewer:
+
+# - Main window: pygame graphs + info; "Advanced" button toggles a separate process with Tk GUI
+
+# - Advanced window (separate process): scrollable cards + map with pan/zoom, side_l/side_r, trajectory overlay
+
+# - Works even if AC not running (lazy-attach loop)
+
+# - Steering angle taken from AC physics (p.steerAngle)
+
+
+
+from __future__ import annotations
+
+
+
+import argparse
+
+import array
+
+import bisect
+
+import ctypes
+
+import ctypes.wintypes as wt
+
+import csv
+
+import json
+
+import math
+
+import os
+
+import queue
+
+import socket
+
+import sys
+
+import threading
+
+import time
+
+from collections import OrderedDict, deque
+
+from dataclasses import dataclass, field
+
+from functools import lru_cache
+
+from pathlib import Path
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from datetime import datetime
+
+
+
+# ----------------------------------------------------------------------
+
+# Optional deps: pygame (main window)
+
+# ----------------------------------------------------------------------
+
+os.environ.setdefault("SDL_JOYSTICK_ALLOW_BACKGROUND_EVENTS", "1")
+
+import pygame  # type: ignore
+
+# pygame-ce: пакетный blit без Rect-результатов; на классическом pygame
+
+# откатываемся на поэлементный Surface.blit
+
+FBLITS_OK = hasattr(pygame.Surface, "fblits")
+
+
+
+# ----------------------------------------------------------------------
+
+# Optional deps: numpy (vectorized plot buffers)
+
+# ----------------------------------------------------------------------
+
+try:
+
+    import numpy as np  # type: ignore
+
+    NUMPY_OK = True
+
+except Exception:
+
+    np = None  # type: ignore
+
+    NUMPY_OK = False
+
+
+
+# Optional deps: numba (JIT для горячих численных циклов)
+
+try:
+
+    from numba import njit  # type: ignore
+
+    NUMBA_OK = True
+
+except Exception:
+
+    njit = None  # type: ignore
+
+    NUMBA_OK = False
+
+
+
+# Optional deps: orjson (быстрый UDP-энкодер; stdlib json как запасной)
+
+try:
+
+    import orjson  # type: ignore
+
+    ORJSON_OK = True
+
+except Exception:
+
+    orjson = None  # type: ignore
+
+    ORJSON_OK = False
+
+
+
+if ORJSON_OK:
+
+    _json_dumps = orjson.dumps
+
+else:
+
+    def _json_dumps(obj) -> bytes:
+
+        return json.dumps(obj).encode("utf-8")
+
+
+
+if NUMBA_OK and NUMPY_OK:
+
+    @njit(cache=True, fastmath=True)
+
+    def _ring_minmax(buf, count):
+
+        lo = buf[0]
+
+        hi = buf[0]
+
+        for i in range(count):
+
+            v = buf[i]
+
+            if v < lo:
+
+                lo = v
+
+            elif v > hi:
+
+                hi = v
+
+        return lo, hi
+
+    @njit(cache=True, fastmath=True)
+
+    def _graph_polyline(ts, vals, t0, scale_x, x0, y_min, scale_y, y1):
+
+        # один проход: отбрасываем NaN и сразу пишем экранные x/y вперемешку
+
+        n = ts.shape[0]
+
+        flat = np.empty(n * 2, dtype=np.float64)
+
+        k = 0
+
+        for i in range(n):
+
+            v = vals[i]
+
+            if v != v:
+
+                continue
+
+            flat[k] = x0 + (ts[i] - t0) * scale_x
+
+            flat[k + 1] = y1 - (v - y_min) * scale_y
+
+            k += 2
+
+        return flat[:k]
+
+    @njit(cache=True, fastmath=True)
+
+    def _filter_speed(vx, vy, vz, kmh_field, prev, alpha, dz, src_code):
+
+        # src_code: 0 = kmh, 1 = vector, 2 = auto
+
+        kmh_vec = math.sqrt(vx * vx + vy * vy + vz * vz) * 3.6
+
+        if src_code == 0 or (src_code == 2 and (kmh_field > 0.05 or kmh_vec < 0.1)):
+
+            raw = kmh_field
+
+        else:
+
+            raw = kmh_vec
+
+        if abs(raw) < dz:
+
+            raw = 0.0
+
+        if alpha > 0.0:
+
+            filt = prev + alpha * (raw - prev)
+
+        else:
+
+            filt = raw
+
+        return raw, filt
+
+    # прогрев JIT при импорте, чтобы первый кадр не платил за компиляцию
+
+    _ring_minmax(np.zeros(1, dtype=np.float32), 1)
+
+    _graph_polyline(np.zeros(1), np.zeros(1, dtype=np.float32), 0.0, 1.0, 0.0, 0.0, 1.0, 0.0)
+
+    _filter_speed(0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 2)
+
+else:
+
+    _ring_minmax = None
+
+    _graph_polyline = None
+
+    def _filter_speed(vx, vy, vz, kmh_field, prev, alpha, dz, src_code):
+
+        kmh_vec = math.sqrt(vx * vx + vy * vy + vz * vz) * 3.6
+
+        if src_code == 0 or (src_code == 2 and (kmh_field > 0.05 or kmh_vec < 0.1)):
+
+            raw = kmh_field
+
+        else:
+
+            raw = kmh_vec
+
+        if abs(raw) < dz:
+
+            raw = 0.0
+
+        filt = prev + alpha * (raw - prev) if alpha > 0.0 else raw
+
+        return raw, filt
+
+
+
+# ----------------------------------------------------------------------
+
+# Shared Memory (Windows)
+
+# ----------------------------------------------------------------------
+
+FILE_MAP_READ = 0x0004
+
+_k32 = ctypes.windll.kernel32
+
+
+
+OpenFileMappingW = _k32.OpenFileMappingW
+
+OpenFileMappingW.argtypes = [wt.DWORD, wt.BOOL, wt.LPCWSTR]
+
+OpenFileMappingW.restype = wt.HANDLE
+
+
+
+MapViewOfFile = _k32.MapViewOfFile
+
+MapViewOfFile.argtypes = [wt.HANDLE, wt.DWORD, wt.DWORD, wt.DWORD, ctypes.c_size_t]
+
+MapViewOfFile.restype = wt.LPVOID
+
+
+
+UnmapViewOfFile = _k32.UnmapViewOfFile
+
+UnmapViewOfFile.argtypes = [wt.LPCVOID]
+
+UnmapViewOfFile.restype = wt.BOOL
+
+
+
+CloseHandle = _k32.CloseHandle
+
+CloseHandle.argtypes = [wt.HANDLE]
+
+CloseHandle.restype = wt.BOOL
+
+
+
+
+
+def wstr(warr) -> str:
+
+    # один C-проход по буферу вместо Python-join посимвольно + find
+
+    try:
+
+        return ctypes.wstring_at(ctypes.addressof(warr), len(warr)).split("\x00", 1)[0]
+
+    except Exception:
+
+        return ""
+
+
+
+
+
+class SHMReader:
+
+    def __init__(self, name: str):
+
+        self.name = name
+
+        self.hMap = None
+
+        self.pView = None
+
+        self._view_cache: Dict[type, Any] = {}
+
+        # struct -> (экземпляр, addressof, sizeof): адрес и размер считаются
+
+        # один раз, горячий copy_into сводится к одному memmove
+
+        self._dst_cache: Dict[type, Tuple[Any, int, int]] = {}
+
+        self._memmove = ctypes.memmove
+
+        self._open()
+
+
+
+    def _try_open(self, nm: str) -> bool:
+
+        h = OpenFileMappingW(FILE_MAP_READ, False, nm)
+
+        if h:
+
+            v = MapViewOfFile(h, FILE_MAP_READ, 0, 0, 0)
+
+            if v:
+
+                self.hMap, self.pView = h, v
+
+                return True
+
+            CloseHandle(h)
+
+        return False
+
+
+
+    def _open(self):
+
+        for nm in (self.name, "Local\\" + self.name, "Global\\" + self.name):
+
+            if self._try_open(nm):
+
+                return
+
+        raise RuntimeError(f"Не удалось открыть Shared Memory '{self.name}'.")
+
+
+
+    def close(self):
+
+        self._view_cache.clear()
+
+        if self.pView:
+
+            UnmapViewOfFile(self.pView)
+
+            self.pView = None
+
+        if self.hMap:
+
+            CloseHandle(self.hMap)
+
+            self.hMap = None
+
+
+
+    def field_arrays(self, ctype_struct, names) -> Dict[str, Any]:
+
+        # numpy-виды на поля переиспользуемого экземпляра copy_into: массивные
+
+        # поля читаются как ndarray без создания ctypes-объектов на каждый тик
+
+        return {n: np.ctypeslib.as_array(getattr(self._dst(ctype_struct)[0], n)) for n in names}
+
+
+
+    def view(self, ctype_struct):
+
+        # Zero-copy: структура наложена прямо на страницу SHM, поля читаются
+
+        # из отображения без memmove; адрес валиден до close()
+
+        if not self.pView:
+
+            raise RuntimeError("SHM not mapped")
+
+        obj = self._view_cache.get(ctype_struct)
+
+        if obj is None:
+
+            obj = self._view_cache[ctype_struct] = ctype_struct.from_address(self.pView)
+
+        return obj
+
+
+
+    def _dst(self, ctype_struct) -> Tuple[Any, int, int]:
+
+        ent = self._dst_cache.get(ctype_struct)
+
+        if ent is None:
+
+            obj = ctype_struct()
+
+            ent = self._dst_cache[ctype_struct] = (obj, ctypes.addressof(obj),
+
+                                                   ctypes.sizeof(ctype_struct))
+
+        return ent
+
+
+
+    def copy_into(self, ctype_struct):
+
+        if not self.pView:
+
+            raise RuntimeError("SHM not mapped")
+
+        # назначение переиспользуется: без аллокации ~1.5 КБ на каждый опрос
+
+        obj, addr, size = self._dst(ctype_struct)
+
+        self._memmove(addr, self.pView, size)
+
+        return obj
+
+
+
+
+
+# Structures (subset)
+
+c_float = ctypes.c_float
+
+c_int = ctypes.c_int
+
+
+
+
+
+class SPageFilePhysics(ctypes.Structure):
+
+    _pack_ = 4
+
+    _fields_ = [
+
+        ("packetId", c_int),
+
+        ("gas", c_float),
+
+        ("brake", c_float),
+
+        ("fuel", c_float),
+
+        ("gear", c_int),  # 0=R,1=N,2=1...
+
+        ("rpms", c_int),
+
+        ("steerAngle", c_float),  # degrees
+
+        ("speedKmh", c_float),
+
+        ("velocity", c_float * 3),  # world m/s
+
+        ("accG", c_float * 3),
+
+
+
+        ("wheelSlip", c_float * 4),
+
+        ("wheelLoad", c_float * 4),            # N
+
+        ("wheelsPressure", c_float * 4),       # psi
+
+        ("wheelAngularSpeed", c_float * 4),    # rad/s
+
+        ("tyreWear", c_float * 4),
+
+        ("tyreDirtyLevel", c_float * 4),
+
+        ("tyreCoreTemperature", c_float * 4),  # °C (core)
+
+        ("camberRAD", c_float * 4),
+
+
+
+        ("suspensionTravel", c_float * 4),     # m
+
+        ("drs", c_float),
+
+        ("tc", c_float),                       # 0..1
+
+        ("heading", c_float),
+
+        ("pitch", c_float),
+
+        ("roll", c_float),
+
+        ("cgHeight", c_float),                 # m
+
+        ("carDamage", c_float * 5),
+
+        ("numberOfTyresOut", c_int),
+
+        ("pitLimiterOn", c_int),
+
+        ("abs", c_float),                      # 0..1
+
+
+
+        ("rideHeight", c_float * 2),           # m [front, rear]
+
+        ("turboBoost", c_float),
+
+        ("ballast", c_float),
+
+        ("airDensity", c_float),               # kg/m^3
+
+    ]
+
+
+
+
+
+class SPageFileGraphics(ctypes.Structure):
+
+    _pack_ = 4
+
+    _fields_ = [
+
+        ("packetId", c_int),
+
+        ("status", c_int),  # 0=OFF,1=REPLAY,2=LIVE,3=PAUSE
+
+        ("session", c_int),
+
+        ("currentTime", wt.WCHAR * 15),
+
+        ("lastTime", wt.WCHAR * 15),
+
+        ("bestTime", wt.WCHAR * 15),
+
+        ("split", wt.WCHAR * 15),
+
+        ("completedLaps", c_int),
+
+        ("position", c_int),
+
+        ("iCurrentTime", c_int),
+
+        ("iLastTime", c_int),
+
+        ("iBestTime", c_int),
+
+        ("sessionTimeLeft", c_float),
+
+        ("distanceTraveled", c_float),
+
+        ("isInPit", c_int),
+
+        ("currentSectorIndex", c_int),
+
+        ("lastSectorTime", c_int),
+
+        ("numberOfLaps", c_int),
+
+        ("tyreCompound", wt.WCHAR * 33),
+
+        ("replayTimeMultiplier", c_float),
+
+        ("normalizedCarPosition", c_float),
+
+        ("carCoordinates", c_float * 3),  # world X,Y,Z
+
+        ("penaltyTime", c_float),
+
+        ("flag", c_int),
+
+        ("idealLineOn", c_int),
+
+        ("isInPitLane", c_int),
+
+        ("surfaceGrip", c_float),
+
+    ]
+
+
+
+
+
+class SPageFileStatic(ctypes.Structure):
+
+    _pack_ = 4
+
+    _fields_ = [
+
+        ("smVersion", wt.WCHAR * 15),
+
+        ("acVersion", wt.WCHAR * 15),
+
+        ("numberOfSessions", c_int),
+
+        ("numCars", c_int),
+
+        ("carModel", wt.WCHAR * 33),
+
+        ("track", wt.WCHAR * 33),
+
+        ("playerName", wt.WCHAR * 33),
+
+        ("playerSurname", wt.WCHAR * 33),
+
+        ("playerNick", wt.WCHAR * 33),
+
+        ("sectorCount", c_int),
+
+
+
+        ("maxTorque", c_float),
+
+        ("maxPower", c_float),
+
+        ("maxRpm", c_int),
+
+        ("maxFuel", c_float),
+
+        ("suspensionMaxTravel", c_float * 4),
+
+        ("tyreRadius", c_float * 4),
+
+        ("maxTurboBoost", c_float),
+
+        ("airTemp", c_float),
+
+        ("roadTemp", c_float),
+
+        ("penaltiesEnabled", wt.BOOL),
+
+
+
+        ("aidFuelRate", c_float),
+
+        ("aidTireRate", c_float),
+
+        ("aidMechanicalDamage", c_float),
+
+        ("aidAllowTyreBlankets", wt.BOOL),
+
+        ("aidStability", c_float),
+
+        ("aidAutoClutch", wt.BOOL),
+
+        ("aidAutoBlip", wt.BOOL),
+
+
+
+        ("trackConfig", wt.WCHAR * 33),
+
+    ]
+
+
+
+
+
+AC_STATUS = {0: "OFF", 1: "REPLAY", 2: "LIVE", 3: "PAUSE"}
+
+
+
+
+
+def psi_to_bar(psi: float) -> float:
+
+    return psi * 0.0689475729
+
+
+
+
+
+# готовые строки передач: вызывается каждый кадр, str(int) аллоцирует
+
+_GEAR_TABLE = ("R", "N", "1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "11", "12")
+
+
+
+def gear_text_offset(raw: int) -> str:
+
+    if 0 <= raw < len(_GEAR_TABLE):
+
+        return _GEAR_TABLE[raw]
+
+    return "R" if raw <= 0 else str(raw - 1)
+
+
+
+
+
+# ----------------------------------------------------------------------
+
+# Plot helpers (pygame)
+
+# ----------------------------------------------------------------------
+
+class Series:
+
+    def __init__(self, name: str, color: Tuple[int, int, int], y_min=None, y_max=None, autoscale=True):
+
+        self.name = name
+
+        self.color = color
+
+        self.y_min = y_min
+
+        self.y_max = y_max
+
+        self.autoscale = autoscale
+
+        # Кольцо выделяется в Plot.add_series (там известна capacity):
+
+        # ndarray с numpy, иначе обычный предвыделенный list — без deque
+
+        self.ring = None
+
+        self.pts = None
+
+        self.head = 0
+
+        self.count = 0
+
+        # монотонные деки для скользящих max/min окна: autoscale за O(1)
+
+        # вместо прохода по всему кольцу на каждый кадр
+
+        self.mono_max: deque = deque()
+
+        self.mono_min: deque = deque()
+
+        self.idx = 0
+
+
+
+    def clear(self):
+
+        self.head = 0
+
+        self.count = 0
+
+        self.mono_max.clear()
+
+        self.mono_min.clear()
+
+        self.idx = 0
+
+
+
+    def tail(self, n: int):
+
+        # последние n сэмплов в хронологическом порядке (view, если без разрыва)
+
+        n = min(n, self.count)
+
+        if n <= 0:
+
+            return None
+
+        start = self.head - n
+
+        if start >= 0:
+
+            return self.ring[start:self.head]
+
+        if isinstance(self.ring, list):
+
+            return self.ring[start:] + self.ring[:self.head]
+
+        return np.concatenate((self.ring[start:], self.ring[:self.head]))
+
+
+
+
+
+class Plot:
+
+    def __init__(self, title: str, capacity=600, bg=(18, 18, 18), grid=(40, 40, 40)):
+
+        self.title = title
+
+        self.capacity = capacity
+
+        self.bg = bg
+
+        self.grid = grid
+
+        self.series: List[Series] = []
+
+        self._bg_cache: Dict[Tuple[int, int, str], pygame.Surface] = {}
+
+        self._lbl_cache: Dict[str, pygame.Surface] = {}
+
+        self._xbase = np.arange(capacity, dtype=np.int32) if NUMPY_OK else None
+
+
+
+    def set_title(self, title): self.title = title
+
+    def add_series(self, s: Series):
+
+        if NUMPY_OK:
+
+            s.ring = np.empty(self.capacity, dtype=np.float32)
+
+            s.pts = np.empty((self.capacity, 2), dtype=np.int32)
+
+        else:
+
+            s.ring = [0.0] * self.capacity
+
+        self.series.append(s)
+
+
+
+    def push(self, idx: int, value: float):
+
+        # одна запись + два инкремента вместо append/popleft на каждый тик
+
+        s = self.series[idx]
+
+        s.ring[s.head] = value
+
+        s.head = (s.head + 1) % self.capacity
+
+        if s.count < self.capacity:
+
+            s.count += 1
+
+        # поддержка монотонных дек: амортизированно O(1) на сэмпл
+
+        i = s.idx
+
+        edge = i - self.capacity
+
+        mm = s.mono_max
+
+        while mm and mm[-1][0] <= value:
+
+            mm.pop()
+
+        mm.append((value, i))
+
+        if mm[0][1] <= edge:
+
+            mm.popleft()
+
+        mn = s.mono_min
+
+        while mn and mn[-1][0] >= value:
+
+            mn.pop()
+
+        mn.append((value, i))
+
+        if mn[0][1] <= edge:
+
+            mn.popleft()
+
+        s.idx = i + 1
+
+
+
+    def _calc_scale(self) -> Tuple[float, float]:
+
+        vmins: List[float] = []
+
+        vmaxs: List[float] = []
+
+        for s in self.series:
+
+            if not s.count:
+
+                continue
+
+            if s.mono_max and s.mono_min:
+
+                lo = s.mono_min[0][0]
+
+                hi = s.mono_max[0][0]
+
+            elif _ring_minmax is not None and s.pts is not None:
+
+                lo, hi = _ring_minmax(s.ring, s.count)
+
+                lo, hi = float(lo), float(hi)
+
+            else:
+
+                arr = s.ring[:s.count]
+
+                if isinstance(arr, list):
+
+                    lo, hi = min(arr), max(arr)
+
+                else:
+
+                    lo, hi = float(arr.min()), float(arr.max())
+
+            if s.autoscale:
+
+                vmins.append(lo)
+
+                vmaxs.append(hi)
+
+            else:
+
+                vmins.append(s.y_min if s.y_min is not None else lo)
+
+                vmaxs.append(s.y_max if s.y_max is not None else hi)
+
+        if not vmins:
+
+            return 0.0, 1.0
+
+        y_min, y_max = min(vmins), max(vmaxs)
+
+        if y_min == y_max:
+
+            y_min -= 1.0
+
+            y_max += 1.0
+
+        return y_min, y_max
+
+
+
+    def _label(self, txt: str, font) -> pygame.Surface:
+
+        s = self._lbl_cache.get(txt)
+
+        if s is None:
+
+            if len(self._lbl_cache) > 64:
+
+                self._lbl_cache.clear()
+
+            s = self._lbl_cache[txt] = font.render(txt, True, (150, 150, 150))
+
+        return s
+
+
+
+    def draw(self, surf, rect, font, title_color=(200, 200, 200), axis_color=(70, 70, 70)):
+
+        # Фон/сетка/рамка/заголовок статичны для данного размера — рендерим
+
+        # один раз в Surface под формат экрана и дальше только blit'им
+
+        key = (rect.width, rect.height, self.title)
+
+        bg = self._bg_cache.get(key)
+
+        if bg is None:
+
+            if len(self._bg_cache) > 8:
+
+                self._bg_cache.clear()
+
+            bg = pygame.Surface((rect.width, rect.height)).convert()
+
+            bg.fill(self.bg)
+
+            for i in range(1, 4):
+
+                y = int(rect.height * i / 4)
+
+                pygame.draw.line(bg, self.grid, (0, y), (rect.width, y), 1)
+
+            bg.blit(font.render(self.title, True, title_color), (8, 6))
+
+            pygame.draw.rect(bg, axis_color, bg.get_rect(), 1)
+
+            self._bg_cache[key] = bg
+
+        surf.blit(bg, rect.topleft)
+
+        y_min, y_max = self._calc_scale()
+
+        y_rng = (y_max - y_min) or 1.0
+
+        pad_top = 22
+
+        w = rect.width
+
+        h = rect.height - pad_top
+
+        ox = rect.left
+
+        oy = rect.top + pad_top
+
+        for s in self.series:
+
+            window = s.tail(w)
+
+            if window is None or len(window) < 2: continue
+
+            if s.pts is not None:
+
+                # пиксели считаются одной векторной операцией вместо цикла по точкам;
+
+                # точки пишутся в предвыделенный (capacity, 2) буфер — без кортежей
+
+                n = len(window)
+
+                pts = s.pts[:n]
+
+                pts[:, 0] = self._xbase[:n] + ox
+
+                pts[:, 1] = (oy + (h - 1)) - ((window - y_min) * ((h - 1) / y_rng)).astype(np.int32)
+
+                pygame.draw.aalines(surf, s.color, False, pts)
+
+                continue
+
+            pts = []
+
+            for i, val in enumerate(window):
+
+                x = ox + i
+
+                y_norm = (val - y_min) / y_rng
+
+                y = oy + (h - 1) - int(y_norm * (h - 1))
+
+                pts.append((x, y))
+
+            if len(pts) >= 2:
+
+                pygame.draw.aalines(surf, s.color, False, pts)
+
+        mini = f"{y_min:.2f}"; maxi = f"{y_max:.2f}"
+
+        surf.blit(self._label(maxi, font), (rect.right - 60, rect.top + 4))
+
+        surf.blit(self._label(mini, font), (rect.right - 60, rect.bottom - 20))
+
+
+
+
+
+# Подписи повторяются кадр за кадром с теми же текстом/шириной/шрифтом:
+
+# на устоявшихся кадрах измерения текста сводятся к lookup'у в кэше
+
+@lru_cache(maxsize=2048)
+
+def ellipsize(text: str, font: pygame.font.Font, max_width: int) -> str:
+
+    if font.size(text)[0] <= max_width:
+
+        return text
+
+    ell = "…"
+
+    w_ell = font.size(ell)[0]
+
+    lo, hi = 0, len(text)
+
+    while lo < hi:
+
+        mid = (lo + hi) // 2
+
+        if font.size(text[:mid])[0] + w_ell <= max_width:
+
+            lo = mid + 1
+
+        else:
+
+            hi = mid
+
+    return text[:max(0, lo - 1)] + ell
+
+
+
+
+
+# LRU-кэш растеризации текста: SDL_ttf не перерисовывает одинаковые строки,
+
+# статичные подписи HUD стоят один render на всё время работы
+
+_TEXT_CACHE: "OrderedDict[Tuple[int, str, Tuple[int, int, int]], pygame.Surface]" = OrderedDict()
+
+_TEXT_CACHE_CAP = 512
+
+
+
+def render_cached(font: pygame.font.Font, text: str, color: Tuple[int, int, int]) -> pygame.Surface:
+
+    key = (id(font), text, color)
+
+    surf = _TEXT_CACHE.get(key)
+
+    if surf is None:
+
+        surf = font.render(text, True, color)
+
+        if len(_TEXT_CACHE) >= _TEXT_CACHE_CAP:
+
+            _TEXT_CACHE.popitem(last=False)
+
+        _TEXT_CACHE[key] = surf
+
+    else:
+
+        _TEXT_CACHE.move_to_end(key)
+
+    return surf
+
+
+
+
+
+# фон + рамка панели запекаются один раз на размер: дуги border_radius
+
+# растеризуются в кэш, кадру остаётся обычный blit
+
+_CHROME_CACHE: Dict[Tuple[int, int], pygame.Surface] = {}
+
+
+
+def panel_chrome(size: Tuple[int, int]) -> pygame.Surface:
+
+    surf = _CHROME_CACHE.get(size)
+
+    if surf is None:
+
+        if len(_CHROME_CACHE) > 8:
+
+            _CHROME_CACHE.clear()
+
+        surf = pygame.Surface(size, pygame.SRCALPHA)
+
+        rect = surf.get_rect()
+
+        pygame.draw.rect(surf, (18, 18, 18), rect, border_radius=8)
+
+        pygame.draw.rect(surf, (60, 60, 60), rect, 1, border_radius=8)
+
+        _CHROME_CACHE[size] = surf
+
+    return surf
+
+
+
+
+
+@lru_cache(maxsize=512)
+
+def wrap_text(text: str, font: pygame.font.Font, max_width: int) -> List[str]:
+
+    # ширина копится по словам: каждое слово меряется ровно один раз вместо
+
+    # повторного font.size растущей строки (для моноширинного Consolas
+
+    # сумма ширин слов и пробелов совпадает с шириной строки)
+
+    space_w = font.size(" ")[0]
+
+    lines: List[str] = []
+
+    cur: List[str] = []
+
+    cur_w = 0
+
+    for w in text.split():
+
+        ww = font.size(w)[0]
+
+        if ww > max_width:
+
+            w = ellipsize(w, font, max_width)
+
+            ww = font.size(w)[0]
+
+        add = ww if not cur else ww + space_w
+
+        if cur and cur_w + add > max_width:
+
+            lines.append(" ".join(cur))
+
+            cur = [w]
+
+            cur_w = ww
+
+        else:
+
+            cur.append(w)
+
+            cur_w += add
+
+    if cur:
+
+        lines.append(" ".join(cur))
+
+    return lines
+
+
+
+
+
+def set_topmost_for_pygame_window(is_topmost=True):
+
+    try:
+
+        hwnd = pygame.display.get_wm_info().get("window")
+
+        if not hwnd:
+
+            return
+
+        HWND_TOPMOST, HWND_NOTOPMOST = -1, -2
+
+        SWP_NOMOVE, SWP_NOSIZE, SWP_SHOWWINDOW = 0x2, 0x1, 0x0040
+
+        ctypes.windll.user32.SetWindowPos(
+
+            int(hwnd),
+
+            HWND_TOPMOST if is_topmost else HWND_NOTOPMOST,
+
+            0, 0, 0, 0,
+
+            SWP_NOMOVE | SWP_NOSIZE | SWP_SHOWWINDOW,
+
+        )
+
+    except Exception:
+
+        pass
+
+
+
+
+
+# ----------------------------------------------------------------------
+
+# Track assets (map.ini / map.png / side_l.csv / side_r.csv)
+
+# ----------------------------------------------------------------------
+
+def _int(s: str, default: Union[int, float]) -> int:
+
+    try:
+
+        return int(s)
+
+    except Exception:
+
+        try:
+
+            return int(round(float(s)))
+
+        except Exception:
+
+            try:
+
+                return int(round(float(default)))
+
+            except Exception:
+
+                return 0
+
+
+
+
+
+def _float(s: str, default: float) -> float:
+
+    try:
+
+        return float(s)
+
+    except Exception:
+
+        return float(default)
+
+
+
+
+
+# Диспетчеризация ключей map.ini: алиасы развёрнуты заранее,
+
+# вместо цепочки if/elif — один dict.get на строку
+
+_MAP_INI_KEYS: Dict[str, Tuple[str, Any]] = {
+
+    "WIDTH": ("WIDTH", _int),
+
+    "HEIGHT": ("HEIGHT", _int),
+
+    "SCALE_FACTOR": ("SCALE_FACTOR", _float),
+
+    "X_OFFSET": ("X_OFFSET", _float),
+
+    "XOFF": ("X_OFFSET", _float),
+
+    "X": ("X_OFFSET", _float),
+
+    "Z_OFFSET": ("Z_OFFSET", _float),
+
+    "Y_OFFSET": ("Z_OFFSET", _float),
+
+    "Z": ("Z_OFFSET", _float),
+
+    "Y": ("Z_OFFSET", _float),
+
+}
+
+
+
+def load_map_ini(path: Path) -> Dict[str, float]:
+
+    defaults = dict(WIDTH=1024, HEIGHT=1024, SCALE_FACTOR=1.0, X_OFFSET=512.0, Z_OFFSET=512.0)
+
+    vals = defaults.copy()
+
+    try:
+
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+
+            for line in f:
+
+                ln = line.strip()
+
+                if not ln or ln.startswith(";") or "=" not in ln:
+
+                    continue
+
+                k, v = [x.strip() for x in ln.split("=", 1)]
+
+                target, conv = _MAP_INI_KEYS.get(k.upper(), (None, None))
+
+                if target:
+
+                    vals[target] = conv(v, vals[target])
+
+    except Exception:
+
+        pass
+
+    return dict(w=float(vals["WIDTH"]), h=float(vals["HEIGHT"]), sx=float(vals["SCALE_FACTOR"]),
+
+                ox=float(vals["X_OFFSET"]), oz=float(vals["Z_OFFSET"]), invert_y=False)
+
+
+
+
+
+def guess_ac_roots(cli_root: Optional[str]) -> List[Path]:
+
+    roots: List[Path] = []
+
+    if cli_root:
+
+        roots.append(Path(cli_root))
+
+    env = os.environ.get("AC_ROOT")
+
+    if env:
+
+        roots.append(Path(env))
+
+    roots += [
+
+        Path(r"C:\Program Files (x86)\Steam\steamapps\common\assettocorsa"),
+
+        Path(r"C:\Program Files\Steam\steamapps\common\assettocorsa"),
+
+    ]
+
+    out: List[Path] = []
+
+    seen = set()
+
+    for p in roots:
+
+        try:
+
+            rp = p.resolve()
+
+            if rp in seen: continue
+
+            if rp.exists():
+
+                out.append(rp)
+
+                seen.add(rp)
+
+        except Exception:
+
+            pass
+
+    return out
+
+
+
+
+
+class TrackAssets:
+
+    def __init__(self):
+
+        self.base: Optional[Path] = None
+
+        self.map_png: Optional[Path] = None
+
+        self.outline_png: Optional[Path] = None
+
+        self.map_ini: Optional[Path] = None
+
+        self.side_l: Optional[Path] = None
+
+        self.side_r: Optional[Path] = None
+
+        self.transform: Optional[Dict[str, float]] = None  # sx, ox, oz, w, h, invert_y
+
+
+
+
+
+def find_track_assets(track: Optional[str], track_cfg: Optional[str], ac_roots: List[Path]) -> Optional[TrackAssets]:
+
+    if not track:
+
+        return None
+
+
+
+    def scan_base(base: Path) -> Optional[TrackAssets]:
+
+        if not base.exists():
+
+            return None
+
+        a = TrackAssets()
+
+        a.base = base
+
+        cand_inis = [base / "data" / "map.ini"] + list(base.glob("*/data/map.ini")) + list(base.glob("layout_*/*/data/map.ini"))
+
+        for c in cand_inis:
+
+            if c.exists():
+
+                a.map_ini = c
+
+                a.transform = load_map_ini(c)
+
+                break
+
+        cand_maps: List[Path] = []
+
+        if track_cfg:
+
+            for lk in [track_cfg, f"layout_{track_cfg}"]:
+
+                cand_maps += list((base / lk).glob("map.png"))
+
+                cand_maps += list((base / lk / "ui").glob("map.png"))
+
+                cand_maps += list((base / "ui" / lk).glob("map.png"))
+
+                cand_maps += list((base / "ui" / lk).glob("outline.png"))
+
+        cand_maps += [base / "map.png", base / "ui" / "map.png", base / "ui" / "outline.png"]
+
+        cand_maps += list(base.glob("*/map.png")) + list(base.glob("*/ui/outline.png"))
+
+        for c in cand_maps:
+
+            if c.exists():
+
+                if c.name.lower() == "map.png": a.map_png = c; break
+
+                if a.outline_png is None and c.name.lower() == "outline.png": a.outline_png = c
+
+        if a.map_ini:
+
+            dat = a.map_ini.parent
+
+            L = dat / "side_l.csv"
+
+            R = dat / "side_r.csv"
+
+            a.side_l = L if L.exists() else None
+
+            a.side_r = R if R.exists() else None
+
+        return a
+
+
+
+    for root in ac_roots:
+
+        base = root / "content" / "tracks" / track
+
+        if base.exists():
+
+            res = scan_base(base)
+
+            if res and (res.map_png or res.outline_png or res.map_ini):
+
+                return res
+
+
+
+    for root in ac_roots:
+
+        troot = root / "content" / "tracks"
+
+        if not troot.exists(): continue
+
+        for p in troot.glob(track + "*"):
+
+            if p.is_dir():
+
+                res = scan_base(p)
+
+                if res and (res.map_png or res.outline_png or res.map_ini):
+
+                    return res
+
+    return None
+
+
+
+
+
+def read_side_csv_points(path: Path):
+
+    # Быстрый путь: C-парсер numpy вместо csv.reader + float() по ячейкам;
+
+    # на неожиданном формате откатываемся на старый построчный разбор
+
+    if NUMPY_OK:
+
+        try:
+
+            arr = np.loadtxt(path, delimiter=",", usecols=(0, 1), dtype=np.float32, comments="#", ndmin=2)
+
+            if arr.shape[0]:
+
+                return arr
+
+        except Exception:
+
+            pass
+
+    pts: List[Tuple[float, float]] = []
+
+    try:
+
+        with open(path, "r", newline="", encoding="utf-8", errors="ignore") as f:
+
+            rd = csv.reader(f)
+
+            for row in rd:
+
+                floats: List[float] = []
+
+                for cell in row:
+
+                    try:
+
+                        floats.append(float(cell))
+
+                    except Exception:
+
+                        pass
+
+                if len(floats) >= 2:
+
+                    x, z = floats[0], floats[1]
+
+                    pts.append((x, z))
+
+    except Exception:
+
+        pass
+
+    return pts
+
+
+
+
+
+# ----------------------------------------------------------------------
+
+# Advanced window process (Tk in its own process)
+
+# ----------------------------------------------------------------------
+
+# Предсвязанные форматтеры значений карточек: без повторного парсинга
+# f-строки на каждое поле каждого снапшота
+
+_FMT0 = "{:.0f}".format
+
+_FMT1 = "{:.1f}".format
+
+_FMT2 = "{:.2f}".format
+
+_FMT3 = "{:.3f}".format
+
+
+
+ADV_TRAIL_CAP = 3000
+
+
+
+class AdvSnap(ctypes.Structure):
+
+    # Снимок состояния для Advanced-окна: живёт в multiprocessing.shared_memory
+
+    # и защищён seqlock-счётчиком (seq нечётный — идёт запись). Вместо pickle
+
+    # целого dict в Queue на каждый тик — один memmove на стороне читателя.
+
+    _fields_ = [
+
+        ("seq", ctypes.c_uint32),
+
+        ("timestamp", ctypes.c_double),
+
+        ("carModel", ctypes.c_wchar * 64),
+
+        ("track", ctypes.c_wchar * 64),
+
+        ("trackConfig", ctypes.c_wchar * 64),
+
+        ("time_current", ctypes.c_wchar * 16),
+
+        ("time_last", ctypes.c_wchar * 16),
+
+        ("time_best", ctypes.c_wchar * 16),
+
+        ("lap", c_int),
+
+        ("position", c_int),
+
+        ("sector", c_int),
+
+        ("rpm", c_int),
+
+        ("suspensionTravel", c_float * 4),
+
+        ("rideHeight", c_float * 2),
+
+        ("wheelLoad", c_float * 4),
+
+        ("camberRAD", c_float * 4),
+
+        ("wheelAngularSpeed", c_float * 4),
+
+        ("wheelLinearKmh", c_float * 4),
+
+        ("wheelsPressurePsi", c_float * 4),
+
+        ("tyreCoreTemperature", c_float * 4),
+
+        ("drs", c_float),
+
+        ("tc", c_float),
+
+        ("abs", c_float),
+
+        ("airDensity", c_float),
+
+        ("cgHeight", c_float),
+
+        ("surfaceGrip", c_float),
+
+        ("steerAngle", c_float),
+
+        ("speedKmh", c_float),
+
+        ("gas", c_float),
+
+        ("brake", c_float),
+
+        ("car_x", c_float),
+
+        ("car_z", c_float),
+
+        ("trail_head", ctypes.c_uint32),
+
+        ("trail_count", ctypes.c_uint32),
+
+        ("trail", (c_float * 2) * ADV_TRAIL_CAP),
+
+    ]
+
+
+
+def adv_snap_to_data(sn: "AdvSnap") -> Dict[str, Any]:
+
+    # Разворачиваем struct обратно в dict с теми же ключами, что слал Queue-путь
+
+    n = int(sn.trail_count)
+
+    h = int(sn.trail_head)
+
+    tr = sn.trail
+
+    if n < ADV_TRAIL_CAP:
+
+        trail_pts = [(tr[i][0], tr[i][1]) for i in range(n)]
+
+    else:
+
+        trail_pts = [(tr[(h + i) % ADV_TRAIL_CAP][0], tr[(h + i) % ADV_TRAIL_CAP][1]) for i in range(n)]
+
+    return {
+
+        "carModel": sn.carModel, "track": sn.track, "trackConfig": sn.trackConfig,
+
+        "lap": int(sn.lap), "position": int(sn.position), "sector": int(sn.sector),
+
+        "time_current": sn.time_current or "--:--.---",
+
+        "time_last": sn.time_last or "--:--.---",
+
+        "time_best": sn.time_best or "--:--.---",
+
+        "suspensionTravel": [float(v) for v in sn.suspensionTravel],
+
+        "rideHeight": [float(v) for v in sn.rideHeight],
+
+        "wheelLoad": [float(v) for v in sn.wheelLoad],
+
+        "camberRAD": [float(v) for v in sn.camberRAD],
+
+        "wheelAngularSpeed": [float(v) for v in sn.wheelAngularSpeed],
+
+        "wheelLinearKmh": [float(v) for v in sn.wheelLinearKmh],
+
+        "wheelsPressurePsi": [float(v) for v in sn.wheelsPressurePsi],
+
+        "tyreCoreTemperature": [float(v) for v in sn.tyreCoreTemperature],
+
+        "drs": float(sn.drs), "tc": float(sn.tc), "abs": float(getattr(sn, "abs")),
+
+        "airDensity": float(sn.airDensity), "cgHeight": float(sn.cgHeight),
+
+        "surfaceGrip": float(sn.surfaceGrip),
+
+        "steerAngle": float(sn.steerAngle),
+
+        "timestamp": float(sn.timestamp),
+
+        "speedKmh": float(sn.speedKmh),
+
+        "rpm": int(sn.rpm),
+
+        "gas": float(sn.gas),
+
+        "brake": float(sn.brake),
+
+        "car_pos": [float(sn.car_x), float(sn.car_z)],
+
+        "trail": trail_pts,
+
+    }
+
+
+
+
+
+@lru_cache(maxsize=None)
+
+def value_getter(key: str, idx: Optional[int] = None):
+
+    # специализация при построении: ветка по idx выбирается один раз,
+
+    # горячий экстрактор обходится без try/except; lru_cache отдаёт один и
+
+    # тот же объект-замыкание на повторный (key, idx)
+
+    if idx is None:
+
+        def _scalar(data: Dict[str, Any]):
+
+            return data.get(key)
+
+        return _scalar
+
+    def _indexed(data: Dict[str, Any]):
+
+        value = data.get(key)
+
+        if isinstance(value, (list, tuple)) and idx < len(value):
+
+            return value[idx]
+
+        return None
+
+    return _indexed
+
+
+
+
+
+# конфигурация графиков строится один раз на процесс; потребители читают
+
+# словари серий, не изменяя их
+
+GRAPH_CONFIGS = [
+
+    {
+
+        "title": "Скорость (km/h)",
+
+        "series": [
+
+            {"name": "Speed", "color": "#4fa3ff", "column": "speedKmh", "extract": value_getter("speedKmh")},
+
+        ],
+
+    },
+
+    {
+
+        "title": "Обороты двигателя",
+
+        "series": [
+
+            {"name": "RPM", "color": "#ffae4f", "column": "rpm", "extract": value_getter("rpm")},
+
+        ],
+
+    },
+
+    {
+
+        "title": "Педали",
+
+        "series": [
+
+            {"name": "Газ", "color": "#5ecb5e", "column": "gas", "extract": value_getter("gas")},
+
+            {"name": "Тормоз", "color": "#ff6464", "column": "brake", "extract": value_getter("brake")},
+
+        ],
+
+    },
+
+    {
+
+        "title": "Температура шин (°C)",
+
+        "series": [
+
+            {"name": "FL", "color": "#ff7070", "column": ("tyreCoreTemperature", 0), "extract": value_getter("tyreCoreTemperature", 0)},
+
+            {"name": "FR", "color": "#ffb470", "column": ("tyreCoreTemperature", 1), "extract": value_getter("tyreCoreTemperature", 1)},
+
+            {"name": "RL", "color": "#70baff", "column": ("tyreCoreTemperature", 2), "extract": value_getter("tyreCoreTemperature", 2)},
+
+            {"name": "RR", "color": "#70ffac", "column": ("tyreCoreTemperature", 3), "extract": value_getter("tyreCoreTemperature", 3)},
+
+        ],
+
+    },
+
+]
+
+
+
+def advanced_process_main(state_queue: "queue.Queue", ac_roots_list: List[str], manual_map_str: Optional[str], poll_ms: int, shm_name: Optional[str] = None):
+
+    # Local imports here to keep Tk only in this process
+
+    try:
+
+        import tkinter as tk  # type: ignore
+
+        from tkinter import ttk  # type: ignore
+
+        TK_OK = True
+
+    except Exception:
+
+        TK_OK = False
+
+        return
+
+
+
+    # Optional Pillow for high-quality resize
+
+    try:
+
+        from PIL import Image, ImageTk  # type: ignore
+
+        PIL_OK = True
+
+    except Exception:
+
+        Image = None  # type: ignore
+
+        ImageTk = None  # type: ignore
+
+        PIL_OK = False
+
+
+
+    ac_roots = [Path(p) for p in ac_roots_list]
+
+    manual_map = Path(manual_map_str).resolve() if manual_map_str else None
+
+
+
+    class MapPanel:
+
+        def __init__(self, canvas: "tk.Canvas"):
+
+            self.cv = canvas
+
+            self.map_img_tk = None
+
+            self.map_img_pil = None
+
+            self._view_img = None
+
+            self._view_img_size = None
+
+            self._view_img_src = None
+
+            # Кэш ресайзов по (iw, ih): панорамирование без зума не пересчитывает BILINEAR
+
+            self._resize_cache: Dict[Tuple[int, int], Any] = {}
+
+            # Постоянные canvas-элементы: на кадре только coords/itemconfigure,
+
+            # без delete("all") и пересоздания item'ов
+
+            self._map_item = None
+
+            self._ph_item = None
+
+            self._car_item = None
+
+            self._you_item = None
+
+            self._line_items: Dict[str, Any] = {}
+
+            self._line_state: Dict[str, str] = {}
+
+            # экранные координаты статичных контуров (обочины) по текущему виду:
+
+            # пересчёт только при смене трансформации, кадр к кадру — готовый список
+
+            self._poly_cache: Dict[str, Tuple[Any, Optional[List[float]]]] = {}
+
+            self._redraw_pending = False
+
+            # размеры канвы кэшируются из <Configure>: winfo_width/height
+
+            # ходят в Tcl на каждый вызов
+
+            self._win_w = 0
+
+            self._win_h = 0
+
+            self.map_w = 1.0
+
+            self.map_h = 1.0
+
+            self.view_scale = 1.0
+
+            self.view_dx = 0.0
+
+            self.view_dy = 0.0
+
+            self.pan_start = None
+
+            self.sideL_img: List[Tuple[float, float]] = []
+
+            self.sideR_img: List[Tuple[float, float]] = []
+
+            self.trail_img: List[Tuple[float, float]] = []
+
+            self.track_assets: Optional[TrackAssets] = None
+
+            self.transform: Optional[Dict[str, float]] = None
+
+            self.last_track = None
+
+            self.last_cfg = None
+
+            self.base_w = 1.0
+
+            self.base_h = 1.0
+
+            self.scale_factor = 1.0
+
+            self.offset_x = 0.0
+
+            self.offset_z = 0.0
+
+            self.invert_y = False
+
+            # готовые аффинные коэффициенты world->img (см. _update_affine)
+
+            self._ax = self._ay = 1.0
+
+            self._bx = self._by = 0.0
+
+            self.center_on_car = False
+
+            self.center_offset: Tuple[float, float] = (0.5, 0.5)
+
+            self.last_car_pos: Optional[Tuple[float, float]] = None
+
+            self.min_scale = 0.05
+
+            self.max_scale = 12.0
+
+
+
+            self.cv.bind("<Configure>", self._on_configure)
+
+            self.cv.bind("<ButtonPress-1>", self._start_pan)
+
+            self.cv.bind("<B1-Motion>", self._do_pan)
+
+            self.cv.bind("<ButtonRelease-1>", self._stop_pan)
+
+            self.cv.bind("<ButtonPress-2>", self._start_pan)
+
+            self.cv.bind("<B2-Motion>", self._do_pan)
+
+            self.cv.bind("<ButtonRelease-2>", self._stop_pan)
+
+            self.cv.bind("<MouseWheel>", self._zoom)
+
+            self.cv.bind("<Button-4>", self._zoom)
+
+            self.cv.bind("<Button-5>", self._zoom)
+
+
+
+        def _start_pan(self, e):
+
+            if self.center_on_car:
+
+                return 'break'
+
+            self.pan_start = (e.x, e.y)
+
+            return 'break'
+
+
+
+        def _do_pan(self, e):
+
+            if self.center_on_car or not self.pan_start:
+
+                return 'break'
+
+            sx, sy = self.pan_start
+
+            self.view_dx += (e.x - sx)
+
+            self.view_dy += (e.y - sy)
+
+            self.pan_start = (e.x, e.y)
+
+            self.schedule_redraw()
+
+            return 'break'
+
+
+
+        def _stop_pan(self, _e):
+
+            self.pan_start = None
+
+            return 'break'
+
+
+
+        def _zoom(self, e):
+
+            delta = getattr(e, 'delta', 0)
+
+            if not delta and hasattr(e, 'num') and e.num in (4, 5):
+
+                delta = 120 if e.num == 4 else -120
+
+            if not delta:
+
+                return 'break'
+
+            factor = 1.1 if delta > 0 else 0.9
+
+            new_scale = max(self.min_scale, min(self.max_scale, self.view_scale * factor))
+
+            if self.center_on_car and self.last_car_pos:
+
+                self.view_scale = new_scale
+
+                self.recenter_on_car()
+
+                self.schedule_redraw()
+
+                return 'break'
+
+            mx, my = e.x, e.y
+
+            ix = (mx - self.view_dx) / (self.view_scale or 1.0)
+
+            iy = (my - self.view_dy) / (self.view_scale or 1.0)
+
+            self.view_scale = new_scale
+
+            self.view_dx = mx - ix * self.view_scale
+
+            self.view_dy = my - iy * self.view_scale
+
+            self.schedule_redraw()
+
+            return 'break'
+
+
+
+        def _update_affine(self):
+
+            # Коэффициенты пересчитываются только при смене трансформации:
+
+            # per-point путь остаётся без деления и ветвления по invert_y
+
+            f = self.scale_factor or 1.0
+
+            self._ax = 1.0 / f
+
+            self._bx = self.offset_x / f
+
+            if self.invert_y:
+
+                self._ay = -1.0 / f
+
+                self._by = (self.base_h or self.map_h or 1.0) - self.offset_z / f
+
+            else:
+
+                self._ay = 1.0 / f
+
+                self._by = self.offset_z / f
+
+
+
+        def _update_transform_cache(self):
+
+            if not self.transform:
+
+                self.scale_factor = 1.0
+
+                self.offset_x = 0.0
+
+                self.offset_z = 0.0
+
+                self.invert_y = False
+
+                self.base_w = float(self.map_w or 1.0)
+
+                self.base_h = float(self.map_h or 1.0)
+
+                self._update_affine()
+
+                return
+
+            try:
+
+                self.scale_factor = float(self.transform.get("sx", 1.0) or 1.0)
+
+            except Exception:
+
+                self.scale_factor = 1.0
+
+            if not math.isfinite(self.scale_factor) or abs(self.scale_factor) < 1e-6:
+
+                self.scale_factor = 1.0
+
+            try:
+
+                self.offset_x = float(self.transform.get("ox", 0.0) or 0.0)
+
+            except Exception:
+
+                self.offset_x = 0.0
+
+            try:
+
+                self.offset_z = float(self.transform.get("oz", 0.0) or 0.0)
+
+            except Exception:
+
+                self.offset_z = 0.0
+
+            inv_raw = self.transform.get("invert_y")
+
+            if isinstance(inv_raw, str):
+
+                inv_val = inv_raw.strip().lower()
+
+                self.invert_y = inv_val in {"1", "true", "yes", "on", "y"}
+
+            elif inv_raw is None:
+
+                self.invert_y = False
+
+            else:
+
+                self.invert_y = bool(inv_raw)
+
+            try:
+
+                self.base_w = float(self.transform.get("w", self.map_w) or self.map_w or 1.0)
+
+            except Exception:
+
+                self.base_w = float(self.map_w or 1.0)
+
+            try:
+
+                self.base_h = float(self.transform.get("h", self.map_h) or self.map_h or 1.0)
+
+            except Exception:
+
+                self.base_h = float(self.map_h or 1.0)
+
+            self._update_affine()
+
+
+
+        def _on_configure(self, e):
+
+            self._win_w = e.width
+
+            self._win_h = e.height
+
+            self.fit_to_view(force=True)
+
+
+
+        def fit_to_view(self, force=False):
+
+            cw = self._win_w or self.cv.winfo_width() or 0
+
+            ch = self._win_h or self.cv.winfo_height() or 0
+
+            if cw <= 2 or ch <= 2:
+
+                return
+
+            s = min(cw / max(1.0, self.map_w), ch / max(1.0, self.map_h))
+
+            s = max(self.min_scale, min(self.max_scale, s))
+
+            self.view_scale = s
+
+            if self.center_on_car and self.last_car_pos:
+
+                self.recenter_on_car()
+
+                if force:
+
+                    self.redraw()
+
+            else:
+
+                self.view_dx = (cw - self.map_w * s) / 2
+
+                self.view_dy = (ch - self.map_h * s) / 2
+
+                if force:
+
+                    self.redraw()
+
+
+
+        def world_to_img(self, x: float, z: float) -> Tuple[float, float]:
+
+            return x * self._ax + self._bx, z * self._ay + self._by
+
+
+
+        def world_to_img_batch(self, arr):
+
+            # Векторный world_to_img: весь контур за один проход numpy
+
+            # вместо Python-цикла с лукапами атрибутов на каждую точку
+
+            a = np.array([self._ax, self._ay], dtype=np.float32)
+
+            b = np.array([self._bx, self._by], dtype=np.float32)
+
+            return np.asarray(arr, dtype=np.float32) * a + b
+
+
+
+        def set_center_mode(self, enabled: bool):
+
+            self.center_on_car = bool(enabled)
+
+            if self.center_on_car:
+
+                self.pan_start = None
+
+                self.recenter_on_car()
+
+
+
+        def set_center_offset(self, x: float, y: float):
+
+            self.center_offset = (float(x), float(y))
+
+            if self.center_on_car:
+
+                self.recenter_on_car()
+
+
+
+        def set_car_position(self, pos: Optional[Tuple[float, float]]):
+
+            self.last_car_pos = pos
+
+            if self.center_on_car:
+
+                self.recenter_on_car()
+
+
+
+        def reset_view(self):
+
+            self.fit_to_view(force=True)
+
+
+
+        def recenter_on_car(self):
+
+            if not self.center_on_car or not self.last_car_pos:
+
+                return
+
+            px, py = self.world_to_img(self.last_car_pos[0], self.last_car_pos[1])
+
+            cw = self._win_w or self.cv.winfo_reqwidth() or 0
+
+            ch = self._win_h or self.cv.winfo_reqheight() or 0
+
+            if cw <= 2 or ch <= 2:
+
+                return
+
+            self.view_dx = cw * self.center_offset[0] - px * self.view_scale
+
+            self.view_dy = ch * self.center_offset[1] - py * self.view_scale
+
+
+
+        def load_assets_if_needed(self, track_name: Optional[str], track_cfg: Optional[str]) -> Optional[str]:
+
+            changed = (track_name != self.last_track) or (track_cfg != self.last_cfg)
+
+            if not changed:
+
+                return None
+
+            self.last_track, self.last_cfg = track_name, track_cfg
+
+
+
+            self.map_img_tk = None
+
+            self.map_img_pil = None
+
+            self._view_img = None
+
+            self._view_img_size = None
+
+            self._view_img_src = None
+
+            self._resize_cache.clear()
+
+            self.cv.delete("all")
+
+            self._map_item = None
+
+            self._ph_item = None
+
+            self._car_item = None
+
+            self._you_item = None
+
+            self._line_items.clear()
+
+            self._line_state.clear()
+
+            self._poly_cache.clear()
+
+            self.map_w = self.map_h = 1.0
+
+            self.sideL_img = []
+
+            self.sideR_img = []
+
+            self.trail_img = []
+
+            self.last_car_pos = None
+
+
+
+            if manual_map and manual_map.exists():
+
+                self.track_assets = TrackAssets()
+
+                self.track_assets.base = manual_map.parent
+
+                self.track_assets.map_png = manual_map
+
+                self.track_assets.transform = dict(w=1024.0, h=1024.0, sx=1.0, ox=512.0, oz=512.0, invert_y=True)
+
+            else:
+
+                self.track_assets = find_track_assets(track_name, track_cfg, ac_roots)
+
+            self.transform = (self.track_assets.transform if self.track_assets and self.track_assets.transform else None)
+
+            self._update_transform_cache()
+
+
+
+            status = "����: с������⭠"
+
+            img_path = None
+
+            if self.track_assets:
+
+                img_path = self.track_assets.map_png or self.track_assets.outline_png
+
+
+
+            if img_path and img_path.exists():
+
+                try:
+
+                    if PIL_OK and Image is not None and ImageTk is not None:
+
+                        self.map_img_pil = Image.open(img_path)
+
+                        self.map_w, self.map_h = [float(v) for v in self.map_img_pil.size]
+
+                        self.map_img_tk = ImageTk.PhotoImage(self.map_img_pil)
+
+                    else:
+
+                        self.map_img_tk = tk.PhotoImage(file=str(img_path))
+
+                        self.map_w = float(self.map_img_tk.width())
+
+                        self.map_h = float(self.map_img_tk.height())
+
+                    status = f"����: {self.track_assets.base.name if self.track_assets and self.track_assets.base else '?'}"
+
+                except Exception:
+
+                    status = "����: с訡�� с���㧪�"
+
+            else:
+
+                if self.track_assets:
+
+                    status = "����: с� с������ (���� сࠥ����)"
+
+                else:
+
+                    status = "����: с������⭠"
+
+
+
+            self._update_transform_cache()
+
+
+
+            if self.track_assets and self.track_assets.side_l and self.track_assets.side_r:
+
+                Lw = read_side_csv_points(self.track_assets.side_l)
+
+                Rw = read_side_csv_points(self.track_assets.side_r)
+
+                if NUMPY_OK:
+
+                    self.sideL_img = self.world_to_img_batch(Lw) if len(Lw) else []
+
+                    self.sideR_img = self.world_to_img_batch(Rw) if len(Rw) else []
+
+                else:
+
+                    self.sideL_img = [self.world_to_img(x, z) for (x, z) in Lw]
+
+                    self.sideR_img = [self.world_to_img(x, z) for (x, z) in Rw]
+
+
+
+            self.fit_to_view(force=True)
+
+            return status
+
+
+
+        def _place_map(self, photo):
+
+            if self._map_item is None:
+
+                self._map_item = self.cv.create_image(self.view_dx, self.view_dy, anchor="nw", image=photo)
+
+            else:
+
+                self.cv.coords(self._map_item, self.view_dx, self.view_dy)
+
+                self.cv.itemconfigure(self._map_item, image=photo)
+
+
+
+        def schedule_redraw(self):
+
+            # коалесцируем всплески пан/зум-событий и снапшотов: одна отрисовка на проход цикла Tk
+
+            if self._redraw_pending:
+
+                return
+
+            self._redraw_pending = True
+
+            self.cv.after_idle(self._do_redraw)
+
+
+
+        def _do_redraw(self):
+
+            self._redraw_pending = False
+
+            self.redraw()
+
+
+
+        def redraw(self):
+
+            if self.map_img_tk:
+
+                if PIL_OK and self.map_img_pil is not None and Image is not None and ImageTk is not None:
+
+                    iw = int(max(1, min(8192, self.map_w * self.view_scale)))
+
+                    ih = int(max(1, min(8192, self.map_h * self.view_scale)))
+
+                    img = self._resize_cache.get((iw, ih))
+
+                    if img is None:
+
+                        k = int(round(self.view_scale))
+
+                        if (NUMPY_OK and k >= 1 and abs(self.view_scale - k) < 1e-3
+
+                                and self.map_img_pil.mode in ("RGB", "RGBA", "L")
+
+                                and iw == int(self.map_w) * k and ih == int(self.map_h) * k):
+
+                            # целый зум: блочное размножение пикселей — копия вместо
+
+                            # взвешенной суммы, BILINEAR дал бы тот же результат
+
+                            arr = np.asarray(self.map_img_pil)
+
+                            if k > 1:
+
+                                arr = np.repeat(np.repeat(arr, k, axis=0), k, axis=1)
+
+                            img = Image.fromarray(arr)
+
+                        else:
+
+                            if hasattr(Image, "Resampling"):
+
+                                resample = Image.Resampling.BILINEAR
+
+                            else:
+
+                                resample = getattr(Image, "BILINEAR", 2)
+
+                            try:
+
+                                # при уменьшении box-предпроход режет байты на входе BILINEAR
+
+                                img = self.map_img_pil.resize((iw, ih), resample, reducing_gap=2.0)
+
+                            except TypeError:
+
+                                img = self.map_img_pil.resize((iw, ih), resample)
+
+                        while len(self._resize_cache) >= 3:
+
+                            self._resize_cache.pop(next(iter(self._resize_cache)))
+
+                        self._resize_cache[(iw, ih)] = img
+
+                    # PhotoImage переиспользуем: paste() вместо нового Tk-ресурса,
+
+                    # пока размер вида не изменился
+
+                    if self._view_img is not None and self._view_img_size == (iw, ih):
+
+                        if self._view_img_src is not img:
+
+                            self._view_img.paste(img)
+
+                            self._view_img_src = img
+
+                    else:
+
+                        self._view_img = ImageTk.PhotoImage(img)
+
+                        self._view_img_size = (iw, ih)
+
+                        self._view_img_src = img
+
+                    self._place_map(self._view_img)
+
+                else:
+
+                    self._place_map(self.map_img_tk)
+
+            else:
+
+                w = self._win_w
+
+                h = self._win_h
+
+                if self._ph_item is None:
+
+                    self._ph_item = self.cv.create_rectangle(10, 10, max(11, w - 10), max(11, h - 10), outline="#333")
+
+                else:
+
+                    self.cv.coords(self._ph_item, 10, 10, max(11, w - 10), max(11, h - 10))
+
+
+
+            def draw_poly(key, pts, color="#ffcc00", width=2, static=False):
+
+                item = self._line_items.get(key)
+
+                if pts is None or not len(pts):
+
+                    if item is not None and self._line_state.get(key) != "hidden":
+
+                        self._line_state[key] = "hidden"
+
+                        self.cv.itemconfigure(item, state="hidden")
+
+                    return
+
+                s = self.view_scale
+
+                dx = self.view_dx
+
+                dy = self.view_dy
+
+                if static:
+
+                    token = (s, dx, dy, id(pts), len(pts))
+
+                    cached = self._poly_cache.get(key)
+
+                    if cached is not None and cached[0] == token:
+
+                        coords = cached[1]
+
+                        if coords is None:
+
+                            # контур при этом виде целиком вне вьюпорта
+
+                            if item is not None and self._line_state.get(key) != "hidden":
+
+                                self._line_state[key] = "hidden"
+
+                                self.cv.itemconfigure(item, state="hidden")
+
+                            return
+
+                        if len(coords) < 4:
+
+                            return
+
+                        if item is None:
+
+                            self._line_items[key] = self.cv.create_line(*coords, fill=color, width=width, capstyle="round", joinstyle="round")
+
+                            self._line_state[key] = "normal"
+
+                        else:
+
+                            self.cv.coords(item, *coords)
+
+                            if self._line_state.get(key) != "normal":
+
+                                self._line_state[key] = "normal"
+
+                                self.cv.itemconfigure(item, state="normal")
+
+                        return
+
+                if NUMPY_OK and isinstance(pts, np.ndarray):
+
+                    scr = pts * s + np.array([dx, dy], dtype=np.float32)
+
+                    # контур целиком вне вьюпорта — Tk его даже не получает
+
+                    cw = self._win_w or 1
+
+                    ch = self._win_h or 1
+
+                    mn = scr.min(axis=0)
+
+                    mx = scr.max(axis=0)
+
+                    if mx[0] < 0 or mx[1] < 0 or mn[0] > cw or mn[1] > ch:
+
+                        if static:
+
+                            self._poly_cache[key] = (token, None)
+
+                        if item is not None and self._line_state.get(key) != "hidden":
+
+                            self._line_state[key] = "hidden"
+
+                            self.cv.itemconfigure(item, state="hidden")
+
+                        return
+
+                    coords = scr.ravel().tolist()
+
+                else:
+
+                    coords = []
+
+                    for x, y in pts:
+
+                        coords.extend([dx + x * s, dy + y * s])
+
+                if static:
+
+                    self._poly_cache[key] = (token, coords)
+
+                if len(coords) >= 4:
+
+                    if item is None:
+
+                        self._line_items[key] = self.cv.create_line(*coords, fill=color, width=width, capstyle="round", joinstyle="round")
+
+                        self._line_state[key] = "normal"
+
+                    else:
+
+                        self.cv.coords(item, *coords)
+
+                        if self._line_state.get(key) != "normal":
+
+                            self._line_state[key] = "normal"
+
+                            self.cv.itemconfigure(item, state="normal")
+
+
+
+            draw_poly("sideL", self.sideL_img, "#ffcc00", 2, static=True)
+
+            draw_poly("sideR", self.sideR_img, "#ffcc00", 2, static=True)
+
+            tr = self.trail_img
+
+            n = len(tr)
+
+            if n > 4:
+
+                # прореживание: точек не больше, чем пикселей по ширине канвы;
+
+                # субпиксельные сегменты всё равно не видны, а Tk их рисует
+
+                cw = self._win_w or 1
+
+                step = max(1, int(n * self.view_scale / max(1, cw)))
+
+                if step > 1:
+
+                    tr = tr[::step]
+
+            draw_poly("trail", tr, "#00e5ff", 2)
+
+            if len(self.trail_img):
+
+                x, y = self.trail_img[-1]
+
+                cx = self.view_dx + x * self.view_scale
+
+                cy = self.view_dy + y * self.view_scale
+
+                if self._car_item is None:
+
+                    self._car_item = self.cv.create_oval(cx - 5, cy - 5, cx + 5, cy + 5, outline="#fff", fill="#ff0", width=2)
+
+                    self._you_item = self.cv.create_text(cx + 10, cy - 10, text="YOU", fill="#fff", anchor="w")
+
+                else:
+
+                    self.cv.coords(self._car_item, cx - 5, cy - 5, cx + 5, cy + 5)
+
+                    self.cv.coords(self._you_item, cx + 10, cy - 10)
+
+                    self.cv.itemconfigure(self._car_item, state="normal")
+
+                    self.cv.itemconfigure(self._you_item, state="normal")
+
+            elif self._car_item is not None:
+
+                self.cv.itemconfigure(self._car_item, state="hidden")
+
+                self.cv.itemconfigure(self._you_item, state="hidden")
+
+    class Snapshot:
+
+        __slots__ = ("ts", "data")
+
+
+
+        def __init__(self, ts: float, data: Dict[str, Any]):
+
+            self.ts = ts
+
+            self.data = data
+
+
+
+
+
+    # Snapshot.data после приёма нигде не мутируется: history, активная запись
+
+    # и плейбек держат один и тот же словарь по ссылке, без каких-либо копий.
+
+
+
+    class RingHistory:
+
+        # Кольцо примитивных массивов фиксированной ёмкости: ts и числовые колонки
+
+        # графиков лежат сплошными ndarray, вставка O(1) без сдвигов и мусора.
+
+        # Колонки квантуются в float32 — телеметрии такой точности хватает,
+
+        # а рабочий набор вдвое меньше; ts остаётся float64 ради точности времени.
+
+        # Хронологическая склейка через np.concatenate нужна только после заворота
+
+        # кольца. Словари снапшотов остаются в deque для записи/плейбека.
+
+        # Спецификация колонки — ключ data или (ключ, индекс) для массивов по колёсам.
+
+        def __init__(self, cap: int, columns: List[Any]):
+
+            self.columns = list(columns)
+
+            self.cap = max(16, int(cap))
+
+            self.head = 0
+
+            self.n = 0
+
+            if NUMPY_OK:
+
+                self.ts = np.empty(self.cap, dtype=np.float64)
+
+                self.cols = {spec: np.empty(self.cap, dtype=np.float32) for spec in self.columns}
+
+            else:
+
+                self.ts = None
+
+                self.cols = {}
+
+
+
+        @staticmethod
+
+        def _value(data: Dict[str, Any], spec: Any) -> float:
+
+            if isinstance(spec, tuple):
+
+                seq = data.get(spec[0])
+
+                if isinstance(seq, (list, tuple)):
+
+                    try:
+
+                        return float(seq[spec[1]])
+
+                    except Exception:
+
+                        return math.nan
+
+                return math.nan
+
+            try:
+
+                return float(data.get(spec))
+
+            except Exception:
+
+                return math.nan
+
+
+
+        def append(self, snapshot: Snapshot) -> None:
+
+            if self.ts is None:
+
+                return
+
+            i = self.head
+
+            self.ts[i] = snapshot.ts
+
+            data = snapshot.data
+
+            for spec, col in self.cols.items():
+
+                col[i] = self._value(data, spec)
+
+            self.head = (i + 1) % self.cap
+
+            if self.n < self.cap:
+
+                self.n += 1
+
+
+
+        def _chrono(self, arr):
+
+            if self.n < self.cap or self.head == 0:
+
+                return arr[:self.n]
+
+            return np.concatenate((arr[self.head:], arr[:self.head]))
+
+
+
+        def view_window(self, t_start: float) -> Optional[Tuple[Any, Dict[Any, Any]]]:
+
+            if self.ts is None or self.n == 0:
+
+                return None
+
+            ts = self._chrono(self.ts)
+
+            lo = int(np.searchsorted(ts, t_start, side="left"))
+
+            cols = {spec: self._chrono(col)[lo:] for spec, col in self.cols.items()}
+
+            return ts[lo:], cols
+
+
+
+
+
+    class GraphCanvas:
+
+        def __init__(self, parent: Any, title: str, series: List[Dict[str, Any]], height: int = 160):
+
+            self.title = title
+
+            self.series = series
+
+            self.canvas = tk.Canvas(parent, height=height, bg="#111115", highlightthickness=0)
+
+            self.canvas.pack(fill="x", pady=(4, 4))
+
+            self.canvas.bind("<Configure>", self._on_configure)
+
+            self._render_pending = False
+
+            self._win_w = 0
+
+            self._win_h = 0
+
+            self._data: List[Snapshot] = []
+
+            self._highlight_ts: Optional[float] = None
+
+            self._table: Optional[Tuple[Any, Dict[Any, Any]]] = None
+
+            # постоянные элементы canvas: создаём один раз, дальше только coords()/itemconfigure()
+
+            self._size = (0, 0)
+
+            self._frame_item = None
+
+            self._title_item = None
+
+            self._grid_items: List[int] = []
+
+            self._msg_item = None
+
+            self._lbl_ymax = None
+
+            self._lbl_ymin = None
+
+            self._lbl_t0 = None
+
+            self._lbl_t1 = None
+
+            self._hl_item = None
+
+            self._legend_items: List[Tuple[int, int]] = []
+
+            self._line_items: List[int] = []
+
+            self._pt_items: List[int] = []
+
+
+
+        def update(self, snapshots: List[Snapshot], highlight_ts: Optional[float] = None,
+
+                   table: Optional[Tuple[Any, Dict[Any, Any]]] = None):
+
+            # GraphManager передаёт свежесозданный срез окна — держим ссылку,
+
+            # ещё одна копия на каждый из графиков не нужна
+
+            self._data = snapshots
+
+            self._highlight_ts = highlight_ts
+
+            self._table = table
+
+            self._schedule_render()
+
+
+
+        def _on_configure(self, e):
+
+            self._win_w = e.width
+
+            self._win_h = e.height
+
+            self._schedule_render()
+
+
+
+        def _schedule_render(self):
+
+            # апдейты приходят пачками (несколько графиков на один снапшот):
+
+            # откладываем отрисовку на after_idle и рисуем один раз
+
+            if self._render_pending:
+
+                return
+
+            self._render_pending = True
+
+            self.canvas.after_idle(self._do_render)
+
+
+
+        def _do_render(self):
+
+            self._render_pending = False
+
+            self._render()
+
+
+
+        def _ensure_items(self):
+
+            # одноразовое создание элементов: delete("all") на каждый кадр заставлял Tk
+
+            # пересоздавать все объекты, дальше двигаем их через coords()/itemconfigure()
+
+            canvas = self.canvas
+
+            self._grid_items = [canvas.create_line(0, 0, 0, 0, fill="#1d1d1d") for _ in range(3)]
+
+            self._frame_item = canvas.create_rectangle(0, 0, 0, 0, outline="#2b2b2b", width=1)
+
+            self._title_item = canvas.create_text(0, 12, text=self.title, anchor="w", fill="#f0f0f0", font=("Segoe UI", 10, "bold"))
+
+            self._msg_item = canvas.create_text(0, 0, text="", fill="#666666", font=("Segoe UI", 9), state="hidden")
+
+            self._lbl_ymax = canvas.create_text(0, 0, text="", anchor="nw", fill="#b0b0b0", font=("Segoe UI", 8), state="hidden")
+
+            self._lbl_ymin = canvas.create_text(0, 0, text="", anchor="sw", fill="#b0b0b0", font=("Segoe UI", 8), state="hidden")
+
+            self._lbl_t0 = canvas.create_text(0, 0, text="0 с", anchor="nw", fill="#7a7a7a", font=("Segoe UI", 8), state="hidden")
+
+            self._lbl_t1 = canvas.create_text(0, 0, text="", anchor="ne", fill="#7a7a7a", font=("Segoe UI", 8), state="hidden")
+
+            for series in self.series:
+
+                color = series["color"]
+
+                rect = canvas.create_rectangle(0, 0, 0, 0, outline=color, fill=color, state="hidden")
+
+                label = canvas.create_text(0, 0, text=series.get("name", ""), anchor="w", fill="#d8d8d8", font=("Segoe UI", 8), state="hidden")
+
+                self._legend_items.append((rect, label))
+
+                self._line_items.append(canvas.create_line(0, 0, 0, 0, fill=color, width=2, smooth=True, state="hidden"))
+
+                self._pt_items.append(canvas.create_oval(0, 0, 0, 0, outline=color, fill=color, state="hidden"))
+
+            self._hl_item = canvas.create_oval(0, 0, 0, 0, outline="#ffffff", width=2, state="hidden")
+
+
+
+        def _show_message(self, txt: str):
+
+            canvas = self.canvas
+
+            canvas.itemconfigure(self._msg_item, text=txt, state="normal")
+
+            for item in (self._lbl_ymax, self._lbl_ymin, self._lbl_t0, self._lbl_t1, self._hl_item):
+
+                canvas.itemconfigure(item, state="hidden")
+
+            for rect, label in self._legend_items:
+
+                canvas.itemconfigure(rect, state="hidden")
+
+                canvas.itemconfigure(label, state="hidden")
+
+            for item in self._line_items:
+
+                canvas.itemconfigure(item, state="hidden")
+
+            for item in self._pt_items:
+
+                canvas.itemconfigure(item, state="hidden")
+
+
+
+        def _render(self):
+
+            canvas = self.canvas
+
+            if self._frame_item is None:
+
+                self._ensure_items()
+
+            width = max(60, int(self._win_w or canvas.winfo_reqwidth() or 320))
+
+            height = max(60, int(self._win_h or canvas.winfo_reqheight() or 160))
+
+            pad_left, pad_right = 48, 16
+
+            pad_top, pad_bottom = 30, 30
+
+            x0 = pad_left
+
+            y0 = pad_top
+
+            x1 = width - pad_right
+
+            y1 = height - pad_bottom
+
+            if x1 <= x0:
+
+                x1 = x0 + 10
+
+            if y1 <= y0:
+
+                y1 = y0 + 10
+
+            if (width, height) != self._size:
+
+                self._size = (width, height)
+
+                canvas.coords(self._frame_item, x0, y0, x1, y1)
+
+                for i, grid_id in enumerate(self._grid_items, start=1):
+
+                    gy = y0 + (y1 - y0) * i / 4
+
+                    canvas.coords(grid_id, x0, gy, x1, gy)
+
+                canvas.coords(self._msg_item, (x0 + x1) / 2, (y0 + y1) / 2)
+
+                canvas.coords(self._lbl_ymax, x1 + 6, y0)
+
+                canvas.coords(self._lbl_ymin, x1 + 6, y1)
+
+                canvas.coords(self._lbl_t0, x0, y1 + 12)
+
+                canvas.coords(self._lbl_t1, x1, y1 + 12)
+
+            data = self._data
+
+            if len(data) < 2:
+
+                self._show_message("No data")
+
+                return
+
+            t0 = data[0].ts
+
+            t1 = data[-1].ts
+
+            if t1 - t0 < 1e-6:
+
+                t1 = t0 + 1.0
+
+            table = self._table
+
+            ts_col = table[0] if table is not None else None
+
+            col_map = table[1] if table is not None else None
+
+            series_points: List[Tuple[str, str, Any, Any]] = []
+
+            y_min = math.inf
+
+            y_max = -math.inf
+
+            for series in self.series:
+
+                color = series["color"]
+
+                name = series.get("name", "")
+
+                spec = series.get("column")
+
+                if col_map is not None and spec in col_map and len(ts_col):
+
+                    # быстрый путь: готовая колонка из RingHistory вместо
+
+                    # вызова extractor + float() на каждый снапшот
+
+                    vals = col_map[spec]
+
+                    mask = np.isnan(vals)
+
+                    if mask.any():
+
+                        keep = ~mask
+
+                        xs = ts_col[keep]
+
+                        ys = vals[keep]
+
+                    else:
+
+                        xs = ts_col
+
+                        ys = vals
+
+                    if len(ys):
+
+                        y_min = min(y_min, float(ys.min()))
+
+                        y_max = max(y_max, float(ys.max()))
+
+                else:
+
+                    extractor = series["extract"]
+
+                    xs = []
+
+                    ys = []
+
+                    for snap in data:
+
+                        val = extractor(snap.data)
+
+                        if val is None:
+
+                            continue
+
+                        try:
+
+                            val_f = float(val)
+
+                        except Exception:
+
+                            continue
+
+                        xs.append(snap.ts)
+
+                        ys.append(val_f)
+
+                        if val_f < y_min:
+
+                            y_min = val_f
+
+                        if val_f > y_max:
+
+                            y_max = val_f
+
+                series_points.append((color, name, xs, ys))
+
+            if y_min > y_max:
+
+                self._show_message("No values")
+
+                return
+
+            canvas.itemconfigure(self._msg_item, state="hidden")
+
+            if math.isclose(y_min, y_max, rel_tol=1e-9):
+
+                delta = abs(y_min) * 0.1 or 1.0
+
+                y_min -= delta
+
+                y_max += delta
+
+            scale_x = (x1 - x0) / (t1 - t0)
+
+            scale_y = (y1 - y0) / (y_max - y_min)
+
+            legend_x = x0
+
+            legend_y = y0 - 14
+
+            for idx, (color, name, xs, ys) in enumerate(series_points):
+
+                rect, label = self._legend_items[idx]
+
+                if not len(ys):
+
+                    canvas.itemconfigure(rect, state="hidden")
+
+                    canvas.itemconfigure(label, state="hidden")
+
+                    continue
+
+                canvas.coords(rect, legend_x, legend_y, legend_x + 10, legend_y + 10)
+
+                canvas.coords(label, legend_x + 14, legend_y + 5)
+
+                canvas.itemconfigure(rect, state="normal")
+
+                canvas.itemconfigure(label, state="normal")
+
+                legend_x += max(60, len(name) * 8)
+
+            fmt = "{:.2f}" if abs(y_max - y_min) < 100 else "{:.0f}"
+
+            canvas.itemconfigure(self._lbl_ymax, text=fmt.format(y_max), state="normal")
+
+            canvas.itemconfigure(self._lbl_ymin, text=fmt.format(y_min), state="normal")
+
+            canvas.itemconfigure(self._lbl_t0, state="normal")
+
+            canvas.itemconfigure(self._lbl_t1, text=f"{(t1 - t0):.1f} с", state="normal")
+
+            for idx, (color, _name, xs, ys) in enumerate(series_points):
+
+                line_id = self._line_items[idx]
+
+                pt_id = self._pt_items[idx]
+
+                if NUMPY_OK and isinstance(xs, np.ndarray):
+
+                    if _graph_polyline is not None:
+
+                        coords = _graph_polyline(xs, ys, t0, scale_x, x0, y_min, scale_y, y1).tolist()
+
+                    else:
+
+                        # аффинное преобразование целиком в NumPy: x и y пишутся
+
+                        # срезами с шагом 2 сразу в плоский массив координат
+
+                        flat = np.empty(len(xs) * 2, dtype=np.float64)
+
+                        flat[0::2] = x0 + (xs - t0) * scale_x
+
+                        flat[1::2] = y1 - (ys - y_min) * scale_y
+
+                        coords = flat.tolist()
+
+                else:
+
+                    coords = []
+
+                    for ts, val in zip(xs, ys):
+
+                        x = x0 + (ts - t0) * scale_x
+
+                        y = y1 - (val - y_min) * scale_y
+
+                        coords.extend([x, y])
+
+                if len(coords) >= 4:
+
+                    canvas.coords(line_id, *coords)
+
+                    canvas.itemconfigure(line_id, state="normal")
+
+                    canvas.itemconfigure(pt_id, state="hidden")
+
+                elif len(coords) == 2:
+
+                    x, y = coords
+
+                    canvas.coords(pt_id, x - 2, y - 2, x + 2, y + 2)
+
+                    canvas.itemconfigure(pt_id, state="normal")
+
+                    canvas.itemconfigure(line_id, state="hidden")
+
+                else:
+
+                    canvas.itemconfigure(line_id, state="hidden")
+
+                    canvas.itemconfigure(pt_id, state="hidden")
+
+            highlight_ts = self._highlight_ts
+
+            hl_shown = False
+
+            if highlight_ts is not None:
+
+                for color, _name, xs, ys in reversed(series_points):
+
+                    npts = len(xs)
+
+                    if not npts:
+
+                        continue
+
+                    # xs монотонен: последняя точка с ts <= highlight ищется
+
+                    # двоичным поиском, а не обратным проходом по окну
+
+                    if NUMPY_OK and isinstance(xs, np.ndarray):
+
+                        j = int(np.searchsorted(xs, highlight_ts, side="right")) - 1
+
+                    else:
+
+                        j = bisect.bisect_right(xs, highlight_ts) - 1
+
+                    if j < 0:
+
+                        j = 0
+
+                    ts = float(xs[j])
+
+                    val = float(ys[j])
+
+                    x = x0 + (ts - t0) * scale_x
+
+                    y = y1 - (val - y_min) * scale_y
+
+                    canvas.coords(self._hl_item, x - 4, y - 4, x + 4, y + 4)
+
+                    canvas.itemconfigure(self._hl_item, outline=color, state="normal")
+
+                    hl_shown = True
+
+                    break
+
+            if not hl_shown:
+
+                canvas.itemconfigure(self._hl_item, state="hidden")
+
+
+
+
+
+
+
+    class GraphManager:
+
+        def __init__(self, parent: Any):
+
+            self.parent = parent
+
+            self.graphs: List[GraphCanvas] = []
+
+            self.window_seconds: float = 10.0
+
+
+
+        def set_window(self, seconds: float) -> None:
+
+            try:
+
+                self.window_seconds = max(0.1, float(seconds))
+
+            except Exception:
+
+                self.window_seconds = 10.0
+
+
+
+        def _trim_snapshots(self, snapshots: List[Snapshot]) -> List[Snapshot]:
+
+            if not snapshots:
+
+                return []
+
+            window = self.window_seconds
+
+            if window <= 0:
+
+                return list(snapshots)
+
+            t_end = snapshots[-1].ts
+
+            t_start = t_end - window
+
+            # ts монотонен: граница окна ищется двоичным поиском вместо
+
+            # линейного фильтра по всей истории
+
+            lo, hi = 0, len(snapshots)
+
+            while lo < hi:
+
+                mid = (lo + hi) // 2
+
+                if snapshots[mid].ts < t_start:
+
+                    lo = mid + 1
+
+                else:
+
+                    hi = mid
+
+            if lo < len(snapshots):
+
+                return snapshots[lo:]
+
+            return [snapshots[-1]]
+
+
+
+        def build(self, configs: List[Dict[str, Any]]):
+
+            self.graphs.clear()
+
+            for cfg in configs:
+
+                graph = GraphCanvas(self.parent, cfg["title"], cfg["series"], cfg.get("height", 160))
+
+                self.graphs.append(graph)
+
+
+
+        def column_specs(self) -> List[Any]:
+
+            specs: List[Any] = []
+
+            for graph in self.graphs:
+
+                for series in graph.series:
+
+                    spec = series.get("column")
+
+                    if spec is not None and spec not in specs:
+
+                        specs.append(spec)
+
+            return specs
+
+
+
+        def update(self, snapshots: List[Snapshot], highlight_ts: Optional[float],
+
+                   buffer: Optional[RingHistory] = None):
+
+            trimmed = self._trim_snapshots(snapshots)
+
+            table = buffer.view_window(trimmed[0].ts) if (buffer is not None and trimmed) else None
+
+            for graph in self.graphs:
+
+                graph.update(trimmed, highlight_ts=highlight_ts, table=table)
+
+
+
+
+
+    @dataclass
+
+    class RecordingRun:
+
+        label: str
+
+        car: str
+
+        track: str
+
+        track_cfg: str
+
+        created_at: float
+
+        snapshots: List[Snapshot] = field(default_factory=list)
+
+
+
+
+
+    class AdvancedStateController:
+
+        def __init__(
+
+            self,
+
+            root: Any,
+
+            mpanel: MapPanel,
+
+            lbl_title: Any,
+
+            lbl_map_status: Any,
+
+            set_label: Any,
+
+            graph_manager: GraphManager,
+
+            view_btn: Any,
+
+            record_btn: Any,
+
+            playback_btn: Any,
+
+            play_btn: Any,
+
+            prev_btn: Any,
+
+            next_btn: Any,
+
+            slider: Any,
+
+            time_label: Any,
+
+            cards_holder: Any,
+
+            graphs_holder: Any,
+
+            scroll_callback: Any,
+
+            records_var: Any,
+
+            records_cb: Any,
+
+            window_var: Any,
+
+            window_cb: Any,
+
+            window_choices: List[int],
+
+        ):
+
+            self.root = root
+
+            self.mpanel = mpanel
+
+            self.lbl_title = lbl_title
+
+            self.lbl_map_status = lbl_map_status
+
+            self.set_label = set_label
+
+            self.graph_manager = graph_manager
+
+            self.view_btn = view_btn
+
+            self.record_btn = record_btn
+
+            self.playback_btn = playback_btn
+
+            self.play_btn = play_btn
+
+            self.prev_btn = prev_btn
+
+            self.next_btn = next_btn
+
+            self.slider = slider
+
+            self.time_label = time_label
+
+            self.cards_holder = cards_holder
+
+            self.graphs_holder = graphs_holder
+
+            self.scroll_callback = scroll_callback
+
+            self.records_var = records_var
+
+            self.records_cb = records_cb
+
+            self.window_var = window_var
+
+            self.window_cb = window_cb
+
+            self.window_choices = sorted({int(v) for v in window_choices if v > 0}) or [10]
+
+            self.window_labels = [f"{sec} с" for sec in self.window_choices]
+
+            self.window_map = {label: float(sec) for label, sec in zip(self.window_labels, self.window_choices)}
+
+            self.graph_manager.set_window(self.window_choices[0])
+
+            self.window_cb.configure(state="readonly", values=self.window_labels)
+
+            default_label = next((label for label in self.window_labels if "10" in label), self.window_labels[0])
+
+            self.window_var.set(default_label)
+
+            self.window_cb.bind('<<ComboboxSelected>>', self._handle_window_change)
+
+
+
+            # история — параллельные массивы: C-массив меток времени для
+
+            # бинарного поиска/обрезки и список снапшотов, который уходит в
+
+            # graph_manager.update без промежуточной копии
+
+            self._hist_ts = array.array("d")
+
+            self._hist_snaps: List[Snapshot] = []
+
+            self._last_title: Optional[str] = None
+
+            self._last_map_status: Optional[str] = None
+
+            self._last_time_text: Optional[str] = None
+
+            # отпечаток последнего кадра карты: пропускаем redraw, когда машина
+
+            # сместилась меньше чем на полпикселя и хвост/вид не изменились
+
+            self._last_car_px: Optional[Tuple[float, float]] = None
+
+            self._last_trail_n = -1
+
+            self._last_view: Optional[Tuple[float, float, float]] = None
+
+            self.max_history_seconds = max(self.window_choices)
+
+            # ёмкость кольца — вся история при фактическом темпе опроса, с запасом
+
+            history_cap = int(self.max_history_seconds * 1000.0 / max(1, int(poll_ms)) * 1.25) + 8
+
+            self._graph_buffer = RingHistory(history_cap, graph_manager.column_specs()) if NUMPY_OK else None
+
+            self.recordings: List[RecordingRun] = []
+
+            self._label_prefix = ""
+
+            self._play_delays: List[int] = []
+
+            self._play_delays_run: Optional[RecordingRun] = None
+
+            self.active_recording: Optional[RecordingRun] = None
+
+            self.playback_run: Optional[RecordingRun] = None
+
+            self.recording = False
+
+            self.view_mode = "cards"
+
+            self.play_mode = "live"
+
+            self.play_running = False
+
+            self.play_job: Optional[str] = None
+
+            self.slider_adjust = False
+
+            self.play_index = 0
+
+            self.latest_snapshot: Optional[Snapshot] = None
+
+
+
+            self.records_cb.configure(state="disabled")
+
+            self.records_cb.bind('<<ComboboxSelected>>', self._handle_recording_select)
+
+
+
+            self.view_btn.configure(command=self.toggle_view)
+
+            self.record_btn.configure(command=self.toggle_record)
+
+            self.playback_btn.configure(command=self.toggle_play_mode)
+
+            self.play_btn.configure(command=self.toggle_play)
+
+            self.prev_btn.configure(command=lambda: self.step_playback(-1))
+
+            self.next_btn.configure(command=lambda: self.step_playback(1))
+
+            self.slider.configure(command=self.on_slider_move)
+
+
+
+            self._show_cards()
+
+            self._set_play_controls_state(False)
+
+            self.playback_btn.state(["disabled"])
+
+            self._handle_window_change()
+
+            self.time_label.configure(text="LIVE")
+
+            self._records_by_label: Dict[str, RecordingRun] = {}
+
+
+
+
+
+        def shutdown(self):
+
+            self.stop_play_loop()
+
+
+
+        def toggle_view(self):
+
+            if self.view_mode == "cards":
+
+                self._show_graphs()
+
+            else:
+
+                self._show_cards()
+
+
+
+        def _show_cards(self):
+
+            self.graphs_holder.pack_forget()
+
+            self.cards_holder.pack(fill="x", expand=True)
+
+            self.view_mode = "cards"
+
+            self.view_btn.configure(text="Показать графики")
+
+            self._fire_scroll_update()
+
+
+
+        def _show_graphs(self):
+
+            self.cards_holder.pack_forget()
+
+            self.graphs_holder.pack(fill="x", expand=True)
+
+            self.view_mode = "graphs"
+
+            self.view_btn.configure(text="Показать значения")
+
+            self._refresh_graphs()
+
+            self._fire_scroll_update()
+
+
+
+        def _fire_scroll_update(self):
+
+            try:
+
+                self.scroll_callback()
+
+            except Exception:
+
+                pass
+
+
+
+
+
+        def _handle_window_change(self, *_):
+
+            label = self.window_var.get() if self.window_var else ""
+
+            seconds = self.window_map.get(label)
+
+            if seconds:
+
+                self.graph_manager.set_window(seconds)
+
+            self._refresh_graphs()
+
+
+
+        def _handle_recording_select(self, *_):
+
+            if not self.recordings:
+
+                self.playback_run = None
+
+                self._update_slider_range()
+
+                return
+
+            label = self.records_var.get()
+
+            run = self._records_by_label.get(label)
+
+            if run is None and self.recordings:
+
+                run = self.recordings[0]
+
+                self.records_var.set(run.label)
+
+            self.playback_run = run
+
+            self._update_slider_range()
+
+            if self.play_mode == "playback" and run and run.snapshots:
+
+                self.play_index = max(0, min(self.play_index, len(run.snapshots) - 1))
+
+                snap = self._snapshot_for_playback(self.play_index)
+
+                self.apply_snapshot(snap, highlight_ts=snap.ts, playback_index=self.play_index)
+
+
+
+        def _set_play_controls_state(self, enabled: bool):
+
+            state = ["!disabled"] if enabled else ["disabled"]
+
+            for btn in (self.prev_btn, self.play_btn, self.next_btn):
+
+                try:
+
+                    btn.state(state)
+
+                except Exception:
+
+                    pass
+
+            try:
+
+                self.slider.configure(state="normal" if enabled else "disabled")
+
+            except Exception:
+
+                pass
+
+
+
+        def _refresh_graphs(self):
+
+            highlight = self.latest_snapshot.ts if self.latest_snapshot else None
+
+            self.graph_manager.update(self._hist_snaps, highlight_ts=highlight, buffer=self._graph_buffer)
+
+
+
+        def _recording_label_prefix(self, created_at: float, car: str, track: str, cfg: str) -> str:
+
+            # strftime/fromtimestamp выполняются один раз при старте записи;
+
+            # stop_recording лишь дописывает длительность к готовому префиксу
+
+            timestamp = datetime.fromtimestamp(created_at).strftime("%H:%M:%S")
+
+            track_part = track or "-"
+
+            if cfg:
+
+                track_part = f"{track_part} ({cfg})"
+
+            car_part = car or "-"
+
+            return f"{timestamp} | {car_part} | {track_part}"
+
+
+
+        def _refresh_recordings_combo(self, select_index: Optional[int] = None):
+
+            self._records_by_label = {run.label: run for run in self.recordings}
+
+            labels = list(self._records_by_label.keys())
+
+            try:
+
+                self.records_cb.configure(values=labels)
+
+            except Exception:
+
+                pass
+
+            if labels:
+
+                try:
+
+                    self.records_cb.configure(state="readonly")
+
+                except Exception:
+
+                    pass
+
+                if select_index is None or not (0 <= select_index < len(labels)):
+
+                    select_index = 0
+
+                try:
+
+                    self.records_cb.current(select_index)
+
+                except Exception:
+
+                    pass
+
+                self.records_var.set(labels[select_index])
+
+                self.playback_run = self._records_by_label.get(labels[select_index])
+
+            else:
+
+                self.records_var.set("")
+
+                try:
+
+                    self.records_cb.configure(values=())
+
+                    self.records_cb.configure(state="disabled")
+
+                except Exception:
+
+                    pass
+
+                self.playback_run = None
+
+            self._update_slider_range()
+
+            self._update_playback_button_state()
+
+
+
+        def _update_playback_button_state(self):
+
+            if self.recordings:
+
+                self.playback_btn.state(["!disabled"])
+
+            else:
+
+                self.playback_btn.state(["disabled"])
+
+
+
+        def _update_slider_range(self):
+
+            snaps = self._current_playback_snapshots()
+
+            upper = max(0, len(snaps) - 1)
+
+            try:
+
+                self.slider.configure(from_=0, to=upper)
+
+            except Exception:
+
+                pass
+
+
+
+        def _snapshot_for_playback(self, index: int) -> Snapshot:
+
+            snaps = self._current_playback_snapshots()
+
+            if not snaps:
+
+                raise IndexError("no snapshots available")
+
+            index = max(0, min(index, len(snaps) - 1))
+
+            return snaps[index]
+
+
+
+        def _current_playback_snapshots(self) -> List[Snapshot]:
+
+            # все вызывающие только читают (len/индексация), копия списка
+
+            # на каждый кадр плейбека не нужна
+
+            return self.playback_run.snapshots if self.playback_run else []
+
+
+
+        def _playback_delays(self) -> List[int]:
+
+            # таблица межкадровых задержек считается один раз на выбранную запись,
+
+            # а не из пары снапшотов на каждом тике плейбека
+
+            run = self.playback_run
+
+            if run is not self._play_delays_run:
+
+                snaps = run.snapshots if run else []
+
+                delays = [100] * max(0, len(snaps) - 1)
+
+                for i in range(len(snaps) - 1):
+
+                    dt = snaps[i + 1].ts - snaps[i].ts
+
+                    if dt > 0:
+
+                        delays[i] = int(max(16, min(200, dt * 1000)))
+
+                self._play_delays = delays
+
+                self._play_delays_run = run
+
+            return self._play_delays
+
+
+
+        def _schedule_next_frame(self):
+
+            if self.play_mode != "playback":
+
+                return
+
+            snaps = self._current_playback_snapshots()
+
+            if not snaps or self.play_index >= len(snaps) - 1:
+
+                self.stop_play_loop()
+
+                return
+
+            delays = self._playback_delays()
+
+            delay_ms = delays[self.play_index] if self.play_index < len(delays) else 100
+
+
+
+            def _advance():
+
+                self.play_job = None
+
+                if not self.play_running:
+
+                    return
+
+                snaps_local = self._current_playback_snapshots()
+
+                if not snaps_local or self.play_index >= len(snaps_local) - 1:
+
+                    self.stop_play_loop()
+
+                    return
+
+                self.play_index += 1
+
+                self.slider_adjust = True
+
+                try:
+
+                    self.slider.set(self.play_index)
+
+                finally:
+
+                    self.slider_adjust = False
+
+                snap = self._snapshot_for_playback(self.play_index)
+
+                self.apply_snapshot(snap, highlight_ts=snap.ts, playback_index=self.play_index)
+
+                self._schedule_next_frame()
+
+
+
+            self.play_job = self.root.after(delay_ms, _advance)
+
+
+
+        def _map_frame_dirty(self, force: bool) -> bool:
+
+            mp = self.mpanel
+
+            view = (mp.view_scale, mp.view_dx, mp.view_dy)
+
+            if mp.last_car_pos is not None:
+
+                ix, iy = mp.world_to_img(mp.last_car_pos[0], mp.last_car_pos[1])
+
+                car_px = (ix * mp.view_scale + mp.view_dx, iy * mp.view_scale + mp.view_dy)
+
+            else:
+
+                car_px = None
+
+            trail_n = len(mp.trail_img)
+
+            dirty = force or trail_n != self._last_trail_n or view != self._last_view
+
+            if not dirty:
+
+                if (car_px is None) != (self._last_car_px is None):
+
+                    dirty = True
+
+                elif car_px is not None:
+
+                    dirty = (abs(car_px[0] - self._last_car_px[0]) >= 0.5
+
+                             or abs(car_px[1] - self._last_car_px[1]) >= 0.5)
+
+            if dirty:
+
+                self._last_car_px = car_px
+
+                self._last_trail_n = trail_n
+
+                self._last_view = view
+
+            return dirty
+
+
+
+        def apply_snapshot(self, snapshot: Snapshot, highlight_ts: Optional[float] = None, playback_index: Optional[int] = None):
+
+            self.latest_snapshot = snapshot
+
+            data = snapshot.data
+
+            track = data.get("track", "-") or "-"
+
+            cfg = data.get("trackConfig") or ""
+
+            track_display = f"{track} ({cfg})" if cfg else track
+
+            car = data.get("carModel", "-") or "-"
+
+            title = f"Car: {car}   Track: {track_display}"
+
+            if title != self._last_title:
+
+                self._last_title = title
+
+                self.lbl_title.configure(text=title)
+
+            status = self.mpanel.load_assets_if_needed(track if track != "-" else None, cfg or None)
+
+            if status and status != self._last_map_status:
+
+                self._last_map_status = status
+
+                self.lbl_map_status.configure(text=status)
+
+            car_pos = data.get("car_pos")
+
+            if isinstance(car_pos, (list, tuple)) and len(car_pos) >= 2:
+
+                try:
+
+                    self.mpanel.set_car_position((float(car_pos[0]), float(car_pos[1])))
+
+                except Exception:
+
+                    self.mpanel.set_car_position(None)
+
+            trail = data.get("trail")
+
+            if isinstance(trail, list) and trail:
+
+                world = None
+
+                if NUMPY_OK:
+
+                    try:
+
+                        world = np.asarray(trail, dtype=np.float32)
+
+                    except Exception:
+
+                        world = None
+
+                if world is not None and world.ndim == 2 and world.shape[1] >= 2:
+
+                    # весь хвост одной матричной операцией вместо world_to_img на точку
+
+                    self.mpanel.trail_img = self.mpanel.world_to_img_batch(world[:, :2])
+
+                else:
+
+                    pts = []
+
+                    for item in trail:
+
+                        if not isinstance(item, (list, tuple)) or len(item) < 2:
+
+                            continue
+
+                        try:
+
+                            pts.append(self.mpanel.world_to_img(float(item[0]), float(item[1])))
+
+                        except Exception:
+
+                            continue
+
+                    self.mpanel.trail_img = pts
+
+            else:
+
+                self.mpanel.trail_img = []
+
+            if self._map_frame_dirty(bool(status)):
+
+                self.mpanel.schedule_redraw()
+
+            self.set_label("car", car)
+
+            self.set_label("track", track_display)
+
+            lap = data.get("lap")
+
+            position = data.get("position")
+
+            if lap is not None and position is not None:
+
+                self.set_label("lp", f"{lap} / {position}")
+
+            elif lap is not None:
+
+                self.set_label("lp", str(lap))
+
+            else:
+
+                self.set_label("lp", "-")
+
+            sector = data.get("sector")
+
+            self.set_label("sec", str(sector) if sector is not None else "-")
+
+            times = [data.get("time_current"), data.get("time_last"), data.get("time_best")]
+
+            self.set_label("times", " / ".join(t or "--" for t in times))
+
+            temps = data.get("tyreCoreTemperature")
+
+            if temps:
+
+                try:
+
+                    self.set_label("tcore", "/".join(map(_FMT1, temps)))
+
+                except Exception:
+
+                    self.set_label("tcore", "-")
+
+            else:
+
+                self.set_label("tcore", "-")
+
+            pressures = data.get("wheelsPressurePsi")
+
+            if pressures:
+
+                try:
+
+                    psi_vals = [float(v) for v in pressures]
+
+                    bar_vals = [psi_to_bar(v) for v in psi_vals]
+
+                    bar_str = "/".join(map(_FMT2, bar_vals))
+
+                    psi_str = "/".join(map(_FMT1, psi_vals))
+
+                    self.set_label("press", f"{bar_str} bar | {psi_str} psi")
+
+                except Exception:
+
+                    self.set_label("press", "-")
+
+            else:
+
+                self.set_label("press", "-")
+
+            wheel_speed = data.get("wheelLinearKmh")
+
+            if wheel_speed:
+
+                try:
+
+                    self.set_label("wheelspeed", "/".join(map(_FMT1, wheel_speed)))
+
+                except Exception:
+
+                    self.set_label("wheelspeed", "-")
+
+            else:
+
+                self.set_label("wheelspeed", "-")
+
+            susp = data.get("suspensionTravel")
+
+            if susp:
+
+                try:
+
+                    self.set_label("susp", "/".join(_FMT0(float(v) * 1000) for v in susp))
+
+                except Exception:
+
+                    self.set_label("susp", "-")
+
+            else:
+
+                self.set_label("susp", "-")
+
+            ride = data.get("rideHeight")
+
+            if ride:
+
+                try:
+
+                    self.set_label("ride", "/".join(_FMT0(float(v) * 1000) for v in ride))
+
+                except Exception:
+
+                    self.set_label("ride", "-")
+
+            else:
+
+                self.set_label("ride", "-")
+
+            load = data.get("wheelLoad")
+
+            if load:
+
+                try:
+
+                    self.set_label("load", "/".join(_FMT0(float(v) / 9.81) for v in load))
+
+                except Exception:
+
+                    self.set_label("load", "-")
+
+            else:
+
+                self.set_label("load", "-")
+
+            self.set_label("drs", _FMT2(data.get("drs", 0.0)))
+
+            self.set_label("tc", _FMT2(data.get("tc", 0.0)))
+
+            self.set_label("abs", _FMT2(data.get("abs", 0.0)))
+
+            self.set_label("airrho", _FMT3(data.get("airDensity", 0.0)))
+
+            self.set_label("cgh", _FMT1(data.get("cgHeight", 0.0) * 100))
+
+            self.set_label("grip", _FMT2(data.get("surfaceGrip", 0.0)))
+
+            self.set_label("steer", _FMT1(data.get("steerAngle", 0.0)) + " deg")
+
+            if playback_index is None:
+
+                time_text = "LIVE"
+
+            else:
+
+                total = max(1, len(self._current_playback_snapshots()))
+
+                time_text = f"{playback_index + 1}/{total}"
+
+            if time_text != self._last_time_text:
+
+                self._last_time_text = time_text
+
+                self.time_label.configure(text=time_text)
+
+            highlight_ts = highlight_ts if highlight_ts is not None else snapshot.ts
+
+            self._refresh_graphs()
+
+
+
+        def on_new_state(self, data: Dict[str, Any]):
+
+            if not isinstance(data, dict):
+
+                return
+
+            ts = float(data.get("timestamp", time.time()))
+
+            snapshot = Snapshot(ts, data)
+
+            self._hist_ts.append(ts)
+
+            self._hist_snaps.append(snapshot)
+
+            if self._graph_buffer is not None:
+
+                self._graph_buffer.append(snapshot)
+
+            cut = bisect.bisect_left(self._hist_ts, ts - self.max_history_seconds)
+
+            if cut:
+
+                del self._hist_ts[:cut]
+
+                del self._hist_snaps[:cut]
+
+            self.latest_snapshot = snapshot
+
+            if self.recording and self.active_recording:
+
+                # в запись уходит тот же объект Snapshot, что и в history:
+
+                # append-once / read-many, никаких копий данных
+
+                self.active_recording.snapshots.append(snapshot)
+
+            if self.play_mode != "playback":
+
+                self.apply_snapshot(snapshot, highlight_ts=ts)
+
+            else:
+
+                self._refresh_graphs()
+
+
+
+        def toggle_record(self):
+
+            if self.recording:
+
+                self.stop_recording()
+
+            else:
+
+                self.start_recording()
+
+
+
+        def start_recording(self):
+
+            base = self.latest_snapshot or (self._hist_snaps[-1] if self._hist_snaps else None)
+
+            car = base.data.get("carModel", "-") if base else "-"
+
+            track = base.data.get("track", "-") if base else "-"
+
+            cfg = base.data.get("trackConfig", "") if base else ""
+
+            created = time.time()
+
+            self._label_prefix = self._recording_label_prefix(created, car, track, cfg)
+
+            label = f"{self._label_prefix} | 0.0s"
+
+            self.active_recording = RecordingRun(label=label, car=car, track=track, track_cfg=cfg, created_at=created)
+
+            self.recording = True
+
+            self.play_mode = "live"
+
+            self.stop_play_loop()
+
+            self.record_btn.configure(text="Стоп запись")
+
+            self._set_play_controls_state(False)
+
+            self.playback_btn.configure(text="Режим воспроизведения")
+
+            self.playback_btn.state(["disabled"])
+
+
+
+        def stop_recording(self):
+
+            run = self.active_recording
+
+            self.recording = False
+
+            self.active_recording = None
+
+            self.record_btn.configure(text="Начать запись")
+
+            if run and run.snapshots:
+
+                duration = max(0.0, run.snapshots[-1].ts - run.snapshots[0].ts)
+
+                run.label = f"{self._label_prefix} | {duration:.1f}s"
+
+                self.recordings.append(run)
+
+                self._refresh_recordings_combo(select_index=len(self.recordings) - 1)
+
+            self._update_playback_button_state()
+
+
+
+        def toggle_play_mode(self):
+
+            if self.play_mode == "live":
+
+                self.set_play_mode("playback")
+
+            else:
+
+                self.set_play_mode("live")
+
+
+
+        def set_play_mode(self, mode: str):
+
+            if mode == self.play_mode:
+
+                return
+
+            if mode == "playback":
+
+                if not self.recordings:
+
+                    return
+
+                if not self.playback_run:
+
+                    self._refresh_recordings_combo(select_index=len(self.recordings) - 1)
+
+                if not self.playback_run or not self.playback_run.snapshots:
+
+                    return
+
+                self.play_mode = "playback"
+
+                self.stop_play_loop()
+
+                self._set_play_controls_state(True)
+
+                self.playback_btn.configure(text="К живым данным")
+
+                self._update_slider_range()
+
+                self.slider_adjust = True
+
+                self.play_index = 0
+
+                self.slider.set(0)
+
+                self.slider_adjust = False
+
+                snap = self._snapshot_for_playback(self.play_index)
+
+                self.apply_snapshot(snap, highlight_ts=snap.ts, playback_index=self.play_index)
+
+            else:
+
+                self.play_mode = "live"
+
+                self.stop_play_loop()
+
+                self._set_play_controls_state(False)
+
+                self.playback_btn.configure(text="Режим воспроизведения")
+
+                self.time_label.configure(text="LIVE")
+
+                if self.latest_snapshot:
+
+                    self.apply_snapshot(self.latest_snapshot, highlight_ts=self.latest_snapshot.ts)
+
+
+
+        def toggle_play(self):
+
+            snaps = self._current_playback_snapshots()
+
+            if self.play_mode != "playback" or not snaps:
+
+                return
+
+            if self.play_running:
+
+                self.stop_play_loop()
+
+            else:
+
+                self.play_running = True
+
+                self.play_btn.configure(text="Пауза")
+
+                self._schedule_next_frame()
+
+
+
+        def step_playback(self, step: int):
+
+            snaps = self._current_playback_snapshots()
+
+            if self.play_mode != "playback" or not snaps:
+
+                return
+
+            self.stop_play_loop()
+
+            new_idx = max(0, min(len(snaps) - 1, self.play_index + step))
+
+            if new_idx == self.play_index:
+
+                return
+
+            self.play_index = new_idx
+
+            self.slider_adjust = True
+
+            self.slider.set(self.play_index)
+
+            self.slider_adjust = False
+
+            snap = self._snapshot_for_playback(self.play_index)
+
+            self.apply_snapshot(snap, highlight_ts=snap.ts, playback_index=self.play_index)
+
+
+
+        def on_slider_move(self, value: str):
+
+            snaps = self._current_playback_snapshots()
+
+            if self.play_mode != "playback" or not snaps or self.slider_adjust:
+
+                return
+
+            try:
+
+                idx = int(float(value) + 0.5)
+
+            except Exception:
+
+                return
+
+            idx = max(0, min(len(snaps) - 1, idx))
+
+            if idx == self.play_index:
+
+                return
+
+            self.play_index = idx
+
+            snap = self._snapshot_for_playback(self.play_index)
+
+            self.apply_snapshot(snap, highlight_ts=snap.ts, playback_index=self.play_index)
+
+
+
+        def stop_play_loop(self):
+
+            if self.play_job is not None:
+
+                try:
+
+                    self.root.after_cancel(self.play_job)
+
+                except Exception:
+
+                    pass
+
+                self.play_job = None
+
+            if self.play_running:
+
+                self.play_running = False
+
+                self.play_btn.configure(text="Play")
+
+
+
+
+
+    root = tk.Tk()
+
+    root.title("AC Telemetry - Advanced")
+
+    root.geometry("1100x760+120+120")
+
+    root.minsize(900, 600)
+
+
+
+    outer = ttk.Frame(root, padding=8)
+
+    outer.pack(fill="both", expand=True)
+
+
+
+    left = ttk.Frame(outer)
+
+    left.pack(side="left", fill="y", padx=(0, 8))
+
+
+
+    controls = ttk.Frame(left)
+
+    controls.pack(fill="x", pady=(0, 6))
+
+    controls.columnconfigure(0, weight=1)
+
+    controls.columnconfigure(1, weight=1)
+
+    controls.columnconfigure(2, weight=1)
+
+
+
+    view_btn = ttk.Button(controls, text="Показать графики")
+
+    view_btn.grid(row=0, column=0, padx=(0, 4), sticky="ew")
+
+    record_btn = ttk.Button(controls, text="Начать запись")
+
+    record_btn.grid(row=0, column=1, padx=(0, 4), sticky="ew")
+
+    playback_btn = ttk.Button(controls, text="Режим воспроизведения")
+
+    playback_btn.grid(row=0, column=2, sticky="ew")
+
+
+
+    playback_controls = ttk.Frame(controls)
+
+    playback_controls.grid(row=1, column=0, columnspan=3, pady=(4, 0), sticky="ew")
+
+    playback_controls.columnconfigure(3, weight=1)
+
+
+
+    prev_btn = ttk.Button(playback_controls, text="<")
+
+    prev_btn.grid(row=0, column=0, padx=(0, 2))
+
+    play_btn = ttk.Button(playback_controls, text="Play")
+
+    play_btn.grid(row=0, column=1, padx=(0, 2))
+
+    next_btn = ttk.Button(playback_controls, text=">")
+
+    next_btn.grid(row=0, column=2, padx=(0, 6))
+
+    slider = ttk.Scale(playback_controls, from_=0, to=0, orient="horizontal")
+
+    slider.grid(row=0, column=3, sticky="ew")
+
+    time_label = ttk.Label(playback_controls, text="LIVE")
+
+    time_label.grid(row=0, column=4, padx=(6, 0))
+
+
+
+    ttk.Label(controls, text="Записи:").grid(row=2, column=0, sticky="w", pady=(6, 0))
+
+    records_var = tk.StringVar()
+
+    records_cb = ttk.Combobox(controls, textvariable=records_var, state="disabled", width=34)
+
+    records_cb.grid(row=2, column=1, columnspan=2, sticky="ew", pady=(6, 0))
+
+
+
+    ttk.Label(controls, text="Окно графика:").grid(row=3, column=0, sticky="w", pady=(4, 0))
+
+    window_var = tk.StringVar()
+
+    window_cb = ttk.Combobox(controls, textvariable=window_var, state="readonly", width=12)
+
+    window_cb.grid(row=3, column=1, sticky="w", pady=(4, 0))
+
+    window_choices = [5, 10, 20, 30, 60, 120]
+
+
+
+    canvasL = tk.Canvas(left, bg="#0f0f10", highlightthickness=0, width=360)
+
+    vsb = ttk.Scrollbar(left, orient="vertical", command=canvasL.yview)
+
+    frm = ttk.Frame(canvasL)
+
+    frame_id = canvasL.create_window((0, 0), window=frm, anchor="nw")
+
+    canvasL.configure(yscrollcommand=vsb.set)
+
+    canvasL.pack(side="left", fill="y")
+
+    vsb.pack(side="left", fill="y")
+
+
+
+    def _on_conf(event=None):
+
+        canvasL.configure(scrollregion=canvasL.bbox("all"))
+
+        w = event.width if event else canvasL.winfo_width()
+
+        try:
+
+            canvasL.itemconfig(frame_id, width=w)
+
+        except Exception:
+
+            pass
+
+
+
+    frm.bind("<Configure>", _on_conf)
+
+    canvasL.bind("<Configure>", _on_conf)
+
+
+
+    # колёсные события копятся и применяются одним yview_scroll на idle-тик:
+
+    # high-DPI тачпады шлют десятки событий в секунду прямо в главный поток Tk
+
+    _scroll_accum = 0
+
+    _scroll_pending = False
+
+
+
+    def _apply_scroll():
+
+        nonlocal _scroll_accum, _scroll_pending
+
+        _scroll_pending = False
+
+        step = int(-_scroll_accum / 120)
+
+        if step:
+
+            _scroll_accum += step * 120
+
+            canvasL.yview_scroll(step, "units")
+
+
+
+    def _scroll_cards(event):
+
+        nonlocal _scroll_accum, _scroll_pending
+
+        delta = 0
+
+        if hasattr(event, "delta") and event.delta:
+
+            delta = event.delta
+
+        elif hasattr(event, "num") and event.num in (4, 5):
+
+            delta = 120 if event.num == 4 else -120
+
+        if not delta:
+
+            return "break"
+
+        _scroll_accum += delta
+
+        if not _scroll_pending:
+
+            _scroll_pending = True
+
+            canvasL.after_idle(_apply_scroll)
+
+        return "break"
+
+
+
+    canvasL.bind("<MouseWheel>", _scroll_cards)
+
+    canvasL.bind("<Button-4>", _scroll_cards)
+
+    canvasL.bind("<Button-5>", _scroll_cards)
+
+
+
+    right = ttk.Frame(outer)
+
+    right.pack(side="left", fill="both", expand=True)
+
+    top = ttk.Frame(right)
+
+    top.pack(fill="x")
+
+    lbl_title = ttk.Label(top, text="Car: -   Track: -", font=("Consolas", 12, "bold"))
+
+    lbl_title.pack(side="left")
+
+    lbl_map_status = ttk.Label(top, text="Карта: нет данных")
+
+    lbl_map_status.pack(side="right")
+
+
+
+    cv_map = tk.Canvas(right, bg="#0b0b0d", highlightthickness=0, cursor="fleur")
+
+    cv_map.pack(fill="both", expand=True, pady=(8, 0))
+
+
+
+    mpanel = MapPanel(cv_map)
+
+
+
+    map_controls = ttk.Frame(left)
+
+    map_controls.pack(fill="x", pady=(0, 6))
+
+    center_var = tk.BooleanVar(value=True)
+
+
+
+    def _toggle_center() -> None:
+
+        mpanel.set_center_mode(bool(center_var.get()))
+
+        mpanel.reset_view()
+
+
+
+    center_chk = ttk.Checkbutton(map_controls, text="Следовать за машиной", variable=center_var, command=_toggle_center)
+
+    center_chk.pack(side="left")
+
+    reset_btn = ttk.Button(map_controls, text="Сбросить вид", command=lambda: mpanel.reset_view())
+
+    reset_btn.pack(side="left", padx=(8, 0))
+
+    center_var.set(True)
+
+    _toggle_center()
+
+
+
+    cards_holder = ttk.Frame(frm)
+
+    cards_holder.pack(fill="x", expand=True)
+
+    graphs_holder = ttk.Frame(frm)
+
+
+
+    graph_manager = GraphManager(graphs_holder)
+
+    graph_manager.build(GRAPH_CONFIGS)
+
+
+
+    def card(title, keys_and_labels: List[Tuple[str, str]]) -> Dict[str, Any]:
+
+        holder: Dict[str, Any] = {}
+
+        box = ttk.Frame(cards_holder, padding=8)
+
+        box.pack(fill="x", pady=(4, 4))
+
+        box["borderwidth"] = 1
+
+        box["relief"] = "solid"
+
+        ttk.Label(box, text=title, font=("Segoe UI", 10, "bold")).grid(row=0, column=0, sticky="w", pady=(0, 6), columnspan=2)
+
+        r = 1
+
+        for key, label in keys_and_labels:
+
+            ttk.Label(box, text=label).grid(row=r, column=0, sticky="w")
+
+            val = ttk.Label(box, text="-")
+
+            val.grid(row=r, column=1, sticky="e")
+
+            holder[key] = val
+
+            r += 1
+
+        box.columnconfigure(0, weight=1)
+
+        box.columnconfigure(1, weight=1)
+
+        return holder
+
+
+
+    refs: Dict[str, ttk.Label] = {}
+
+
+
+    def reg(d: Dict[str, ttk.Label]):
+
+        refs.update(d)
+
+
+
+    reg(card("Авто и трасса", [
+
+        ("car", "Автомобиль"),
+
+        ("track", "Трасса"),
+
+        ("lp", "Круг / позиция"),
+
+        ("sec", "Сектор"),
+
+        ("times", "Время (текущее/последнее/лучшее)"),
+
+    ]))
+
+    reg(card("Шины и давление", [
+
+        ("tcore", "Темп. FL/FR/RL/RR (°C)"),
+
+        ("press", "Давление FL/FR/RL/RR (bar/psi)"),
+
+        ("wheelspeed", "Скорость колёс FL/FR/RL/RR (км/ч)"),
+
+    ]))
+
+    reg(card("Подвеска и нагрузка", [
+
+        ("susp", "Ход подвески FL/FR/RL/RR (мм)"),
+
+        ("ride", "Клиренс перед/зад (мм)"),
+
+        ("load", "Нагрузка FL/FR/RL/RR (кг)"),
+
+    ]))
+
+    reg(card("Системы и среда", [
+
+        ("drs", "DRS"),
+
+        ("tc", "TC уровень"),
+
+        ("abs", "ABS уровень"),
+
+        ("airrho", "Плотность воздуха (кг/м³)"),
+
+        ("cgh", "Центр тяжести (см)"),
+
+        ("grip", "Грипп покрытия"),
+
+    ]))
+
+    reg(card("Руль", [
+
+        ("steer", "Угол руля (°)"),
+
+    ]))
+
+
+
+    _last_lbl: Dict[str, str] = {}
+
+
+
+    def set_lbl(key: str, text: str):
+
+        # Tk configure не бесплатен: значения вроде трека/машины меняются редко,
+
+        # неизменившийся текст не трогаем
+
+        if _last_lbl.get(key) == text:
+
+            return
+
+        lab = refs.get(key)
+
+        if lab:
+
+            _last_lbl[key] = text
+
+            lab.configure(text=text)
+
+
+
+    controller = AdvancedStateController(
+
+        root=root,
+
+        mpanel=mpanel,
+
+        lbl_title=lbl_title,
+
+        lbl_map_status=lbl_map_status,
+
+        set_label=set_lbl,
+
+        graph_manager=graph_manager,
+
+        view_btn=view_btn,
+
+        record_btn=record_btn,
+
+        playback_btn=playback_btn,
+
+        play_btn=play_btn,
+
+        prev_btn=prev_btn,
+
+        next_btn=next_btn,
+
+        slider=slider,
+
+        time_label=time_label,
+
+        cards_holder=cards_holder,
+
+        graphs_holder=graphs_holder,
+
+        scroll_callback=_on_conf,
+        records_var=records_var,
+        records_cb=records_cb,
+        window_var=window_var,
+        window_cb=window_cb,
+        window_choices=window_choices,
+    )
+
+
+
+    adv_shm = None
+
+    adv_view: Optional[AdvSnap] = None
+
+    if shm_name:
+
+        try:
+
+            from multiprocessing import shared_memory
+
+            adv_shm = shared_memory.SharedMemory(name=shm_name)
+
+            adv_view = AdvSnap.from_buffer(adv_shm.buf)
+
+        except Exception:
+
+            adv_shm = None
+
+            adv_view = None
+
+    snap_local = AdvSnap()
+
+    last_seq = 0
+
+
+
+    def read_snapshot() -> Optional[AdvSnap]:
+
+        # seqlock: копируем кадр и проверяем, что писатель не менял его под нами
+
+        nonlocal last_seq
+
+        if adv_view is None:
+
+            return None
+
+        for _ in range(4):
+
+            s0 = adv_view.seq
+
+            if s0 & 1:
+
+                continue
+
+            if s0 == last_seq:
+
+                return None
+
+            ctypes.memmove(ctypes.addressof(snap_local), ctypes.addressof(adv_view), ctypes.sizeof(AdvSnap))
+
+            if adv_view.seq == s0:
+
+                last_seq = s0
+
+                return snap_local
+
+        return None
+
+
+
+    # адаптивный интервал опроса: свежие кадры — ускоряемся вдвое,
+
+    # серия пустых тиков (пауза, AC:WAIT) — плавно замедляемся
+
+    fast_ms = max(10, poll_ms // 2)
+
+    slow_ms = max(poll_ms, min(500, poll_ms * 2))
+
+    cur_ms = poll_ms
+
+    idle_ticks = 0
+
+
+
+    def poll_queue():
+
+        # очередь сливаем целиком, но применяем только последнее состояние:
+
+        # при всплеске продюсера N-1 устаревших кадров не доходят до Tk
+
+        nonlocal cur_ms, idle_ticks
+
+        last_state = None
+
+        try:
+
+            while True:
+
+                msg = state_queue.get_nowait()
+
+                if isinstance(msg, dict) and msg.get("cmd") == "exit":
+
+                    controller.shutdown()
+
+                    root.destroy()
+
+                    return
+
+                if isinstance(msg, dict) and msg.get("type") == "state":
+
+                    last_state = msg.get("data", {})
+
+        except queue.Empty:
+
+            pass
+
+        if last_state is not None:
+
+            controller.on_new_state(last_state)
+
+        sn = read_snapshot()
+
+        if sn is not None:
+
+            controller.on_new_state(adv_snap_to_data(sn))
+
+        if sn is not None or last_state is not None:
+
+            idle_ticks = 0
+
+            cur_ms = fast_ms
+
+        else:
+
+            idle_ticks += 1
+
+            if idle_ticks >= 10 and cur_ms < slow_ms:
+
+                idle_ticks = 0
+
+                cur_ms = min(slow_ms, max(poll_ms, cur_ms * 2))
+
+        root.after(cur_ms, poll_queue)
+
+
+
+    root.after(poll_ms, poll_queue)
+
+    root.protocol("WM_DELETE_WINDOW", lambda: (state_queue.put({"cmd": "exit"}), controller.shutdown(), root.destroy()))
+
+    root.mainloop()
+
+
+
+
+
+def _csv_worker(fh, q: "queue.SimpleQueue") -> None:
+
+    # фоновая запись CSV: строки копятся пачками до 64 и уходят одним
+
+    # writelines, чтобы файловый ввод-вывод не тормозил цикл отрисовки;
+
+    # None — сигнал завершения
+
+    done = False
+
+    while not done:
+
+        row = q.get()
+
+        if row is None:
+
+            break
+
+        batch = [row]
+
+        while len(batch) < 64:
+
+            try:
+
+                nxt = q.get_nowait()
+
+            except queue.Empty:
+
+                break
+
+            if nxt is None:
+
+                done = True
+
+                break
+
+            batch.append(nxt)
+
+        fh.writelines(batch)
+
+    try:
+
+        fh.flush()
+
+    except Exception:
+
+        pass
+
+
+
+# ----------------------------------------------------------------------
+
+# Main program (pygame)
+
+# ----------------------------------------------------------------------
+
+def main():
+
+    ap = argparse.ArgumentParser(description="Assetto Corsa Telemetry: pygame + Advanced Tk (separate process)")
+
+    ap.add_argument("--hz", type=float, default=50.0, help="Частота опроса SHM, Гц")
+
+    ap.add_argument("--buffer-secs", type=float, default=20.0, help="Глубина графиков, сек")
+
+    ap.add_argument("--no-topmost", action="store_true", help="Не делать окно поверх всех")
+
+
+
+    ap.add_argument("--csv", help="Путь к CSV-логу (опционально)")
+
+    ap.add_argument("--udp", help="UDP адрес для JSON-стрима, host:port (опционально)")
+
+
+
+    ap.add_argument("--unit", choices=["kmh", "mph", "ms"], default="kmh", help="Единицы скорости")
+
+    ap.add_argument("--speed-source", choices=["auto", "kmh", "vector"], default="auto",
+
+                    help="Источник скорости: speedKmh | |velocity|*3.6 | auto")
+
+    ap.add_argument("--speed-deadzone", type=float, default=0.5, help="Мёртвая зона (км/ч): ниже порога → 0.00")
+
+    ap.add_argument("--speed-ema", type=float, default=0.25, help="EMA сглаживание 0..1")
+
+
+
+    BoolAction = getattr(argparse, "BooleanOptionalAction", None)
+
+    if BoolAction:
+
+        ap.add_argument("--adv-window", action=BoolAction, default=True,
+
+                        help="Разрешить продвинутое окно (управляется кнопкой)")
+
+    else:
+
+        ap.add_argument("--adv-window", dest="adv_window", action="store_true", default=True,
+
+                        help="Разрешить Advanced окно (кнопка в главном)")
+
+        ap.add_argument("--no-adv-window", dest="adv_window", action="store_false",
+
+                        help="Запретить Advanced окно")
+
+
+
+    ap.add_argument("--adv-poll-ms", type=int, default=100, help="Интервал обновления Advanced, мс")
+
+    ap.add_argument("--ac-root", help="Корень Assetto Corsa (поиск карт)")
+
+    ap.add_argument("--track-map", help="Путь к PNG карте трассы (ручной выбор)")
+
+
+
+    args = ap.parse_args()
+
+    if not hasattr(args, "adv_window"):
+
+        setattr(args, "adv_window", True)
+
+
+
+    # pygame UI
+
+    pygame.init()
+
+    pygame.display.set_caption("Assetto Corsa — Telemetry")
+
+
+
+    def make_screen(size: Tuple[int, int]) -> pygame.Surface:
+
+        # просим vsync-презентацию: кадр ждёт в драйвере, а не в Python;
+
+        # не все драйверы/сборки это принимают — тогда обычный режим
+
+        try:
+
+            return pygame.display.set_mode(size, pygame.RESIZABLE | pygame.DOUBLEBUF, vsync=1)
+
+        except (TypeError, pygame.error):
+
+            return pygame.display.set_mode(size, pygame.RESIZABLE)
+
+
+
+    screen = make_screen((1280, 780))
+
+    clock = pygame.time.Clock()
+
+    font = pygame.font.SysFont("Consolas", 16)
+
+    fontb = pygame.font.SysFont("Consolas", 20, bold=True)
+
+    is_topmost = not args.no_topmost
+
+    if is_topmost:
+
+        set_topmost_for_pygame_window(True)
+
+
+
+    # AC SHM lazy attach
+
+    shm_phys = shm_graph = shm_stat = None
+
+    phys_v = None
+
+    ac_attached = False
+
+    last_ac_try = 0.0
+
+
+
+    def attach_ac() -> bool:
+
+        nonlocal shm_phys, shm_graph, shm_stat, ac_attached, phys_v
+
+        try:
+
+            shm_phys = SHMReader("acpmf_physics")
+
+            shm_graph = SHMReader("acpmf_graphics")
+
+            shm_stat = SHMReader("acpmf_static")
+
+            if NUMPY_OK:
+
+                # SoA-виды на колёсные поля: один memmove в copy_into обновляет
+
+                # сразу все массивы, без поэлементного бокса ctypes-float'ов
+
+                phys_v = shm_phys.field_arrays(SPageFilePhysics,
+
+                                               ("wheelAngularSpeed", "wheelsPressure",
+
+                                                "suspensionTravel", "wheelLoad",
+
+                                                "camberRAD", "tyreCoreTemperature",
+
+                                                "rideHeight"))
+
+            ac_attached = True
+
+            print("[AC] SHM attached")
+
+            return True
+
+        except RuntimeError:
+
+            shm_phys = shm_graph = shm_stat = None
+
+            phys_v = None
+
+            ac_attached = False
+
+            return False
+
+
+
+    def detach_ac():
+
+        nonlocal shm_phys, shm_graph, shm_stat, ac_attached, phys_v
+
+        phys_v = None
+
+        try:
+
+            if shm_phys: shm_phys.close()
+
+            if shm_graph: shm_graph.close()
+
+            if shm_stat: shm_stat.close()
+
+        except Exception:
+
+            pass
+
+        shm_phys = shm_graph = shm_stat = None
+
+        ac_attached = False
+
+        print("[AC] SHM detached")
+
+
+
+    attach_ac()
+
+
+
+    # CSV/UDP
+
+    csv_fh = None
+
+    # %-форматирование разбирает шаблон один раз, str.format — на каждой строке
+
+    csv_row_fmt = ("%.3f,%s,%s,%s,%d,%s,%d,%.3f,%.3f,%.3f,%.3f,%.1f,"
+
+                   "%s,%d,%d,%s,%s,%s,%d,%.1f,%.1f,%.1f,%.1f\n")
+
+    csv_q = None
+
+    csv_thread = None
+
+    if args.csv:
+
+        csv_fh = open(args.csv, "w", encoding="utf-8", newline="")
+
+        csv_fh.write("ts,car,track,cfg,gear_raw,gear_out,rpm,speed_raw,speed_filt,gas,brake,steer_deg,status,lap,pos,cur,last,best,sector,prsFL,prsFR,prsRL,prsRR\n")
+
+        csv_q = queue.SimpleQueue()
+
+        csv_thread = threading.Thread(target=_csv_worker, args=(csv_fh, csv_q), daemon=True)
+
+        csv_thread.start()
+
+    udp_sock = None; udp_addr = None
+
+    if args.udp:
+
+        try:
+
+            host, port_s = args.udp.rsplit(":", 1)
+
+            udp_addr = (host, int(port_s))
+
+            udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        except Exception as e:
+
+            print("Некорректный --udp, отключаю:", e)
+
+
+
+    target_fps = 60
+
+    poll_period = 1.0 / max(1.0, float(args.hz))
+
+    graph_fps = 30.0
+
+    capacity = max(120, min(2400, int(float(args.buffer_secs) * graph_fps)))
+
+
+
+    unit_label = {"kmh": "km/h", "mph": "mph", "ms": "m/s"}[args.unit]
+
+    plot_speed = Plot(f"Speed ({unit_label})", capacity)
+
+    plot_speed.add_series(Series("speed", (80, 180, 255)))
+
+    plot_rpm = Plot("RPM", capacity)
+
+    plot_rpm.add_series(Series("rpm", (255, 190, 80)))
+
+    plot_ped = Plot("Pedals", capacity)
+
+    plot_ped.add_series(Series("gas", (120, 220, 120), y_min=0, y_max=1, autoscale=False))
+
+    plot_ped.add_series(Series("brake", (220, 120, 120), y_min=0, y_max=1, autoscale=False))
+
+
+
+    # специализация по единице измерения один раз, без сравнения строк в цикле
+
+    if args.unit == "kmh":
+
+        def kmh_to_out(v_kmh: float) -> float: return v_kmh
+
+    elif args.unit == "mph":
+
+        def kmh_to_out(v_kmh: float) -> float: return v_kmh * 0.621371
+
+    else:
+
+        def kmh_to_out(v_kmh: float) -> float: return v_kmh / 3.6
+
+
+
+    # константы из argparse неизменны — не перечитываем их на каждом тике опроса
+
+    speed_src = args.speed_source
+
+    speed_src_code = 0 if speed_src == "kmh" else (1 if speed_src == "vector" else 2)
+
+    speed_deadzone = max(0.0, float(args.speed_deadzone))
+
+    speed_alpha = min(max(float(args.speed_ema), 0.0), 1.0)
+
+
+
+    # форматтеры HUD собираются один раз; быстрые величины квантуются перед
+
+    # форматированием, чтобы строка (и ключ кэша рендера) не менялась каждый кадр
+
+    fmt_speed = ("{:.2f} " + unit_label).format
+
+    fmt_lap_pos = "{} / {}".format
+
+    fmt_times = "{} / {}".format
+
+    fmt_gear = "{} (raw:{})".format
+
+    fmt_pedals = "Газ {:4d}%   Тормоз {:4d}%".format
+
+    fmt_steer = "{:+.1f}°".format
+
+
+
+    last_poll = 0.0
+
+    last_graph = 0.0
+
+    status_text = "AC:WAIT"
+
+    cur_time = last_time = best_time = ""
+
+    lap = pos = sec = 0
+
+    car_model = "—"
+
+    track_name = "—"
+
+    track_cfg = ""
+
+
+
+    gear_raw = 1
+
+    rpm = 0
+
+    gas = 0.0
+
+    brake = 0.0
+
+    steer_deg = 0.0
+
+    speed_kmh_raw = 0.0
+
+    speed_kmh_filt: Optional[float] = None
+
+    # tyreRadius на статической странице меняется только при смене машины —
+
+    # пересчитываем кэш по car_model, а не на каждом опросе
+
+    tyre_r = [0.33, 0.33, 0.33, 0.33]
+
+    tyre_r_np = np.asarray(tyre_r, dtype=np.float32) if NUMPY_OK else None
+
+    tyre_r_car: Optional[str] = None
+
+
+
+    trail: deque[Tuple[float, float]] = deque(maxlen=3000)  # world X,Z
+
+
+
+    # Advanced process plumbing
+
+    from multiprocessing import Process, Queue, set_start_method, shared_memory
+
+    try:
+
+        set_start_method("spawn", force=True)
+
+    except RuntimeError:
+
+        pass  # already set
+
+
+
+    adv_allowed = bool(args.adv_window)
+
+    adv_running = False
+
+    adv_q: Optional[Queue] = None
+
+    adv_proc: Optional[Process] = None
+
+    adv_shm = None
+
+    adv_snap: Optional[AdvSnap] = None
+
+    adv_views: Optional[Dict[str, Any]] = None
+
+
+
+    ac_roots = guess_ac_roots(args.ac_root)
+
+    manual_map = str(Path(args.track_map).resolve()) if args.track_map else None
+
+
+
+    def open_advanced():
+
+        nonlocal adv_running, adv_q, adv_proc, adv_shm, adv_snap, adv_views
+
+        if not adv_allowed:
+
+            return
+
+        if adv_running:
+
+            if adv_proc and adv_proc.is_alive():
+
+                return
+
+            close_advanced()
+
+        adv_q = Queue(maxsize=2)
+
+        shm_name = None
+
+        try:
+
+            adv_shm = shared_memory.SharedMemory(create=True, size=ctypes.sizeof(AdvSnap))
+
+            adv_snap = AdvSnap.from_buffer(adv_shm.buf)
+
+            ctypes.memset(ctypes.addressof(adv_snap), 0, ctypes.sizeof(AdvSnap))
+
+            # накопленный хвост траектории сразу переливаем в кольцо
+
+            for (tx, tz) in trail:
+
+                i = adv_snap.trail_head
+
+                adv_snap.trail[i][0] = tx
+
+                adv_snap.trail[i][1] = tz
+
+                adv_snap.trail_head = (i + 1) % ADV_TRAIL_CAP
+
+                if adv_snap.trail_count < ADV_TRAIL_CAP:
+
+                    adv_snap.trail_count += 1
+
+            if NUMPY_OK:
+
+                # numpy-виды на колёсные поля кадра: запись — один memcpy
+
+                # на поле вместо поэлементных ctypes-присваиваний
+
+                adv_views = {n: np.ctypeslib.as_array(getattr(adv_snap, n))
+
+                             for n in ("suspensionTravel", "wheelLoad",
+
+                                       "camberRAD", "wheelAngularSpeed",
+
+                                       "wheelLinearKmh", "wheelsPressurePsi",
+
+                                       "tyreCoreTemperature", "rideHeight")}
+
+            shm_name = adv_shm.name
+
+        except Exception:
+
+            adv_shm = None
+
+            adv_snap = None
+
+            adv_views = None
+
+        adv_proc = Process(target=advanced_process_main,
+
+                           args=(adv_q, [str(p) for p in ac_roots], manual_map, int(args.adv_poll_ms), shm_name),
+
+                           daemon=True)
+
+        adv_proc.start()
+
+        adv_running = True
+
+
+
+    def close_advanced():
+
+        nonlocal adv_running, adv_q, adv_proc, adv_shm, adv_snap, adv_views
+
+        q = adv_q
+
+        p = adv_proc
+
+        if q:
+
+            try:
+
+                q.put({"cmd": "exit"}, block=False)
+
+            except Exception:
+
+                pass
+
+        if p:
+
+            p.join(timeout=1.0)
+
+            if p.is_alive():
+
+                p.terminate()
+
+                p.join(timeout=0.5)
+
+        if q:
+
+            try:
+
+                q.close()
+
+                q.join_thread()
+
+            except Exception:
+
+                pass
+
+        adv_proc = None
+
+        adv_q = None
+
+        # ссылки from_buffer (и numpy-виды на них) отпускаем до close(),
+
+        # иначе BufferError
+
+        adv_views = None
+
+        adv_snap = None
+
+        if adv_shm is not None:
+
+            try:
+
+                adv_shm.close()
+
+                adv_shm.unlink()
+
+            except Exception:
+
+                pass
+
+            adv_shm = None
+
+        adv_running = False
+
+
+
+    # UI button rect
+
+    btn_rect = pygame.Rect(0, 0, 0, 0)
+
+    # dirty-rect вывод: полный flip только при смене размера окна
+
+    last_size = (0, 0)
+
+    # отпечатки отображаемого состояния: совпали с прошлым кадром — панель
+
+    # не перерисовывается и не уходит в display.update
+
+    last_head_state: Optional[Tuple] = None
+
+    last_hud_state: Optional[Tuple] = None
+
+
+
+    def draw_button(surface, rect, text, on):
+
+        pygame.draw.rect(surface, (40, 120, 60) if on else (90, 90, 90), rect, border_radius=8)
+
+        pygame.draw.rect(surface, (30, 30, 30), rect, 2, border_radius=8)
+
+        txt = fontb.render(text, True, (255, 255, 255))
+
+        surface.blit(txt, (rect.centerx - txt.get_width() // 2, rect.centery - txt.get_height() // 2))
+
+
+
+    # info_line создаётся один раз до цикла: замыкание читает актуальные
+
+    # r_info/hud_ops из локалей main, без MAKE_FUNCTION на каждом кадре.
+
+    # Готовые Surface копятся и уходят на экран одним пакетом — один
+
+    # переход Python->C вместо ~30 отдельных blit'ов
+
+    hud_ops: List[Tuple[pygame.Surface, Tuple[int, int]]] = []
+
+
+
+    tips = [
+
+        "ESC — выход, Ctrl+C — очистить графики, F11 — поверх всех.",
+
+        "Кнопка Advanced — включает отдельный процесс окна телеметрии.",
+
+        "Карта: map.png / ui/outline.png + data/map.ini; side_l/side_r — границы трассы.",
+
+        "В окне карты: средняя кнопка — панорама, колесо — зум.",
+
+    ]
+
+    # статичный блок подсказок растеризуется один раз на текущую ширину панели
+
+    tips_surf: Optional[pygame.Surface] = None
+
+    tips_surf_w = 0
+
+
+
+    def info_line(lbl: str, val: str, y: int, bold: bool = False) -> int:
+
+        label_max = r_info.width // 2 - 20
+
+        value_max = r_info.width // 2 - 20
+
+        f = fontb if bold else font
+
+        lbl_text = ellipsize(lbl, f, label_max)
+
+        val_text = ellipsize(val, f, value_max)
+
+        hud_ops.append((render_cached(f, lbl_text, (185, 185, 185)), (r_info.left + 12, y)))
+
+        hud_ops.append((render_cached(f, val_text, (255, 255, 255)), (r_info.left + r_info.width // 2, y)))
+
+        return y + (f.get_height() + 6)
+
+
+
+    running = True
+
+    while running:
+
+        now = time.time()
+
+
+
+        if not ac_attached and now - last_ac_try >= 2.0:
+
+            last_ac_try = now
+
+            attach_ac()
+
+
+
+        for ev in pygame.event.get():
+
+            if ev.type == pygame.QUIT:
+
+                running = False
+
+            elif ev.type == pygame.KEYDOWN:
+
+                if ev.key == pygame.K_ESCAPE:
+
+                    running = False
+
+                elif ev.key == pygame.K_F11:
+
+                    is_topmost = not is_topmost
+
+                    set_topmost_for_pygame_window(is_topmost)
+
+                elif ev.key == pygame.K_c and (pygame.key.get_mods() & pygame.KMOD_CTRL):
+
+                    for p in (plot_speed, plot_rpm, plot_ped):
+
+                        for s in p.series:
+
+                            s.clear()
+
+            elif ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
+
+                if adv_allowed and btn_rect.collidepoint(ev.pos):
+
+                    if adv_running and adv_proc and not adv_proc.is_alive():
+
+                        close_advanced()
+
+                    if adv_running:
+
+                        close_advanced()
+
+                    else:
+
+                        open_advanced()
+
+            elif ev.type == pygame.VIDEORESIZE:
+
+                screen = make_screen((ev.w, ev.h))
+
+                if is_topmost:
+
+                    set_topmost_for_pygame_window(True)
+
+
+
+        # poll AC
+
+        if now - last_poll >= poll_period:
+
+            last_poll = now
+
+            if ac_attached and shm_phys and shm_graph and shm_stat:
+
+                try:
+
+                    p = shm_phys.copy_into(SPageFilePhysics)
+
+                    g = shm_graph.copy_into(SPageFileGraphics)
+
+                    s = shm_stat.copy_into(SPageFileStatic)
+
+
+
+                    status_text = AC_STATUS.get(int(g.status), "?")
+
+                    cur_time = wstr(g.currentTime)
+
+                    last_time = wstr(g.lastTime)
+
+                    best_time = wstr(g.bestTime)
+
+                    lap = int(g.completedLaps)
+
+                    pos = int(g.position)
+
+                    sec = int(g.currentSectorIndex)
+
+
+
+                    car_model = wstr(s.carModel) or car_model
+
+                    track_name = wstr(s.track) or track_name
+
+                    track_cfg = wstr(s.trackConfig) or ""
+
+
+
+                    gear_raw = int(p.gear)
+
+                    rpm = int(p.rpms)
+
+                    gas = max(0.0, min(1.0, float(p.gas)))
+
+                    brake = max(0.0, min(1.0, float(p.brake)))
+
+
+
+                    kmh_field = float(p.speedKmh)
+
+                    vx, vy, vz = float(p.velocity[0]), float(p.velocity[1]), float(p.velocity[2])
+
+                    speed_kmh_raw, filt = _filter_speed(vx, vy, vz, kmh_field,
+
+                                                        speed_kmh_filt if speed_kmh_filt is not None else 0.0,
+
+                                                        speed_alpha, speed_deadzone, speed_src_code)
+
+                    speed_kmh_filt = filt if speed_kmh_filt is not None else speed_kmh_raw
+
+
+
+                    steer_deg = float(p.steerAngle)
+
+
+
+                    car_x = float(g.carCoordinates[0])
+
+                    car_z = float(g.carCoordinates[2])
+
+                    trail.append((car_x, car_z))
+
+
+
+                    # перечитываем и при нулевом радиусе: статическая страница
+
+                    # может заполниться чуть позже имени машины
+
+                    if car_model != tyre_r_car or tyre_r[0] <= 0.0:
+
+                        tyre_r_car = car_model
+
+                        if getattr(s, "tyreRadius", None):
+
+                            tyre_r = [float(s.tyreRadius[i]) for i in range(4)]
+
+                        else:
+
+                            tyre_r = [0.33, 0.33, 0.33, 0.33]
+
+                        tyre_r_np = np.asarray(tyre_r, dtype=np.float32) if NUMPY_OK else None
+
+                    if phys_v is not None:
+
+                        wa_arr = phys_v["wheelAngularSpeed"]
+
+                        vlin_arr = wa_arr * tyre_r_np * 3.6
+
+                        wa = wa_arr.tolist()
+
+                        vlin = vlin_arr.tolist()
+
+                        prs_psi = phys_v["wheelsPressure"].tolist()
+
+                    else:
+
+                        wa_arr = vlin_arr = None
+
+                        wa = [float(p.wheelAngularSpeed[i]) for i in range(4)]
+
+                        vlin = [wa[i] * tyre_r[i] * 3.6 for i in range(4)]
+
+                        prs_psi = [float(p.wheelsPressure[i]) for i in range(4)]
+
+
+
+                    # send state to Advanced: seqlock-кадр в SHM, очередь — только команды
+
+                    if adv_running and adv_q is not None:
+
+                        exit_requested = False
+
+                        try:
+
+                            while True:
+
+                                try:
+
+                                    msg = adv_q.get_nowait()
+
+                                except queue.Empty:
+
+                                    break
+
+                                if isinstance(msg, dict) and msg.get("cmd") == "exit":
+
+                                    exit_requested = True
+
+                            if exit_requested:
+
+                                close_advanced()
+
+                            elif adv_snap is not None:
+
+                                snap = adv_snap
+
+                                snap.seq += 1  # нечётный: запись началась
+
+                                snap.timestamp = now
+
+                                snap.carModel = (car_model or "")[:63]
+
+                                snap.track = (track_name or "")[:63]
+
+                                snap.trackConfig = (track_cfg or "")[:63]
+
+                                snap.time_current = (cur_time or "--:--.---")[:15]
+
+                                snap.time_last = (last_time or "--:--.---")[:15]
+
+                                snap.time_best = (best_time or "--:--.---")[:15]
+
+                                snap.lap = int(lap or 0)
+
+                                snap.position = int(pos or 0)
+
+                                snap.sector = int(sec or 0)
+
+                                snap.rpm = int(rpm or 0)
+
+                                if phys_v is not None and adv_views is not None:
+
+                                    adv_views["suspensionTravel"][:] = phys_v["suspensionTravel"]
+
+                                    adv_views["wheelLoad"][:] = phys_v["wheelLoad"]
+
+                                    adv_views["camberRAD"][:] = phys_v["camberRAD"]
+
+                                    adv_views["wheelAngularSpeed"][:] = wa_arr
+
+                                    adv_views["wheelLinearKmh"][:] = vlin_arr
+
+                                    adv_views["wheelsPressurePsi"][:] = phys_v["wheelsPressure"]
+
+                                    adv_views["tyreCoreTemperature"][:] = phys_v["tyreCoreTemperature"]
+
+                                    adv_views["rideHeight"][:] = phys_v["rideHeight"]
+
+                                else:
+
+                                    for i in range(4):
+
+                                        snap.suspensionTravel[i] = p.suspensionTravel[i]
+
+                                        snap.wheelLoad[i] = p.wheelLoad[i]
+
+                                        snap.camberRAD[i] = p.camberRAD[i]
+
+                                        snap.wheelAngularSpeed[i] = wa[i]
+
+                                        snap.wheelLinearKmh[i] = vlin[i]
+
+                                        snap.wheelsPressurePsi[i] = prs_psi[i]
+
+                                        snap.tyreCoreTemperature[i] = p.tyreCoreTemperature[i]
+
+                                    snap.rideHeight[0] = p.rideHeight[0]
+
+                                    snap.rideHeight[1] = p.rideHeight[1]
+
+                                snap.drs = p.drs
+
+                                snap.tc = p.tc
+
+                                snap.abs = p.abs
+
+                                snap.airDensity = p.airDensity
+
+                                snap.cgHeight = p.cgHeight
+
+                                snap.surfaceGrip = g.surfaceGrip
+
+                                snap.steerAngle = steer_deg
+
+                                snap.speedKmh = float(speed_kmh_filt if speed_kmh_filt is not None else speed_kmh_raw)
+
+                                snap.gas = gas
+
+                                snap.brake = brake
+
+                                snap.car_x = car_x
+
+                                snap.car_z = car_z
+
+                                ti = snap.trail_head
+
+                                snap.trail[ti][0] = car_x
+
+                                snap.trail[ti][1] = car_z
+
+                                snap.trail_head = (ti + 1) % ADV_TRAIL_CAP
+
+                                if snap.trail_count < ADV_TRAIL_CAP:
+
+                                    snap.trail_count += 1
+
+                                snap.seq += 1  # чётный: кадр готов
+
+                        except Exception:
+
+                            close_advanced()
+
+
+
+                    if csv_q is not None:
+
+                        csv_q.put(
+
+                            csv_row_fmt % (
+
+                                now, car_model, track_name, track_cfg,
+
+                                gear_raw, gear_text_offset(gear_raw), rpm,
+
+                                speed_kmh_raw, (speed_kmh_filt or 0.0), gas, brake, steer_deg,
+
+                                status_text, lap, pos, cur_time, last_time, best_time, sec,
+
+                                prs_psi[0], prs_psi[1], prs_psi[2], prs_psi[3]
+
+                            )
+
+                        )
+
+                    if udp_sock and udp_addr:
+
+                        payload = {
+
+                            "t": now, "status": status_text, "carModel": car_model, "track": track_name, "trackConfig": track_cfg,
+
+                            "physics": {"gearRaw": gear_raw, "gear": gear_text_offset(gear_raw), "rpm": rpm,
+
+                                        "speedKmh": speed_kmh_filt, "gas": gas, "brake": brake,
+
+                                        "steerDeg": steer_deg, "steerSrc": "AC"},
+
+                            "graphics": {"lap": lap, "position": pos, "sector": sec,
+
+                                         "time": {"current": cur_time, "last": last_time, "best": best_time}}
+
+                        }
+
+                        try:
+
+                            udp_sock.sendto(_json_dumps(payload), udp_addr)
+
+                        except Exception:
+
+                            pass
+
+
+
+                except Exception:
+
+                    detach_ac()
+
+                    status_text = "AC:WAIT"
+
+                    cur_time = last_time = best_time = ""
+
+                    lap = pos = sec = 0
+
+                    speed_kmh_raw = 0.0
+
+                    speed_kmh_filt = 0.0
+
+                    rpm = 0
+
+                    gas = brake = 0.0
+
+                    gear_raw = 1
+
+                    steer_deg = 0.0
+
+                    trail.clear()
+
+                    if adv_snap is not None:
+
+                        adv_snap.trail_head = 0
+
+                        adv_snap.trail_count = 0
+
+            else:
+
+                status_text = "AC:WAIT"
+
+                alpha = speed_alpha
+
+                speed_kmh_filt = (0.0 if speed_kmh_filt is None
+
+                                  else (speed_kmh_filt + alpha * (0.0 - speed_kmh_filt)) if alpha > 0.0
+
+                                  else 0.0)
+
+                rpm = 0
+
+                gas = brake = 0.0
+
+                gear_raw = 1
+
+                steer_deg = 0.0
+
+
+
+        # push to plots
+
+        plots_dirty = False
+
+        if now - last_graph >= (1.0 / graph_fps):
+
+            last_graph = now
+
+            plot_speed.set_title(f"Speed ({unit_label})")
+
+            plot_speed.push(0, kmh_to_out(speed_kmh_filt or 0.0))
+
+            plot_rpm.push(0, float(rpm))
+
+            plot_ped.push(0, float(gas))
+
+            plot_ped.push(1, float(brake))
+
+            plots_dirty = True
+
+
+
+        # draw main UI
+
+        W, H = screen.get_width(), screen.get_height()
+
+        full_redraw = (W, H) != last_size
+
+        if full_redraw:
+
+            last_size = (W, H)
+
+            screen.fill((12, 12, 12))
+
+        gap = 10; top_h = 58
+
+        right_w = max(460, int(W * 0.36))
+
+        left_w = W - right_w - gap * 3
+
+        cell_h = (H - top_h - gap * 4) // 3
+
+        x0 = gap; y0 = top_h
+
+
+
+        header_rect = pygame.Rect(gap, gap, W - gap * 2, top_h - gap)
+
+        btn_w, btn_h = 220, 36
+
+        btn_rect = pygame.Rect(header_rect.right - btn_w - 12, header_rect.centery - btn_h // 2, btn_w, btn_h)
+
+        head_text = f"Car: {car_model}   Track: {track_name}" + (f" [{track_cfg}]" if track_cfg else "")
+
+        head_state = (head_text, adv_running)
+
+        head_dirty = full_redraw or head_state != last_head_state
+
+        if head_dirty:
+
+            last_head_state = head_state
+
+            screen.blit(panel_chrome(header_rect.size), header_rect.topleft)
+
+            draw_button(screen, btn_rect, f"Advanced: {'ON' if adv_running else 'OFF'}", adv_running)
+
+            head_surf = fontb.render(ellipsize(head_text, fontb, btn_rect.left - header_rect.left - 20), True, (230, 230, 230))
+
+            screen.blit(head_surf, (header_rect.left + 12, header_rect.centery - head_surf.get_height() // 2))
+
+
+
+        r_speed = pygame.Rect(x0, y0, left_w, cell_h)
+
+        r_rpm = pygame.Rect(x0, y0 + cell_h + gap, left_w, cell_h)
+
+        r_ped = pygame.Rect(x0, y0 + 2 * (cell_h + gap), left_w, cell_h)
+
+        if plots_dirty or full_redraw:
+
+            plot_speed.draw(screen, r_speed, fontb)
+
+            plot_rpm.draw(screen, r_rpm, fontb)
+
+            plot_ped.draw(screen, r_ped, fontb)
+
+
+
+        r_info = pygame.Rect(x0 + left_w + gap, y0, right_w, H - y0 - gap)
+
+
+
+        # значения квантуются до отпечатка: если отображаемое состояние не
+
+        # изменилось, панель не перерисовывается вовсе
+
+        speed_out = kmh_to_out(speed_kmh_filt or 0.0)
+
+        gas_pct = int(gas * 100 + 0.5)
+
+        brake_pct = int(brake * 100 + 0.5)
+
+        steer_q = round(steer_deg * 2) / 2
+
+        hud_state = (status_text, lap, pos, sec, cur_time, last_time, best_time,
+
+                     round(speed_out, 1), rpm, gear_raw, gas_pct, brake_pct, steer_q)
+
+        info_dirty = full_redraw or hud_state != last_hud_state
+
+        if info_dirty:
+
+            last_hud_state = hud_state
+
+            screen.blit(panel_chrome(r_info.size), r_info.topleft)
+
+
+
+            hud_ops.clear()
+
+
+
+            yy = r_info.top + 12
+
+            yy = info_line("Статус", status_text, yy, True)
+
+            yy = info_line("Круг / Позиция", fmt_lap_pos(lap, pos), yy)
+
+            yy = info_line("Сектор", str(sec), yy)
+
+            yy = info_line("Время круга", (cur_time or "--:--.---"), yy)
+
+            yy = info_line("Прошлый / Лучший", fmt_times(last_time or "--:--.---", best_time or "--:--.---"), yy)
+
+            yy += 8
+
+            yy = info_line("Скорость", fmt_speed(round(speed_out, 1)), yy, True)
+
+            yy = info_line("Обороты", str(rpm), yy)
+
+            yy = info_line("Передача", fmt_gear(gear_text_offset(gear_raw), gear_raw), yy)
+
+            yy += 8
+
+            yy = info_line("Педали", fmt_pedals(gas_pct, brake_pct), yy)
+
+            yy = info_line("Руль (из игры)", fmt_steer(steer_q), yy)
+
+
+
+            if tips_surf is None or tips_surf_w != r_info.width:
+
+                tips_surf_w = r_info.width
+
+                groups = [[render_cached(font, ln, (150, 150, 150))
+
+                           for ln in wrap_text(t, font, r_info.width - 24)]
+
+                          for t in tips]
+
+                # прямой проход с префиксными смещениями вместо обратного
+
+                # вычитания высот: позиции известны до единственного пакетного blit
+
+                line_ops: List[Tuple[pygame.Surface, Tuple[int, int]]] = []
+
+                ytips = 0
+
+                for g in groups:
+
+                    for s in g:
+
+                        line_ops.append((s, (0, ytips)))
+
+                        ytips += s.get_height()
+
+                    ytips += 6
+
+                block_h = ytips - 6
+
+                tips_surf = pygame.Surface((max(1, r_info.width - 24), max(1, block_h)), pygame.SRCALPHA)
+
+                if FBLITS_OK:
+
+                    tips_surf.fblits(line_ops)
+
+                else:
+
+                    for s, pos in line_ops:
+
+                        tips_surf.blit(s, pos)
+
+            hud_ops.append((tips_surf, (r_info.left + 12, r_info.bottom - 10 - tips_surf.get_height())))
+
+
+
+            if FBLITS_OK:
+
+                screen.fblits(hud_ops)
+
+            else:
+
+                for surf, pos in hud_ops:
+
+                    screen.blit(surf, pos)
+
+
+
+        if full_redraw:
+
+            pygame.display.flip()
+
+        else:
+
+            # на экран уходят только реально перерисованные области
+
+            dirty = []
+
+            if head_dirty:
+
+                dirty.append(header_rect)
+
+            if info_dirty:
+
+                dirty.append(r_info)
+
+            if plots_dirty:
+
+                dirty += [r_speed, r_rpm, r_ped]
+
+            if dirty:
+
+                pygame.display.update(dirty)
+
+        clock.tick(target_fps)
+
+
+
+        # monitor advanced process state
+
+        if adv_running and adv_proc and not adv_proc.is_alive():
+
+            close_advanced()
+
+
+
+    # cleanup
+
+    if csv_fh:
+
+        if csv_q is not None:
+
+            csv_q.put(None)
+
+            if csv_thread is not None:
+
+                csv_thread.join(timeout=1.0)
+
+        try: csv_fh.flush()
+
+        except Exception: pass
+
+        csv_fh.close()
+
+    if ac_attached:
+
+        detach_ac()
+
+    if adv_running:
+
+        close_advanced()
+
+    pygame.quit()
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
+
+